@@ -1,11 +1,47 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.template.defaultfilters import filesizeformat
 
-from .models import Order, OrderItem, OrderStatusDict
 from .models import Order, OrderItem, OrderStatusDict, Report
+from .retention import enforce_retention, evict_report, storage_usage
 
 admin.site.site_header = "Админ панель"
 
 admin.site.register(Order)
 admin.site.register(OrderItem)
 admin.site.register(OrderStatusDict)
-admin.site.register(Report)
\ No newline at end of file
+
+
+@admin.register(Report)
+class ReportAdmin(admin.ModelAdmin):
+    list_display = ("title", "report_type", "format", "status", "size", "last_accessed_at", "ttl_days")
+    list_filter = ("status", "report_type", "format")
+    search_fields = ("title",)
+    actions = ["evict_files", "enforce_storage"]
+    # сводка по месту на диске — над списком (templates/admin/orders/report/change_list.html)
+    change_list_template = "admin/orders/report/change_list.html"
+
+    @admin.display(description="Размер", ordering="file_size")
+    def size(self, obj):
+        return filesizeformat(obj.file_size) if obj.file_size else "—"
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), "storage_usage": storage_usage()}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    @admin.action(description="Удалить файлы (пересоберутся при обращении)")
+    def evict_files(self, request, queryset):
+        evicted = 0
+        for report in queryset.filter(status="ready").exclude(file=""):
+            evict_report(report)
+            evicted += 1
+        self.message_user(request, f"Вытеснено отчётов: {evicted}", messages.SUCCESS)
+
+    @admin.action(description="Применить TTL и бюджет хранения")
+    def enforce_storage(self, request, queryset):
+        result = enforce_retention()
+        self.message_user(
+            request,
+            f"По TTL: {len(result['expired'])}, по бюджету: {len(result['evicted'])}, "
+            f"освобождено {filesizeformat(result['freed_bytes'])}",
+            messages.SUCCESS,
+        )
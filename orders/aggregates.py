@@ -0,0 +1,96 @@
+"""
+Инкрементальное обновление OrderDailyAggregate.
+
+Изменения заказов приходят снимками строк (до/после, см. orders/signals.py):
+по ним считаются дельты (count, amount) на ключ (date, client, manager, department, status)
+и применяются одним UPDATE ... SET x = x + delta на ключ — все ключи в одной транзакции,
+а она вложена в транзакцию записи заказа (Order.save/delete, bulk, переходы, суммы):
+заказ и агрегаты фиксируются или откатываются вместе.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from system.versioning import bump_tables
+
+from .models import Order, OrderDailyAggregate
+
+
+AGGREGATE_KEY_FIELDS = ("date", "client_id", "manager_id", "department", "status")
+
+
+def _key(row):
+    return tuple(row[f] for f in AGGREGATE_KEY_FIELDS)
+
+
+def apply_order_changes(before, after):
+    """before/after — снимки заказов (dict с полями AGGREGATE_KEY_FIELDS и amount_total)."""
+    deltas = defaultdict(lambda: [0, Decimal("0")])
+    for row in before:
+        d = deltas[_key(row)]
+        d[0] -= 1
+        d[1] -= Decimal(str(row["amount_total"] or 0))
+    for row in after:
+        d = deltas[_key(row)]
+        d[0] += 1
+        d[1] += Decimal(str(row["amount_total"] or 0))
+
+    with transaction.atomic():
+        for key, (dcount, damount) in deltas.items():
+            if not dcount and not damount:
+                continue
+            lookup = dict(zip(AGGREGATE_KEY_FIELDS, key))
+            updated = OrderDailyAggregate.objects.filter(**lookup).update(
+                orders_count=F("orders_count") + dcount,
+                amount_total_sum=F("amount_total_sum") + damount,
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        OrderDailyAggregate.objects.create(
+                            **lookup, orders_count=dcount, amount_total_sum=damount,
+                        )
+                except IntegrityError:
+                    # параллельно создали ту же строку — просто добавляем дельту
+                    OrderDailyAggregate.objects.filter(**lookup).update(
+                        orders_count=F("orders_count") + dcount,
+                        amount_total_sum=F("amount_total_sum") + damount,
+                    )
+            if dcount < 0:
+                OrderDailyAggregate.objects.filter(**lookup, orders_count__lte=0).delete()
+
+
+def rebuild_aggregates(batch_size=5000):
+    """Полная пересборка из orders_order (одна GROUP BY выборка + bulk_create пачками)."""
+    qs = (
+        Order.objects
+        .values(*AGGREGATE_KEY_FIELDS)
+        .annotate(orders_count=Count("id"), amount_total_sum=Sum("amount_total"))
+        .order_by()
+    )
+    created = 0
+    with transaction.atomic():
+        OrderDailyAggregate.objects.all().delete()
+        batch = []
+        for row in qs.iterator(chunk_size=batch_size):
+            batch.append(OrderDailyAggregate(
+                date=row["date"],
+                client_id=row["client_id"],
+                manager_id=row["manager_id"],
+                department=row["department"],
+                status=row["status"],
+                orders_count=row["orders_count"],
+                amount_total_sum=row["amount_total_sum"] or 0,
+            ))
+            if len(batch) >= batch_size:
+                OrderDailyAggregate.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            OrderDailyAggregate.objects.bulk_create(batch)
+            created += len(batch)
+        # статистика дашборда (orders/stats.py) читает агрегаты
+        bump_tables(OrderDailyAggregate)
+    return created
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import numbering, signals  # noqa: F401 — сигналы и проверка ORDER_NUMBER_FORMAT
+        post_migrate.connect(signals.restore_search_index, sender=self)
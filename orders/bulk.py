@@ -0,0 +1,121 @@
+"""
+Массовая загрузка заказов с вложенными позициями.
+
+Пачка валидируется целиком: поля — сериализатором без запросов к БД, ссылки на клиентов,
+менеджеров и уникальность номеров — одним запросом на каждый набор.
+Строки без номера получают его из последовательности (orders/numbering.py).
+Вставка — bulk_create заказов и позиций в одной транзакции; суммы считаются на сервере.
+Названия позиций в поисковом индексе (system/search.py) пересобираются по разу на заказ.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from system.search import deferred_order_items
+from system.versioning import bump_tables
+from users.models import Client, Employee
+
+from .models import Order, OrderItem
+from .numbering import allocate_numbers
+from .serializers import BulkOrderSerializer
+from .signals import order_state, orders_changed
+from .totals import line_amount
+
+
+BULK_BATCH_SIZE = 1000
+
+
+def validate_orders(rows):
+    """Возвращает (valid, errors): valid — [(index, data)], errors — [{"index", "errors"}]."""
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        ser = BulkOrderSerializer(data=row)
+        if ser.is_valid():
+            valid.append((index, ser.validated_data))
+        else:
+            errors.append({"index": index, "errors": ser.errors})
+
+    client_ids = {data["client"] for _, data in valid}
+    manager_ids = {data["manager"] for _, data in valid}
+    numbers = [data["number"] for _, data in valid if data["number"]]
+
+    known_clients = set(Client.objects.filter(pk__in=client_ids).values_list("pk", flat=True))
+    known_managers = set(Employee.objects.filter(pk__in=manager_ids).values_list("pk", flat=True))
+    taken_numbers = set(Order.objects.filter(number__in=numbers).values_list("number", flat=True))
+
+    checked = []
+    seen_numbers = set()
+    for index, data in valid:
+        row_errors = {}
+        if data["client"] not in known_clients:
+            row_errors["client"] = ["Клиент не найден"]
+        if data["manager"] not in known_managers:
+            row_errors["manager"] = ["Сотрудник не найден"]
+        if data["number"]:
+            if data["number"] in taken_numbers or data["number"] in seen_numbers:
+                row_errors["number"] = ["Заказ с таким номером уже существует"]
+            seen_numbers.add(data["number"])
+
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+        else:
+            checked.append((index, data))
+
+    errors.sort(key=lambda e: e["index"])
+    return checked, errors
+
+
+def create_orders(valid):
+    """Вставляет провалидированные строки. Возвращает [(index, order)]."""
+    # номера для строк без номера — до транзакции, блоками на подразделение
+    auto_numbers = {}
+    for _, data in valid:
+        if not data["number"]:
+            auto_numbers.setdefault(data["department"], []).append(data)
+    for department, rows in auto_numbers.items():
+        for data, number in zip(rows, allocate_numbers(department, len(rows))):
+            data["number"] = number
+
+    orders = []
+    items_per_order = []
+    for _, data in valid:
+        items = [
+            OrderItem(
+                name=item["name"],
+                qty=item["qty"],
+                unit=item["unit"],
+                price=item["price"],
+                amount=line_amount(item["qty"], item["price"]),
+            )
+            for item in data["items"]
+        ]
+        orders.append(Order(
+            number=data["number"],
+            client_id=data["client"],
+            manager_id=data["manager"],
+            department=data["department"],
+            status=data["status"],
+            priority=data["priority"],
+            order_type=data["order_type"],
+            planned_date=data["planned_date"],
+            amount_total=sum((i.amount for i in items), Decimal("0.00")),
+        ))
+        items_per_order.append(items)
+
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=BULK_BATCH_SIZE)
+
+        all_items = []
+        for order, items in zip(orders, items_per_order):
+            for item in items:
+                item.order = order
+            all_items.extend(items)
+        # поисковый индекс — по разу на заказ, а не пересборкой названий на каждую позицию
+        with deferred_order_items([order.pk for order in orders]):
+            OrderItem.objects.bulk_create(all_items, batch_size=BULK_BATCH_SIZE)
+
+        # bulk_create не шлёт post_save — обновляем агрегаты и кеш отчётов явно
+        orders_changed.send(Order, before=[], after=[order_state(o) for o in orders])
+        bump_tables(OrderItem)
+
+    return [(index, order) for (index, _), order in zip(valid, orders)]
@@ -0,0 +1,401 @@
+"""
+Форматы выгрузки отчётов.
+
+Каждый формат — читаемый байтовый поток (ReportStream) поверх генератора строк:
+storage вычитывает его кусками, файл целиком в памяти не лежит. Попутно считаются
+rows_count, sha256 и индекс для preview (первая страница + смещения, где формат
+позволяет seek). Формат выбирается по Report.format через EXPORTERS:
+
+- CSV    — UTF-8 с BOM (Excel), индекс смещений каждой REPORT_INDEX_EVERY-й строки;
+- CSV.GZ — тот же CSV через gzip, preview дальше первой страницы — потоковым чтением;
+- JSONL  — по объекту {колонка: значение} на строку, индекс смещений как у CSV;
+- XLSX   — zip с XML листа, строки inline-строками (без sharedStrings), без сторонних библиотек;
+  числа (количества, суммы — Decimal) — числовыми ячейками.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import re
+import zipfile
+import zlib
+from decimal import Decimal
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .reporting import REPORT_INDEX_EVERY, REPORT_PREVIEW_PAGE
+
+
+EXPORTERS = {}
+
+
+def register(cls):
+    EXPORTERS[cls.format] = cls
+    return cls
+
+
+def get_exporter(fmt):
+    try:
+        return EXPORTERS[(fmt or "").upper()]
+    except KeyError:
+        raise ValueError(f"Неподдерживаемый формат: {fmt}. Доступны: {', '.join(EXPORTERS)}")
+
+
+def _cell_text(value):
+    return "" if value is None else str(value)
+
+
+class ReportStream(io.RawIOBase):
+    """
+    Базовый поток: наследник реализует _iter_chunks(rows) -> bytes и зовёт _row(row)
+    на каждую строку. Смещения индекса — bytes_written (байты итогового файла) на начало пачки.
+    """
+    format = None
+    extension = None
+    content_type = "application/octet-stream"
+    seekable_index = True  # можно ли читать страницы preview по смещениям из индекса
+
+    def __init__(self, columns, rows, progress=None, progress_every=5000,
+                 batch_rows=REPORT_INDEX_EVERY, first_page_size=REPORT_PREVIEW_PAGE):
+        super().__init__()
+        self.columns = list(columns)
+        self.rows_count = 0
+        self.bytes_written = 0
+        self.sha256 = hashlib.sha256()
+        self.offsets = []
+        self.first_page = []
+        self._progress = progress
+        self._progress_every = progress_every
+        self._batch_rows = batch_rows
+        self._first_page_size = first_page_size
+        self._chunks = self._count(self._iter_chunks(rows))
+        self._pending = b""
+
+    def _count(self, chunks):
+        for data in chunks:
+            if data:
+                self.bytes_written += len(data)
+                self.sha256.update(data)
+                yield data
+
+    def _iter_chunks(self, rows):
+        raise NotImplementedError
+
+    def _batches(self, rows):
+        """Строки пачками по batch_rows — по пачке на кусок вывода."""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self._batch_rows))
+            if not batch:
+                return
+            yield batch
+
+    def _row(self, row):
+        if self.rows_count < self._first_page_size:
+            self.first_page.append([_cell_text(v) for v in row])
+        self.rows_count += 1
+        if self._progress and self.rows_count % self._progress_every == 0:
+            self._progress(self.rows_count)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def index(self):
+        """Содержимое sidecar-индекса (пишется рядом с файлом отчёта как <file>.idx.json)."""
+        return {
+            "format": self.format,
+            "columns": self.columns,
+            "rows_count": self.rows_count,
+            "every": self._batch_rows,
+            "offsets": self.offsets if self.seekable_index else [],
+            "first_page": self.first_page,
+        }
+
+    @classmethod
+    def read_page(cls, fileobj, index, offset: int, limit: int):
+        """Строки [offset, offset + limit) из готового файла — списками строк, как first_page."""
+        first_page = (index or {}).get("first_page") or []
+        if offset + limit <= len(first_page):
+            return first_page[offset:offset + limit]
+        return cls._read_page(fileobj, index, offset, limit)
+
+    @classmethod
+    def _read_page(cls, fileobj, index, offset, limit):
+        raise NotImplementedError
+
+
+@register
+class CsvReportStream(ReportStream):
+    format = "CSV"
+    extension = "csv"
+    content_type = "text/csv"
+
+    def _csv_chunks(self, rows):
+        buf = io.StringIO(newline="")
+        writer = csv.writer(buf)
+
+        def flush(encoding="utf-8"):
+            data = buf.getvalue().encode(encoding)
+            buf.seek(0)
+            buf.truncate()
+            return data
+
+        writer.writerow(self.columns)
+        # UTF-8 with BOM — чтобы Excel открывал нормально
+        yield flush("utf-8-sig")
+        for batch in self._batches(rows):
+            # генератор возобновляется после того, как предыдущий кусок учтён в bytes_written
+            self.offsets.append(self.bytes_written)
+            for row in batch:
+                writer.writerow(row)
+                self._row(row)
+            yield flush()
+
+    def _iter_chunks(self, rows):
+        return self._csv_chunks(rows)
+
+    @classmethod
+    def _read_page(cls, fileobj, index, offset, limit):
+        return read_csv_page(fileobj, index, offset, limit)
+
+
+@register
+class GzipCsvReportStream(CsvReportStream):
+    format = "CSV.GZ"
+    extension = "csv.gz"
+    content_type = "application/gzip"
+    seekable_index = False
+    compress_level = 6
+
+    def _iter_chunks(self, rows):
+        # wbits=31 — gzip-обёртка вокруг deflate, файл открывается обычным gunzip
+        compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, 31)
+        for data in self._csv_chunks(rows):
+            yield compressor.compress(data)
+        yield compressor.flush()
+
+    @classmethod
+    def _read_page(cls, fileobj, index, offset, limit):
+        with gzip.GzipFile(fileobj=fileobj, mode="rb") as gz:
+            return read_csv_page(gz, None, offset, limit)
+
+
+@register
+class JsonLinesReportStream(ReportStream):
+    format = "JSONL"
+    extension = "jsonl"
+    content_type = "application/x-ndjson"
+
+    def _iter_chunks(self, rows):
+        # Decimal (деньги) — строкой, как в API, даты — ISO
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+        columns = self.columns
+        for batch in self._batches(rows):
+            self.offsets.append(self.bytes_written)
+            lines = []
+            for row in batch:
+                lines.append(encoder.encode(dict(zip(columns, row))))
+                self._row(row)
+            lines.append("")
+            yield "\n".join(lines).encode("utf-8")
+
+    @classmethod
+    def _read_page(cls, fileobj, index, offset, limit):
+        columns = (index or {}).get("columns")
+        skip = offset
+        if index and index.get("offsets"):
+            every = index["every"]
+            block = offset // every
+            if block >= len(index["offsets"]):
+                return []
+            fileobj.seek(index["offsets"][block])
+            skip = offset - block * every
+        # readline(), а не итерация: File из storage при итерации начинает с начала файла
+        for _ in range(skip):
+            if not fileobj.readline():
+                return []
+        rows = []
+        for _ in range(limit):
+            line = fileobj.readline()
+            if not line.strip():
+                break
+            obj = json.loads(line)
+            keys = columns or list(obj)
+            rows.append([_cell_text(obj.get(k)) for k in keys])
+        return rows
+
+
+class _Sink:
+    """Приёмник для ZipFile: копит записанное, генератор забирает и отдаёт дальше."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+# управляющие символы, недопустимые в XML 1.0
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        f'<workbook xmlns="{_XLSX_NS}" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Отчёт" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+_XLSX_SHEET = "xl/worksheets/sheet1.xml"
+
+
+def _xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+@register
+class XlsxReportStream(ReportStream):
+    format = "XLSX"
+    extension = "xlsx"
+    content_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    seekable_index = False
+    compress_level = 6
+
+    def _iter_chunks(self, rows):
+        sink = _Sink()
+        # ZipFile пишет в непозиционируемый приёмник с data descriptor'ами — потоково
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED,
+                             compresslevel=self.compress_level) as zf:
+            for name, content in _XLSX_STATIC.items():
+                zf.writestr(name, content)
+            yield sink.drain()
+
+            with zf.open(_XLSX_SHEET, "w", force_zip64=True) as sheet:
+                header = "".join(_xlsx_cell(c) for c in self.columns)
+                sheet.write(
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<worksheet xmlns="{_XLSX_NS}"><sheetData><row>{header}</row>'.encode("utf-8")
+                )
+                for batch in self._batches(rows):
+                    parts = []
+                    for row in batch:
+                        parts.append("<row>" + "".join(_xlsx_cell(v) for v in row) + "</row>")
+                        self._row(row)
+                    sheet.write("".join(parts).encode("utf-8"))
+                    yield sink.drain()
+                sheet.write(b"</sheetData></worksheet>")
+        yield sink.drain()
+
+    @classmethod
+    def _read_page(cls, fileobj, index, offset, limit):
+        row_tag = f"{{{_XLSX_NS}}}row"
+        rows = []
+        with zipfile.ZipFile(fileobj) as zf, zf.open(_XLSX_SHEET) as sheet:
+            position = -1  # первая строка листа — заголовок
+            for _, elem in iterparse(sheet, events=("end",)):
+                if elem.tag != row_tag:
+                    continue
+                if offset <= position < offset + limit:
+                    rows.append(["".join(c.itertext()) for c in elem])
+                position += 1
+                elem.clear()
+                if position >= offset + limit:
+                    break
+        return rows
+
+
+def read_csv_page(fileobj, index, offset: int, limit: int):
+    """
+    Строки [offset, offset + limit) из CSV-отчёта.
+    С индексом — seek к ближайшей проиндексированной строке и короткое чтение,
+    без индекса (старые файлы, gzip) — последовательное чтение с начала, без загрузки файла целиком.
+    """
+    if index and index.get("offsets"):
+        first_page = index.get("first_page") or []
+        if offset + limit <= len(first_page):
+            return first_page[offset:offset + limit]
+
+        every = index["every"]
+        offsets = index["offsets"]
+        block = offset // every
+        if block >= len(offsets):
+            return []
+        fileobj.seek(offsets[block])
+        text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        skip = offset - block * every
+    else:
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        skip = offset + 1  # + заголовок
+
+    reader = csv.reader(text)
+    try:
+        return list(itertools.islice(reader, skip, skip + limit))
+    finally:
+        text.detach()
+
+
+def render_report_bytes(fmt, columns, rows, progress=None, progress_every=5000):
+    # небольшие выгрузки: весь файл одним bytes
+    return get_exporter(fmt)(columns, rows, progress, progress_every).read()
+
+
+def render_csv_bytes(columns, rows, progress=None, progress_every=5000):
+    return render_report_bytes("CSV", columns, rows, progress, progress_every)
@@ -0,0 +1,72 @@
+"""
+Фильтры списка заказов (и /orders/stats/, /orders/transition/ с filter).
+
+Всё превращается в WHERE: диапазоны по date / planned_date / amount_total,
+несколько значений через запятую (status__in=new,ready, client__in=1,2),
+overdue=true — новые заказы с planned_date раньше сегодняшнего дня.
+Планы запросов со всеми фильтрами проверяет orders.tests.QueryPlanTests.
+"""
+import django_filters
+from django.db import connections
+from django.db.models import CharField, F, Func, IntegerField, Q
+from django.utils import timezone
+
+from .models import Order
+
+
+def overdue_q(today=None) -> Q:
+    return Q(status="new", planned_date__lt=today or timezone.localdate())
+
+
+class OrderedInFilter(django_filters.BaseInFilter):
+    """
+    col IN (...) для списка в порядке (-date, number): в SQLite пишется как +col IN (...).
+    Унарный плюс не меняет значение, но не даёт планировщику взять индекс по col —
+    иначе он выбирает его и сортирует страницу во временном B-tree, а с LIMIT дешевле
+    идти по order_date_number_idx и отбрасывать лишние строки.
+    """
+
+    def __init__(self, *args, output_field=None, **kwargs):
+        self.output_field = output_field
+        super().__init__(*args, lookup_expr="in", **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        if connections[qs.db].vendor != "sqlite":
+            return qs.filter(**{f"{self.field_name}__in": value})
+        alias = f"_{self.field_name}_unindexed"
+        expr = Func(F(self.field_name), template="+%(expressions)s", output_field=self.output_field)
+        return qs.alias(**{alias: expr}).filter(**{f"{alias}__in": value})
+
+
+class CharInFilter(OrderedInFilter, django_filters.CharFilter):
+    pass
+
+
+class NumberInFilter(OrderedInFilter, django_filters.NumberFilter):
+    pass
+
+
+class OrderFilter(django_filters.FilterSet):
+    status__in = CharInFilter(field_name="status", output_field=CharField())
+    # id клиентов без проверки существования: неизвестный id просто ничего не находит
+    client__in = NumberInFilter(field_name="client", output_field=IntegerField())
+    overdue = django_filters.BooleanFilter(method="filter_overdue")
+
+    class Meta:
+        model = Order
+        fields = {
+            "status": ["exact"],
+            "priority": ["exact"],
+            "order_type": ["exact"],
+            "manager": ["exact"],
+            "client": ["exact"],
+            "department": ["exact"],
+            "date": ["exact", "gte", "lte"],
+            "planned_date": ["exact", "gte", "lte"],
+            "amount_total": ["gte", "lte"],
+        }
+
+    def filter_overdue(self, queryset, name, value):
+        return queryset.filter(overdue_q()) if value else queryset.exclude(overdue_q())
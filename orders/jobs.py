@@ -0,0 +1,219 @@
+"""
+Фоновая генерация отчётов.
+
+Report создаётся со статусом "processing", а файл строит воркер:
+- "celery" — задача orders.tasks.generate_report_task (нужен брокер, см. CELERY_BROKER_URL);
+- "thread" — пул потоков внутри процесса (одна нода, без Redis);
+- "sync"  — сразу в текущем потоке (тесты, отладка).
+
+Прогресс пишется в report.params["progress"]: {"phase": ..., "rows_written": ..., "job": ...,
+"updated_at": ...}. updated_at — отметка воркера; отчёт в "processing" без отметки дольше
+REPORTS_JOB_STALE_SECONDS считается потерянным (поток "thread" умер вместе с процессом,
+задача celery пропала) и ставится в очередь заново при следующем обращении к нему.
+Данные читаются из реплики "reporting", если она настроена (system/dbrouter.py).
+"""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from system.dbrouter import reporting_reads
+from system.versioning import bump_tables
+
+from .models import Report
+from .report_cache import compute_cache_key, try_reuse
+from .retention import release_files, report_files, schedule_retention
+from .exporters import get_exporter
+from .reporting import build_report_data, normalize_grouping
+
+
+# как часто (в строках) сохранять прогресс в params
+PROGRESS_EVERY = 5000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _set_progress(report: Report, phase: str, rows_written: int = 0, **extra):
+    report.params = {
+        **(report.params or {}),
+        "progress": {
+            **(report.params or {}).get("progress", {}),
+            "phase": phase, "rows_written": rows_written, "updated_at": time.time(), **extra,
+        },
+    }
+    # update() вместо save(): не перетираем поля, которые мог поменять пользователь
+    Report.objects.filter(pk=report.pk).update(params=report.params, version=F("version") + 1)
+    bump_tables(Report)
+
+
+def generate_report_file(report: Report):
+    exporter = get_exporter(report.format)
+    # прежний файл (перегенерация) удалим после коммита, если он больше ничей
+    previous = report_files(report)
+
+    grouping = normalize_grouping(report.report_type, report.grouping)
+
+    # сохраним нормализованное значение, чтобы дальше не падало
+    if report.grouping != grouping:
+        report.grouping = grouping
+        report.save(update_fields=["grouping"], check_version=False)
+
+    # тот же отчёт по тем же данным уже есть — просто берём его файл
+    cache_key = compute_cache_key(report)
+    if try_reuse(report, cache_key):
+        if report.file.name not in previous:
+            release_files(previous, exclude_pks=[report.pk])
+        return
+
+    _set_progress(report, "building")
+    columns, rows = build_report_data(
+        report_type=report.report_type,
+        period_from=report.period_from,
+        period_to=report.period_to,
+        grouping=grouping,
+    )
+
+    _set_progress(report, "writing")
+    stream = exporter(
+        columns, rows,
+        progress=lambda n: _set_progress(report, "writing", n),
+        progress_every=PROGRESS_EVERY,
+    )
+
+    # имя файла
+    dt = timezone.now().strftime("%Y%m%d_%H%M%S")
+    safe_title = slugify(report.title) or f"report_{report.id}"
+    filename = f"{safe_title}_{dt}.{exporter.extension}"
+
+    # storage вычитывает поток кусками — строки пишутся в файл по мере выборки из БД
+    report.file.save(filename, File(stream, name=filename), save=False)
+
+    # sidecar-индекс для preview: смещения каждой N-й строки + первая страница
+    index_name = report.file.storage.save(
+        f"{report.file.name}.idx.json",
+        ContentFile(json.dumps(stream.index(), ensure_ascii=False).encode("utf-8")),
+    )
+
+    report.status = "ready"
+    report.cache_key = cache_key
+    report.file_size = stream.bytes_written + report.file.storage.size(index_name)
+    report.last_accessed_at = timezone.now()
+    report.params = {
+        **(report.params or {}),
+        "index_file": index_name,
+        "columns": columns,
+        "rows_count": stream.rows_count,
+        "sha256": stream.sha256.hexdigest(),
+        "progress": {"phase": "done", "rows_written": stream.rows_count},
+    }
+    report.params.pop("error", None)
+    report.params.pop("cached_from", None)
+    report.save(
+        update_fields=["file", "cache_key", "status", "params", "file_size", "last_accessed_at"],
+        check_version=False,
+    )
+    release_files(previous, exclude_pks=[report.pk])
+    schedule_retention()
+
+
+def run_report_job(report_id: int, job: str = None):
+    """Точка входа воркера: генерирует отчёт и фиксирует результат в статусе."""
+    report = Report.objects.filter(pk=report_id).first()
+    if report is None:
+        return
+    if job is not None and (report.params or {}).get("progress", {}).get("job") != job:
+        # отчёт переставлен в очередь (задача считалась потерянной) — работает новая задача
+        return
+    try:
+        # данные отчёта и версии для ключа кеша читаются из реплики (system/dbrouter.py),
+        # одним снимком — ключ соответствует тому, что попало в файл
+        with reporting_reads():
+            generate_report_file(report)
+    except Exception as e:
+        report.status = "error"
+        report.params = {
+            **(report.params or {}),
+            "error": str(e),
+            "progress": {**(report.params or {}).get("progress", {}), "phase": "error"},
+        }
+        report.save(update_fields=["status", "params"], check_version=False)
+
+
+def _thread_job(report_id: int, job: str):
+    close_old_connections()
+    try:
+        run_report_job(report_id, job)
+    finally:
+        close_old_connections()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.REPORTS_QUEUE_WORKERS,
+                thread_name_prefix="reports",
+            )
+        return _executor
+
+
+def _dispatch(report_id: int, job: str):
+    backend = settings.REPORTS_QUEUE_BACKEND
+    if backend == "sync":
+        run_report_job(report_id, job)
+    elif backend == "thread":
+        _get_executor().submit(_thread_job, report_id, job)
+    elif backend == "celery":
+        from .tasks import generate_report_task
+        generate_report_task.delay(report_id, job)
+    else:
+        raise ValueError(f"Неизвестный REPORTS_QUEUE_BACKEND: {backend}")
+
+
+def _idle_q() -> Q:
+    """Отчёт не генерируется: не "processing" или воркер давно не отмечался."""
+    return (
+        ~Q(status="processing")
+        | Q(params__progress__updated_at__isnull=True)
+        | Q(params__progress__updated_at__lt=time.time() - settings.REPORTS_JOB_STALE_SECONDS)
+    )
+
+
+def job_is_stale(report: Report) -> bool:
+    if report.status != "processing":
+        return False
+    updated_at = (report.params or {}).get("progress", {}).get("updated_at")
+    return updated_at is None or updated_at < time.time() - settings.REPORTS_JOB_STALE_SECONDS
+
+
+def enqueue_report(report: Report) -> bool:
+    """
+    Ставит отчёт в очередь, если он уже не генерируется (см. _idle_q). Условие проверяет
+    сам UPDATE, поэтому из параллельных запросов задачу ставит только один.
+    False — отчёт уже в работе. Воркер стартует после коммита транзакции, чтобы увидеть запись.
+    """
+    job = uuid.uuid4().hex
+    params = {
+        **(report.params or {}),
+        "progress": {"phase": "queued", "rows_written": 0, "job": job, "updated_at": time.time()},
+    }
+    params.pop("error", None)
+    claimed = Report.objects.filter(_idle_q(), pk=report.pk).update(
+        status="processing", params=params, version=F("version") + 1,
+    )
+    report.refresh_from_db(fields=["status", "params", "version"])
+    if not claimed:
+        return False
+    bump_tables(Report)
+    transaction.on_commit(lambda: _dispatch(report.pk, job))
+    return True
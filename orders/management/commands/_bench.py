@@ -0,0 +1,79 @@
+"""Общие хелперы для bench_* команд: временная тестовая БД и генерация данных."""
+import contextlib
+import datetime
+import random
+import shutil
+import tempfile
+from decimal import Decimal
+
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from orders.models import Order
+from users.models import Client, Employee
+
+
+@contextlib.contextmanager
+def bench_environment(aliases=None, file_db=False):
+    """
+    Бенчмарки не трогают рабочую БД и media/: всё пишется во временные test-БД и каталог.
+    file_db=True — test-БД SQLite в файле, а не в памяти (нужно для нескольких потоков-писателей).
+    """
+    media_root = tempfile.mkdtemp(prefix="bench_media_")
+    saved_names = {}
+    if file_db:
+        for alias in aliases or connections:
+            test = connections[alias].settings_dict.setdefault("TEST", {})
+            if connections[alias].vendor == "sqlite":
+                saved_names[alias] = test.get("NAME")
+                test["NAME"] = f"{media_root}/test_{alias}.sqlite3"
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=aliases)
+    try:
+        with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=["testserver"]):
+            yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        for alias, name in saved_names.items():
+            connections[alias].settings_dict["TEST"]["NAME"] = name
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def seed_orders(n_orders, clients=50, managers=20, start=datetime.date(2020, 1, 1), days=365 * 3, batch_size=5000):
+    """Быстро наполняет БД: n_orders заказов, равномерно по days дням."""
+    rnd = random.Random(42)
+    client_objs = Client.objects.bulk_create(
+        [Client(name=f"Клиент {i}") for i in range(clients)]
+    )
+    manager_objs = Employee.objects.bulk_create([
+        Employee(
+            full_name=f"Менеджер {i}", tab_number=f"B{i:05d}", position="Менеджер",
+            department=f"Отдел {i % 5}", phone="-", email=f"m{i}@example.com",
+        )
+        for i in range(managers)
+    ])
+    statuses = [s for s, _ in Order.STATUS]
+
+    batch = []
+    for i in range(n_orders):
+        batch.append(Order(
+            number=f"B-{i:08d}",
+            client=rnd.choice(client_objs),
+            manager=rnd.choice(manager_objs),
+            department=f"Отдел {i % 5}",
+            status=rnd.choice(statuses),
+            planned_date=start + datetime.timedelta(days=rnd.randrange(days)),
+            amount_total=Decimal(rnd.randrange(100, 10_000_000)) / 100,
+        ))
+        if len(batch) >= batch_size:
+            Order.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Order.objects.bulk_create(batch)
+
+    # date — auto_now_add, поэтому раскидываем даты отдельным проходом
+    ids = list(Order.objects.order_by("pk").values_list("pk", flat=True))
+    for offset in range(days):
+        chunk = ids[offset::days]
+        if chunk:
+            Order.objects.filter(pk__in=chunk).update(date=start + datetime.timedelta(days=offset))
+    return client_objs, manager_objs
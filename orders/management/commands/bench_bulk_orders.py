@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from users.models import Role, User
+
+from ._bench import bench_environment, seed_orders
+
+
+class Command(BaseCommand):
+    help = "Пропускная способность POST /api/v1/orders/bulk/ (строк заказов в секунду) на временной test-БД."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000, help="Заказов в одном запросе")
+        parser.add_argument("--items", type=int, default=30, help="Позиций на заказ")
+        parser.add_argument("--requests", type=int, default=3)
+        parser.add_argument("--auto-number", action="store_true",
+                            help="Не передавать номера — сервер выдаёт их из последовательности")
+
+    def handle(self, *args, **opts):
+        with bench_environment():
+            clients, managers = seed_orders(0)
+            role = Role.objects.create(name="bench", is_admin=True)
+            api = APIClient()
+            api.force_authenticate(User.objects.create_user("bench", role=role))
+
+            lines = opts["orders"] * opts["items"]
+            self.stdout.write(f"{'request':>8} {'orders':>8} {'lines':>8} {'sec':>7} {'lines/s':>10}")
+            for n in range(opts["requests"]):
+                payload = {"orders": [
+                    {
+                        **({} if opts["auto_number"] else {"number": f"BULK-{n}-{i}"}),
+                        "client": clients[i % len(clients)].pk,
+                        "manager": managers[i % len(managers)].pk,
+                        "department": "Отдел 1",
+                        "items": [
+                            {"name": f"Позиция {j}", "qty": "2.000", "price": "15.50"}
+                            for j in range(opts["items"])
+                        ],
+                    }
+                    for i in range(opts["orders"])
+                ]}
+                t0 = time.perf_counter()
+                resp = api.post("/api/v1/orders/bulk/", payload, format="json")
+                elapsed = time.perf_counter() - t0
+                if resp.status_code != 201:
+                    self.stderr.write(f"HTTP {resp.status_code}: {resp.content[:500]!r}")
+                    return
+                self.stdout.write(
+                    f"{n + 1:>8} {opts['orders']:>8} {lines:>8} {elapsed:>7.2f} {lines / elapsed:>10.0f}"
+                )
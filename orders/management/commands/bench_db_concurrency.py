@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections, transaction
+
+from orders.models import Order, OrderItem
+from orders.reporting import build_report_data
+from system.dbprofile import PROFILES, sqlite_connection_settings
+
+from ._bench import bench_environment, seed_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Смешанная нагрузка на SQLite в файле: писатели создают заказы с позициями, читатели листают "
+        "заказы, «отчётники» целиком читают финансовый отчёт. Каждый — отдельный процесс (как воркеры "
+        "gunicorn). Для каждого профиля соединений (system/dbprofile.py) — операции в секунду, p95 "
+        "и ошибки «database is locked»."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=20000, help="Заказов перед началом")
+        parser.add_argument("--seconds", type=float, default=10)
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=8)
+        parser.add_argument("--reporters", type=int, default=2)
+        parser.add_argument("--profiles", default=",".join(reversed(PROFILES)),
+                            help="Профили через запятую: basic,production")
+
+    # каждая операция — как отдельный HTTP-запрос: close_old_connections() до и после
+    # (request_started/request_finished), т.е. с CONN_MAX_AGE=0 — новое соединение на операцию
+
+    def _write(self, rnd, ctx):
+        with transaction.atomic():
+            order = Order.objects.create(
+                client_id=rnd.choice(ctx["clients"]),
+                manager_id=rnd.choice(ctx["managers"]),
+                department="Отдел 1",
+                status="new",
+            )
+            for n in range(2):
+                OrderItem.objects.create(order=order, name=f"Позиция {n}", qty=rnd.randrange(1, 5),
+                                         price=Decimal(rnd.randrange(100, 100_000)) / 100)
+
+    def _read(self, rnd, ctx):
+        status = rnd.choice(["new", "ready", "canceled"])
+        list(
+            Order.objects.filter(status=status, pk__lte=rnd.randrange(1, ctx["max_pk"]))
+            .order_by("-pk")
+            .values("pk", "number", "date", "client__name", "manager__full_name", "amount_total")[:50]
+        )
+
+    def _report(self, rnd, ctx):
+        _, rows = build_report_data("finance", None, None, "none")
+        for _ in rows:
+            pass
+
+    def _worker(self, op, seed, ctx, deadline, queue):
+        rnd = random.Random(seed)
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            close_old_connections()
+            t0 = time.perf_counter()
+            try:
+                op(rnd, ctx)
+                latencies.append(time.perf_counter() - t0)
+            except OperationalError:
+                errors += 1
+            finally:
+                close_old_connections()
+        connections.close_all()
+        queue.put((latencies, errors))
+
+    def _run(self, profile, opts):
+        settings_dict = connections["default"].settings_dict
+        saved = {key: settings_dict.get(key) for key in ("OPTIONS", "CONN_MAX_AGE", "CONN_HEALTH_CHECKS")}
+        settings_dict.update(sqlite_connection_settings(os.environ, profile))
+        connections.close_all()
+        try:
+            with bench_environment(aliases=["default"], file_db=True):
+                clients, managers = seed_orders(opts["orders"], clients=20, managers=10)
+                ctx = {
+                    "clients": [c.pk for c in clients],
+                    "managers": [m.pk for m in managers],
+                    "max_pk": Order.objects.order_by("-pk").values_list("pk", flat=True).first() + 1,
+                }
+                connections.close_all()
+
+                kinds = [("write", self._write, opts["writers"]),
+                         ("read", self._read, opts["readers"]),
+                         ("report", self._report, opts["reporters"])]
+                # fork: дочерние процессы получают настроенный Django и путь к test-БД
+                mp = multiprocessing.get_context("fork")
+                deadline = time.monotonic() + opts["seconds"]
+                queues = {kind: mp.Queue() for kind, _, _ in kinds}
+                procs = [
+                    mp.Process(target=self._worker, args=(op, n, ctx, deadline, queues[kind]))
+                    for kind, op, count in kinds for n in range(count)
+                ]
+                for p in procs:
+                    p.start()
+                results = {kind: [queues[kind].get() for _ in range(count)] for kind, _, count in kinds}
+                for p in procs:
+                    p.join()
+
+                for kind, _, count in kinds:
+                    if not count:
+                        continue
+                    latencies = sorted(x for lat, _ in results[kind] for x in lat)
+                    errors = sum(err for _, err in results[kind])
+                    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+                    self.stdout.write(
+                        f"{profile:<11} {kind:<7} {count:>7} {len(latencies):>8} "
+                        f"{len(latencies) / opts['seconds']:>8.1f} {p95:>9.1f} {errors:>7}"
+                    )
+        finally:
+            settings_dict.update(saved)
+            connections.close_all()
+
+    def handle(self, *args, **opts):
+        profiles = [p.strip() for p in opts["profiles"].split(",") if p.strip()]
+        self.stdout.write(f"{'profile':<11} {'kind':<7} {'threads':>7} {'ops':>8} "
+                          f"{'ops/s':>8} {'p95, ms':>9} {'locked':>7}")
+        for profile in profiles:
+            self._run(profile, opts)
@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from orders.views import OrderViewSet
+from users.models import Role, User
+from users.views import ClientViewSet, EmployeeViewSet
+
+from ._bench import bench_environment, seed_orders
+
+
+VIEWSETS = (OrderViewSet, EmployeeViewSet, ClientViewSet)
+
+
+class Command(BaseCommand):
+    help = (
+        "Строк в секунду для списков /orders/, /employees/, /clients/: ModelSerializer против "
+        "быстрого пути values_list (fast_list). Заодно сверяет, что ответы совпадают байт в байт."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=20000)
+        parser.add_argument("--clients", type=int, default=2000)
+        parser.add_argument("--managers", type=int, default=500)
+        parser.add_argument("--page-size", type=int, default=500)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _walk(self, api, url):
+        """Проходит все страницы по next; возвращает (строк, тела ответов)."""
+        rows, bodies = 0, []
+        while url:
+            resp = api.get(url)
+            data = resp.json()
+            bodies.append(resp.content)
+            rows += len(data["results"])
+            url = data["next"]
+        return rows, bodies
+
+    def _measure(self, api, url, fast):
+        for viewset in VIEWSETS:
+            viewset.fast_list = fast
+        best, rows, bodies = None, 0, []
+        for _ in range(self.repeat):
+            t0 = time.perf_counter()
+            rows, bodies = self._walk(api, url)
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        return rows, best, bodies
+
+    def handle(self, *args, **opts):
+        self.repeat = opts["repeat"]
+        saved = {viewset: viewset.fast_list for viewset in VIEWSETS}
+        with bench_environment():
+            seed_orders(opts["orders"], clients=opts["clients"], managers=opts["managers"])
+            role = Role.objects.create(name="bench", is_admin=True)
+            api = APIClient()
+            api.force_authenticate(User.objects.create_user("bench", role=role))
+
+            self.stdout.write(f"{'endpoint':<12} {'rows':>7} {'slow r/s':>10} {'fast r/s':>10} {'x':>6} {'same':>5}")
+            try:
+                for name in ("orders", "employees", "clients"):
+                    url = f"/api/v1/{name}/?page_size={opts['page_size']}"
+                    rows, slow, slow_bodies = self._measure(api, url, fast=False)
+                    _, fast, fast_bodies = self._measure(api, url, fast=True)
+                    self.stdout.write(
+                        f"{name:<12} {rows:>7} {rows / slow:>10.0f} {rows / fast:>10.0f} "
+                        f"{slow / fast:>6.2f} {str(slow_bodies == fast_bodies):>5}"
+                    )
+            finally:
+                for viewset, value in saved.items():
+                    viewset.fast_list = value
@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from orders.models import Order
+from system.concurrency import StaleObjectError
+
+from ._bench import bench_environment, seed_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Параллельные писатели делают read-modify-write (amount_total += 1) по нескольким «горячим» "
+        "заказам: без проверки версии (как раньше) и с оптимистической блокировкой. "
+        "Показывает потерянные обновления, конфликты и пропускную способность."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16)
+        parser.add_argument("--updates", type=int, default=100, help="Успешных обновлений на писателя")
+        parser.add_argument("--hot", type=int, default=4, help="Сколько заказов правят все писатели")
+
+    def _writer(self, ids, updates, check_version, stats, lock, seed):
+        rnd = random.Random(seed)
+        conflicts = busy = 0
+        try:
+            for _ in range(updates):
+                pk = rnd.choice(ids)
+                while True:
+                    order = Order.objects.get(pk=pk)
+                    order.amount_total += Decimal("1")
+                    try:
+                        order.save(update_fields=["amount_total"], check_version=check_version)
+                        break
+                    except StaleObjectError:
+                        conflicts += 1  # перечитываем и пробуем снова
+                    except OperationalError:
+                        busy += 1       # database is locked: ждали дольше timeout
+        finally:
+            close_old_connections()
+        with lock:
+            stats["conflicts"] += conflicts
+            stats["busy"] += busy
+
+    def _run(self, ids, check_version, opts):
+        Order.objects.filter(pk__in=ids).update(amount_total=0)
+        stats, lock = {"conflicts": 0, "busy": 0}, threading.Lock()
+        threads = [
+            threading.Thread(target=self._writer, args=(ids, opts["updates"], check_version, stats, lock, n))
+            for n in range(opts["writers"])
+        ]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+
+        expected = opts["writers"] * opts["updates"]
+        applied = int(sum(Order.objects.filter(pk__in=ids).values_list("amount_total", flat=True)))
+        mode = "version" if check_version else "blind"
+        self.stdout.write(
+            f"{mode:<8} {expected:>8} {applied:>8} {expected - applied:>6} "
+            f"{stats['conflicts']:>9} {stats['busy']:>5} {elapsed:>7.2f} {expected / elapsed:>8.0f}"
+        )
+
+    def handle(self, *args, **opts):
+        with bench_environment(file_db=True):
+            seed_orders(opts["hot"], clients=5, managers=5, days=1)
+            ids = list(Order.objects.values_list("pk", flat=True))
+            self.stdout.write(f"{'mode':<8} {'updates':>8} {'applied':>8} {'lost':>6} "
+                              f"{'conflicts':>9} {'busy':>5} {'sec':>7} {'upd/s':>8}")
+            self._run(ids, check_version=False, opts=opts)
+            self._run(ids, check_version=True, opts=opts)
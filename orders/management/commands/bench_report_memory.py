@@ -0,0 +1,57 @@
+import time
+import tracemalloc
+
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from orders.exporters import get_exporter
+from orders.reporting import build_report_data
+
+from ._bench import bench_environment, seed_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Пиковая память, скорость и размер файла при генерации отчёта "
+        "(queryset -> формат -> storage) для разных объёмов и форматов. "
+        "Работает на временной test-БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,50000,200000",
+                            help="Количество заказов через запятую")
+        parser.add_argument("--report-type", default="finance", choices=["orders", "finance"])
+        parser.add_argument("--formats", default="CSV",
+                            help="Форматы через запятую: CSV,CSV.GZ,JSONL,XLSX")
+
+    def handle(self, *args, **opts):
+        sizes = [int(x) for x in opts["sizes"].split(",") if x.strip()]
+        exporters = [get_exporter(x.strip()) for x in opts["formats"].split(",") if x.strip()]
+        report_type = opts["report_type"]
+
+        self.stdout.write(
+            f"{'orders':>10} {'format':>7} {'rows':>10} {'peak, KiB':>10} "
+            f"{'file, KiB':>10} {'sec':>7} {'rows/s':>9}"
+        )
+        for n in sizes:
+            with bench_environment():
+                seed_orders(n)
+
+                for exporter in exporters:
+                    tracemalloc.start()
+                    t0 = time.perf_counter()
+                    columns, rows = build_report_data(report_type, None, None, "none")
+                    stream = exporter(columns, rows)
+                    filename = f"bench.{exporter.extension}"
+                    name = default_storage.save(f"reports/bench_{n}.{exporter.extension}",
+                                                File(stream, name=filename))
+                    elapsed = time.perf_counter() - t0
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+
+                    size = default_storage.size(name)
+                    self.stdout.write(
+                        f"{n:>10} {exporter.format:>7} {stream.rows_count:>10} {peak // 1024:>10} "
+                        f"{size // 1024:>10} {elapsed:>7.2f} {stream.rows_count / elapsed:>9.0f}"
+                    )
@@ -0,0 +1,90 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from orders.models import Order, OrderItem
+from system.search import Fts5SearchBackend, optimize_fts5, search_backend
+
+from ._bench import bench_environment, seed_orders
+
+
+WORDS = ["кабель", "труба", "муфта", "фланец", "болт", "гайка", "шайба", "провод", "щит", "автомат",
+         "лоток", "хомут", "анкер", "дюбель", "клемма", "розетка", "короб", "кронштейн", "втулка", "лента"]
+MARKS = ["медный", "стальной", "ПВХ", "оцинкованный", "латунный", "алюминиевый"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Задержка поиска (system/search.py): глобальный ранжированный поиск и ?search= списка заказов "
+        "на сгенерированных данных — p50/p95 по набору запросов, FTS5 против basic (icontains)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=200_000)
+        parser.add_argument("--items", type=int, default=3, help="Позиций на заказ")
+        parser.add_argument("--clients", type=int, default=5000)
+        parser.add_argument("--managers", type=int, default=500)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--backends", default="fts5,basic")
+
+    def _seed_items(self, per_order, rnd, batch_size=20_000):
+        batch = []
+        for order_id in Order.objects.order_by("pk").values_list("pk", flat=True).iterator():
+            for _ in range(per_order):
+                name = f"{rnd.choice(WORDS)} {rnd.choice(MARKS)} {rnd.randrange(1, 500)}"
+                batch.append(OrderItem(order_id=order_id, name=name, qty=1, price=1, amount=1))
+            if len(batch) >= batch_size:
+                OrderItem.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            OrderItem.objects.bulk_create(batch)
+
+    def _time(self, fn, queries):
+        timings = []
+        for query in queries:
+            t0 = time.perf_counter()
+            fn(query)
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+    def handle(self, *args, **opts):
+        rnd = random.Random(7)
+        with bench_environment(aliases=["default"]):
+            t0 = time.perf_counter()
+            seed_orders(opts["orders"], clients=opts["clients"], managers=opts["managers"])
+            self._seed_items(opts["items"], rnd)
+            optimize_fts5(connection)
+            self.stdout.write(f"данные и индекс: {time.perf_counter() - t0:.1f} с")
+
+            queries = [
+                rnd.choice([
+                    lambda: rnd.choice(WORDS),
+                    lambda: f"{rnd.choice(WORDS)} {rnd.choice(MARKS)[:4]}",
+                    lambda: f"B-{rnd.randrange(opts['orders']):08d}",
+                    lambda: f"клиент {rnd.randrange(opts['clients'])}",
+                    lambda: f"менедж {rnd.randrange(opts['managers'])}",
+                ])()
+                for _ in range(opts["queries"])
+            ]
+
+            self.stdout.write(f"{'backend':<8} {'what':<22} {'p50, ms':>9} {'p95, ms':>9}")
+            for name in [b.strip() for b in opts["backends"].split(",") if b.strip()]:
+                with override_settings(SEARCH_BACKEND=name):
+                    backend = search_backend()
+                    kinds = ["order", "client", "employee"]
+                    cases = {
+                        "search top-20": lambda q: backend.search(q, kinds, limit=20),
+                        "orders ?search= page": lambda q: list(
+                            backend.filter(Order.objects.all(), "order", q)
+                            .order_by("-date", "number", "id").values_list("pk", flat=True)[:50]
+                        ),
+                    }
+                    for what, fn in cases.items():
+                        p50, p95 = self._time(fn, queries)
+                        self.stdout.write(f"{name:<8} {what:<22} {p50:>9.2f} {p95:>9.2f}")
+            self.stdout.write(f"пример FTS5-запроса: {Fts5SearchBackend.match_expression(queries[0])!r}")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.aggregates import rebuild_aggregates
+
+
+class Command(BaseCommand):
+    help = "Полностью пересобирает таблицу OrderDailyAggregate из заказов."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        created = rebuild_aggregates(batch_size=opts["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Агрегатов записано: {created}"))
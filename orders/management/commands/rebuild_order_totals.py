@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from orders.totals import check_item_amounts, check_order_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет OrderItem.amount с qty * price и Order.amount_total с суммой позиций (пачками по id). "
+        "С --fix исправляет расхождения: агрегаты и кеш отчётов обновляются тем же путём, что и при записи."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Исправить найденные расхождения")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--show", type=int, default=20, help="Сколько расхождений вывести")
+
+    def handle(self, *args, **opts):
+        items = check_item_amounts(batch_size=opts["batch_size"], fix=opts["fix"])
+        for pk, amount, expected in items[:opts["show"]]:
+            self.stdout.write(f"  позиция {pk}: amount={amount}, qty*price={expected}")
+        self.stdout.write(f"Позиций с неверной суммой: {len(items)}")
+
+        orders = check_order_totals(batch_size=opts["batch_size"], fix=opts["fix"])
+        for pk, total, items_total in orders[:opts["show"]]:
+            self.stdout.write(f"  заказ {pk}: amount_total={total}, сумма позиций={items_total}")
+        self.stdout.write(f"Заказов с неверной суммой: {len(orders)}")
+
+        if opts["fix"]:
+            self.stdout.write(self.style.SUCCESS("Исправлено"))
+        elif items or orders:
+            self.stdout.write(self.style.WARNING("Запустите с --fix, чтобы исправить"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from system.search import SEARCH_KINDS, install_fts5, optimize_fts5
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересоздаёт полнотекстовый индекс SQLite FTS5 (system/search.py): таблицы, триггеры "
+        "и содержимое — по текущим данным. Нужен после загрузки данных в обход триггеров "
+        "(восстановление из дампа без них). --optimize-only — только слить сегменты индекса."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--optimize-only", action="store_true")
+
+    def handle(self, *args, **opts):
+        if not opts["optimize_only"]:
+            with transaction.atomic():
+                if not install_fts5(connection):
+                    raise CommandError("FTS5 недоступен (не SQLite или SQLite без FTS5): используйте SEARCH_BACKEND=basic")
+        optimize_fts5(connection)
+        with connection.cursor() as cursor:
+            for spec in SEARCH_KINDS.values():
+                cursor.execute(f"SELECT count(*) FROM {spec['table']}")
+                self.stdout.write(f"{spec['table']}: {cursor.fetchone()[0]}")
+        self.stdout.write(self.style.SUCCESS("Готово"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from system.dbrouter import refresh_reporting_copy, reporting_alias
+
+
+class Command(BaseCommand):
+    help = (
+        "Обновляет SQLite-копию default для отчётов (alias reporting, REPORTING_DB_COPY=1). "
+        "Для запуска по расписанию: копия не старше REPORTING_DB_MAX_STALENESS к моменту генерации."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--if-stale", action="store_true",
+                            help="Копировать, только если копия старше REPORTING_DB_MAX_STALENESS")
+
+    def handle(self, *args, **opts):
+        if reporting_alias() is None:
+            raise CommandError("Alias reporting не настроен (REPORTING_DB_NAME)")
+        if refresh_reporting_copy(force=not opts["if_stale"]):
+            self.stdout.write(self.style.SUCCESS("Копия обновлена"))
+        else:
+            self.stdout.write("Копия актуальна или совпадает с default — обновлять нечего")
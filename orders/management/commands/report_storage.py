@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from orders.retention import enforce_retention, storage_usage
+
+
+class Command(BaseCommand):
+    help = (
+        "Место, занятое файлами отчётов (media/reports), и бюджет хранения. "
+        "С --enforce вытесняет отчёты по TTL и давно не скачивавшиеся файлы сверх бюджета."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enforce", action="store_true", help="Применить TTL и бюджет")
+        parser.add_argument("--orphans", action="store_true",
+                            help="Вместе с --enforce удалить файлы, на которые не ссылается ни один отчёт")
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+
+    def handle(self, *args, **opts):
+        usage = storage_usage()
+        self.stdout.write(
+            f"Файлов отчётов: {usage['files']}, занято {filesizeformat(usage['bytes'])} "
+            f"из {filesizeformat(usage['budget_bytes'])}; TTL {usage['ttl_days']} дн."
+        )
+        self.stdout.write(f"Файлов без отчёта: {usage['orphan_files']} ({filesizeformat(usage['orphan_bytes'])})")
+        for status, n in sorted(usage["reports"].items()):
+            self.stdout.write(f"  {status}: {n}")
+
+        if not opts["enforce"]:
+            return
+
+        result = enforce_retention(dry_run=opts["dry_run"], orphans=opts["orphans"])
+        prefix = "Будет " if opts["dry_run"] else ""
+        self.stdout.write(f"{prefix}вытеснено по TTL: {len(result['expired'])}, по бюджету: {len(result['evicted'])}")
+        if opts["orphans"]:
+            self.stdout.write(f"{prefix}удалено файлов без отчёта: {len(result['orphans'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}освобождено {filesizeformat(result['freed_bytes'])}, "
+            f"осталось {filesizeformat(result['bytes'])}"
+        ))
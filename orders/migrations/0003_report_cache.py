@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDataStamp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(max_length=16, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Версия данных отчётов',
+                'verbose_name_plural': 'Версии данных отчётов',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='integration',
+            options={'verbose_name': 'Интеграция', 'verbose_name_plural': 'Интеграции'},
+        ),
+        migrations.AlterModelOptions(
+            name='order',
+            options={'verbose_name': 'Заказ', 'verbose_name_plural': 'Заказы'},
+        ),
+        migrations.AlterModelOptions(
+            name='orderitem',
+            options={'verbose_name': 'Продукт', 'verbose_name_plural': 'Продукты'},
+        ),
+        migrations.AlterModelOptions(
+            name='orderstatusdict',
+            options={'verbose_name': 'Словарь заказ и статуса', 'verbose_name_plural': 'Словарь заказов и статусов'},
+        ),
+        migrations.AlterModelOptions(
+            name='report',
+            options={'verbose_name': 'Отчёт', 'verbose_name_plural': 'Отчёты'},
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('new', 'Новый'), ('ready', 'Готов'), ('canceled', 'Отменён')], default='new', max_length=64),
+        ),
+    ]
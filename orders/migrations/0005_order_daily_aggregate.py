@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_aggregates(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    OrderDailyAggregate = apps.get_model("orders", "OrderDailyAggregate")
+    rows = (
+        Order.objects
+        .values("date", "client_id", "manager_id", "department", "status")
+        .annotate(orders_count=Count("id"), amount_total_sum=Sum("amount_total"))
+        .order_by()
+    )
+    OrderDailyAggregate.objects.bulk_create(
+        [OrderDailyAggregate(**{**row, "amount_total_sum": row["amount_total_sum"] or 0}) for row in rows.iterator()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_order_access_path_indexes'),
+        ('users', '0002_alter_meta_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderDailyAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('department', models.CharField(max_length=128)),
+                ('status', models.CharField(max_length=64)),
+                ('orders_count', models.IntegerField(default=0)),
+                ('amount_total_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.client')),
+                ('manager', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.employee')),
+            ],
+            options={
+                'verbose_name': 'Агрегат заказов за день',
+                'verbose_name_plural': 'Агрегаты заказов за день',
+                'constraints': [models.UniqueConstraint(fields=('date', 'client', 'manager', 'department', 'status'), name='order_daily_aggregate_key')],
+            },
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_daily_aggregate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_report_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Последовательность номеров',
+                'verbose_name_plural': 'Последовательности номеров',
+            },
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='number',
+            field=models.CharField(blank=True, max_length=32, unique=True),
+        ),
+    ]
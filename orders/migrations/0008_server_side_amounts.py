@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='amount_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=16),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=16),
+        ),
+    ]
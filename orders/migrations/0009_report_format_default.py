@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_server_side_amounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='format',
+            field=models.CharField(default='CSV', max_length=16),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:17
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def start_access_clock(apps, schema_editor):
+    # TTL существующих файлов отсчитывается с момента миграции
+    Report = apps.get_model("orders", "Report")
+    Report.objects.exclude(file="").exclude(file__isnull=True).update(last_accessed_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_report_format_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='report',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='last_accessed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='report',
+            name='ttl_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('ready', 'Готов'), ('processing', 'В процессе'), ('error', 'Ошибка'), ('evicted', 'Файл удалён')], default='processing', max_length=16),
+        ),
+        migrations.RunPython(start_access_clock, migrations.RunPython.noop),
+    ]
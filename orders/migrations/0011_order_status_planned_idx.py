@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_report_retention'),
+        ('users', '0002_alter_meta_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'planned_date'], name='order_status_planned_idx'),
+        ),
+    ]
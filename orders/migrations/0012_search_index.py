@@ -0,0 +1,104 @@
+from django.db import migrations
+
+
+# DDL индекса на момент миграции (не импортируется из system/search.py: миграция
+# должна воспроизводиться одинаково, как бы потом ни менялся код поиска).
+# Пересоздать по текущему коду — manage.py rebuild_search_index.
+
+def _fold(expr):
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _items_text(order_id):
+    return _fold(f"(SELECT group_concat(name, ' ') FROM orders_orderitem WHERE order_id = {order_id})")
+
+
+# таблица индекса -> (таблица-источник, выражения колонок через {row})
+INDEXES = {
+    "search_order": ("orders_order", {"number": _fold("{row}.number"), "items": _items_text("{row}.id")}),
+    "search_client": ("users_client", {"name": _fold("{row}.name"), "contact_person": _fold("{row}.contact_person")}),
+    "search_employee": ("users_employee", {"full_name": _fold("{row}.full_name"), "tab_number": _fold("{row}.tab_number")}),
+}
+
+
+def _insert_row(table, row):
+    _, exprs = INDEXES[table]
+    return (
+        f"INSERT INTO {table}(rowid, {', '.join(exprs)}) "
+        f"VALUES ({row}.id, {', '.join(e.format(row=row) for e in exprs.values())})"
+    )
+
+
+def _statements():
+    statements = []
+    for table, (source, exprs) in INDEXES.items():
+        watched = ", ".join(c for c in exprs if c != "items")
+        statements += [
+            f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(exprs)}, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"INSERT INTO {table}(rowid, {', '.join(exprs)}) "
+            f"SELECT t.id, {', '.join(e.format(row='t') for e in exprs.values())} FROM {source} t",
+            f"CREATE TRIGGER {table}_ai AFTER INSERT ON {source} BEGIN {_insert_row(table, 'new')}; END",
+            f"CREATE TRIGGER {table}_au AFTER UPDATE OF {watched} ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; {_insert_row(table, 'new')}; END",
+            f"CREATE TRIGGER {table}_ad AFTER DELETE ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; END",
+        ]
+    set_items = "UPDATE search_order SET items = {text} WHERE rowid = {order_id}"
+    statements += [
+        "CREATE TRIGGER search_orderitem_ai AFTER INSERT ON orders_orderitem BEGIN "
+        f"{set_items.format(text=_items_text('new.order_id'), order_id='new.order_id')}; END",
+        "CREATE TRIGGER search_orderitem_au AFTER UPDATE OF name, order_id ON orders_orderitem BEGIN "
+        f"{set_items.format(text=_items_text('old.order_id'), order_id='old.order_id')}; "
+        f"{set_items.format(text=_items_text('new.order_id'), order_id='new.order_id')}; END",
+        "CREATE TRIGGER search_orderitem_ad AFTER DELETE ON orders_orderitem BEGIN "
+        f"{set_items.format(text=_items_text('old.order_id'), order_id='old.order_id')}; END",
+    ]
+    return statements
+
+
+def _fts5_available(cursor):
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def install(apps, schema_editor):
+    # только SQLite с FTS5; иначе поиск работает через SEARCH_BACKEND=basic
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not _fts5_available(cursor):
+            return
+        uninstall(apps, schema_editor)
+        for statement in _statements():
+            cursor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in [*INDEXES, "search_orderitem"]:
+            for suffix in ("ai", "au", "ad"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+        for table in INDEXES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_order_status_planned_idx'),
+        ('users', '0002_alter_meta_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
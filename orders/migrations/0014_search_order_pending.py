@@ -0,0 +1,71 @@
+from django.db import migrations
+
+
+# Триггеры позиций пропускают заказы из search_order_pending: пачку позиций (bulk)
+# индексирует сам пишущий код, по разу на заказ (system/search.py: deferred_order_items).
+# DDL на момент миграции, как и в 0012.
+
+def _items_text(order_id):
+    return (
+        "replace(replace(coalesce((SELECT group_concat(name, ' ') FROM orders_orderitem "
+        f"WHERE order_id = {order_id}), ''), 'ё', 'е'), 'Ё', 'Е')"
+    )
+
+
+def _set_items(order_id):
+    return f"UPDATE search_order SET items = {_items_text(order_id)} WHERE rowid = {order_id}"
+
+
+def _when(order_id):
+    return f"WHEN NOT EXISTS (SELECT 1 FROM search_order_pending WHERE order_id = {order_id})"
+
+
+def _triggers(deferred):
+    ai = _when("new.order_id") + " " if deferred else ""
+    ad = _when("old.order_id") + " " if deferred else ""
+    return [
+        f"CREATE TRIGGER search_orderitem_ai AFTER INSERT ON orders_orderitem {ai}"
+        f"BEGIN {_set_items('new.order_id')}; END",
+        "CREATE TRIGGER search_orderitem_au AFTER UPDATE OF name, order_id ON orders_orderitem BEGIN "
+        f"{_set_items('old.order_id')}; {_set_items('new.order_id')}; END",
+        f"CREATE TRIGGER search_orderitem_ad AFTER DELETE ON orders_orderitem {ad}"
+        f"BEGIN {_set_items('old.order_id')}; END",
+    ]
+
+
+def _installed(connection):
+    return connection.vendor == "sqlite" and "search_order" in connection.introspection.table_names()
+
+
+def _replace_triggers(schema_editor, deferred):
+    connection = schema_editor.connection
+    if not _installed(connection):
+        return
+    with connection.cursor() as cursor:
+        for suffix in ("ai", "au", "ad"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS search_orderitem_{suffix}")
+        if deferred:
+            cursor.execute("CREATE TABLE IF NOT EXISTS search_order_pending (order_id INTEGER PRIMARY KEY)")
+        for statement in _triggers(deferred):
+            cursor.execute(statement)
+        if not deferred:
+            cursor.execute("DROP TABLE IF EXISTS search_order_pending")
+
+
+def forward(apps, schema_editor):
+    _replace_triggers(schema_editor, deferred=True)
+
+
+def backward(apps, schema_editor):
+    _replace_triggers(schema_editor, deferred=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0013_table_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
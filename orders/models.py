@@ -1,17 +1,19 @@
 #orders/models.py
-from django.db import models
+from django.db import models, transaction
 
+from system.concurrency import VersionedModelMixin
 from users.models import Client, Employee
 
 
-class Order(models.Model):
+class Order(VersionedModelMixin, models.Model):
     STATUS = [
         ("new", "Новый"),
         ("ready", "Готов"),
         ("canceled", "Отменён"),
     ]
 
-    number = models.CharField(max_length=32, unique=True)
+    # пустой номер выдаётся при сохранении из последовательности (orders/numbering.py)
+    number = models.CharField(max_length=32, unique=True, blank=True)
     date = models.DateField(auto_now_add=True)
     client = models.ForeignKey(Client, on_delete=models.PROTECT)
     department = models.CharField(max_length=128)
@@ -26,11 +28,40 @@ class Order(models.Model):
     )  # Низкий/Обычный/Высокий
     order_type = models.CharField(max_length=64, default="Поставка оборудования")
     planned_date = models.DateField(null=True, blank=True)
-    amount_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    # сумма позиций; ведётся на сервере дельтами от записей OrderItem (orders/totals.py)
+    amount_total = models.DecimalField(max_digits=16, decimal_places=2, default=0, editable=False)
+    # оптимистическая блокировка: save() — UPDATE ... WHERE version = %s (system/concurrency.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        # Под реальные пути доступа: сортировка списка/отчётов (-date, number),
+        # диапазон по date в отчётах и равенство по полям фильтра (orders/filters.py) + та же сортировка.
+        # Проверяется тестом orders.tests.QueryPlanTests.
+        indexes = [
+            models.Index(fields=["-date", "number"], name="order_date_number_idx"),
+            models.Index(fields=["status", "-date", "number"], name="order_status_date_idx"),
+            models.Index(fields=["manager", "-date", "number"], name="order_manager_date_idx"),
+            models.Index(fields=["client", "-date", "number"], name="order_client_date_idx"),
+            models.Index(fields=["department", "-date", "number"], name="order_department_date_idx"),
+            models.Index(fields=["priority", "-date", "number"], name="order_priority_date_idx"),
+            models.Index(fields=["order_type", "-date", "number"], name="order_type_date_idx"),
+            # просроченные: status = 'new' AND planned_date < сегодня (фильтр overdue, /orders/stats/)
+            models.Index(fields=["status", "planned_date"], name="order_status_planned_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.number:
+            from .numbering import next_order_number
+            self.number = next_order_number(self.department, self.date)
+        # сигналы post_save/post_delete обновляют агрегаты (orders/signals.py) — в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"Номер: {self.number}, клиент: {self.client}, дата: {self.date} "
@@ -42,33 +73,87 @@ class OrderItem(models.Model):
     qty = models.DecimalField(max_digits=12, decimal_places=3)
     unit = models.CharField(max_length=32, default="шт")
     price = models.DecimalField(max_digits=16, decimal_places=2)
-    amount = models.DecimalField(max_digits=16, decimal_places=2)
+    # qty * price, считается при сохранении
+    amount = models.DecimalField(max_digits=16, decimal_places=2, editable=False)
 
     class Meta:
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
 
+    def save(self, *args, **kwargs):
+        from .totals import line_amount
+        self.amount = line_amount(self.qty, self.price)
+        # дельта суммы заказа и агрегатов (orders/signals.py) — в той же транзакции
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
-class Report(models.Model):
+class OrderDailyAggregate(models.Model):
+    """
+    Материализованный агрегат заказов по дню и разрезам группировок отчётов.
+    Поддерживается инкрементально (orders/aggregates.py, сигналы orders/signals.py),
+    полная пересборка — manage.py rebuild_order_aggregates.
+    """
+    date = models.DateField()
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="+")
+    manager = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="+")
+    department = models.CharField(max_length=128)
+    status = models.CharField(max_length=64)
+    orders_count = models.IntegerField(default=0)
+    amount_total_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Агрегат заказов за день"
+        verbose_name_plural = "Агрегаты заказов за день"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "client", "manager", "department", "status"],
+                name="order_daily_aggregate_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.orders_count}"
+
+
+class Report(VersionedModelMixin, models.Model):
     REPORT_TYPES = [
         ("orders", "По заказам"),
         ("employees", "По сотрудникам"),
         ("finance", "Финансовый"),
     ]
-    STATUS = [("ready", "Готов"), ("processing", "В процессе"), ("error", "Ошибка")]
+    STATUS = [
+        ("ready", "Готов"),
+        ("processing", "В процессе"),
+        ("error", "Ошибка"),
+        ("evicted", "Файл удалён"),  # см. orders/retention.py, пересоберётся при обращении
+    ]
     title = models.CharField(max_length=255)
     report_type = models.CharField(max_length=32, choices=REPORT_TYPES)
     period_from = models.DateField(null=True, blank=True)
     period_to = models.DateField(null=True, blank=True)
-    format = models.CharField(max_length=16, default="PDF")
+    # один из orders.exporters.EXPORTERS: CSV, CSV.GZ, JSONL, XLSX
+    format = models.CharField(max_length=16, default="CSV")
     grouping = models.CharField(max_length=64, blank=True)
     status = models.CharField(max_length=16, choices=STATUS, default="processing")
     file = models.FileField(upload_to="reports/", null=True, blank=True)
     params = models.JSONField(default=dict, blank=True)
     recipient_email = models.EmailField(blank=True)
+    # ключ кеша результата: параметры отчёта + версия данных (см. orders/report_cache.py)
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # хранение файла (orders/retention.py): размер файла с индексом, последнее скачивание/preview,
+    # срок хранения без обращений (None — REPORTS_TTL_DAYS)
+    file_size = models.PositiveBigIntegerField(default=0, editable=False)
+    last_accessed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    ttl_days = models.PositiveIntegerField(null=True, blank=True)
 
     class Meta:
         verbose_name = "Отчёт"
@@ -78,6 +163,55 @@ class Report(models.Model):
         return self.title
 
 
+class NumberSequence(models.Model):
+    """
+    Последовательность номеров заказов: key — префикс номера ("ORD-2026-"),
+    next_value — первое ещё не зарезервированное значение.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Последовательность номеров"
+        verbose_name_plural = "Последовательности номеров"
+
+    def __str__(self):
+        return f"{self.key}: {self.next_value}"
+
+
+class ReportDataStamp(models.Model):
+    """
+    Версия данных для кеша отчётов: bucket — месяц заказов ("2025-11")
+    или "*" для справочников (сотрудники, клиенты), влияющих на все отчёты.
+    """
+    bucket = models.CharField(max_length=16, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Версия данных отчётов"
+        verbose_name_plural = "Версии данных отчётов"
+
+    def __str__(self):
+        return f"{self.bucket}: {self.version}"
+
+
+class TableVersion(models.Model):
+    """
+    Версия таблицы для ETag, снимков прав и кешей в памяти (system/versioning.py),
+    когда общего для процессов кеша нет: label — "app_label.model".
+    """
+    label = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    mtime = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = "Версия таблицы"
+        verbose_name_plural = "Версии таблиц"
+
+    def __str__(self):
+        return f"{self.label}: {self.version}"
+
+
 class Integration(models.Model):
     name = models.CharField(max_length=128)
     type = models.CharField(max_length=64)  # ERP, HR, etc.
@@ -0,0 +1,162 @@
+"""
+Номера заказов из последовательности.
+
+Формат — settings.ORDER_NUMBER_FORMAT с полями {year}, {department} и {seq}
+(по умолчанию "ORD-{year}-{seq:06d}"). Всё, кроме {seq}, — ключ последовательности
+NumberSequence: у каждого года (и подразделения, если оно есть в формате) свой счётчик.
+
+Процесс резервирует блок из ORDER_NUMBER_BLOCK номеров одним UPDATE и раздаёт их
+из памяти, поэтому параллельные воркеры не конкурируют за номера и не ловят
+IntegrityError. Невыданный остаток блока при перезапуске пропадает — номера
+уникальны и возрастают в пределах процесса, но идут с пропусками.
+
+Номер, введённый вручную, не может иметь вид номера из последовательности
+(looks_generated): счётчик о нём не знает и однажды выдал бы такой же.
+Номер должен влезать в Order.number — формат проверяется при запуске (check_number_format),
+длина подразделения для формата с {department} — при создании заказа (check_department_fits).
+"""
+import os
+import re
+import string
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NumberSequence, Order
+
+
+FORMAT_FIELDS = {"year", "department", "seq"}
+NUMBER_MAX_LENGTH = Order._meta.get_field("number").max_length
+# длина номеров проверяется на шестизначном счётчике и четырёхзначном годе
+_SAMPLE = {"seq": 999_999, "year": 9999}
+
+
+_formatter = string.Formatter()
+_lock = threading.Lock()
+_blocks = {}        # key -> [next, end) ещё не выданных номеров
+_blocks_pid = None  # после fork блоки родителя использовать нельзя
+
+
+def _render(fmt, seq, **context):
+    """Форматирует шаблон; seq=None — ключ последовательности (всё, кроме {seq})."""
+    parts = []
+    for literal, field, spec, conversion in _formatter.parse(fmt):
+        parts.append(literal)
+        if field is None:
+            continue
+        if field == "seq":
+            if seq is not None:
+                parts.append(format(seq, spec))
+            continue
+        value = _formatter.convert_field(context[field], conversion)
+        parts.append(format(value, spec))
+    return "".join(parts)
+
+
+def _fields(fmt):
+    return {field for _, field, _, _ in _formatter.parse(fmt) if field is not None}
+
+
+def _number_re(fmt):
+    parts = []
+    for literal, field, _, _ in _formatter.parse(fmt):
+        parts.append(re.escape(literal))
+        if field is not None:
+            parts.append(r"\d+" if field in ("year", "seq") else ".+")
+    return re.compile("".join(parts))
+
+
+def looks_generated(number) -> bool:
+    """Номер подходит под ORDER_NUMBER_FORMAT — вручную такой задавать нельзя."""
+    return bool(number) and _number_re(settings.ORDER_NUMBER_FORMAT).fullmatch(number) is not None
+
+
+def check_department_fits(department):
+    """ValidationError, если номер с таким подразделением не влезет в Order.number."""
+    fmt = settings.ORDER_NUMBER_FORMAT
+    if "department" not in _fields(fmt):
+        return
+    extra = len(_render(fmt, _SAMPLE["seq"], year=_SAMPLE["year"], department=department)) - NUMBER_MAX_LENGTH
+    if extra > 0:
+        raise ValidationError(
+            f"Подразделение длиннее {max(len(department) - extra, 0)} символов не помещается "
+            f"в номер заказа ({fmt})"
+        )
+
+
+@checks.register()
+def check_number_format(app_configs=None, **kwargs):
+    fmt = settings.ORDER_NUMBER_FORMAT
+    try:
+        fields = _fields(fmt)
+        sample = _render(fmt, _SAMPLE["seq"], year=_SAMPLE["year"], department="")
+    except (ValueError, KeyError) as e:
+        return [checks.Error(f"ORDER_NUMBER_FORMAT={fmt!r}: {e}", id="orders.E001")]
+    if "seq" not in fields or not fields <= FORMAT_FIELDS:
+        return [checks.Error(
+            f"ORDER_NUMBER_FORMAT={fmt!r}: нужен {{seq}}, допустимы только {', '.join(sorted(FORMAT_FIELDS))}",
+            id="orders.E001",
+        )]
+    if len(sample) > NUMBER_MAX_LENGTH:
+        return [checks.Error(
+            f"ORDER_NUMBER_FORMAT={fmt!r}: номер {sample!r} длиннее {NUMBER_MAX_LENGTH} символов (Order.number)",
+            id="orders.E002",
+        )]
+    return []
+
+
+def _reserve(key, size):
+    """Резервирует size номеров; возвращает первый."""
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                NumberSequence.objects.get_or_create(key=key)
+        except IntegrityError:
+            pass  # последовательность параллельно создал другой процесс
+        NumberSequence.objects.filter(key=key).update(next_value=F("next_value") + size)
+        end = NumberSequence.objects.filter(key=key).values_list("next_value", flat=True).get()
+    return end - size
+
+
+def allocate_numbers(department, count, date=None):
+    """count новых номеров заказов подразделения department (год — по date или сегодня)."""
+    global _blocks_pid
+    check_department_fits(department)
+    year = (date or timezone.localdate()).year
+    fmt = settings.ORDER_NUMBER_FORMAT
+    key = _render(fmt, None, year=year, department=department)
+
+    values = []
+    with _lock:
+        if _blocks_pid != os.getpid():
+            _blocks.clear()
+            _blocks_pid = os.getpid()
+
+        start, end = _blocks.get(key, (0, 0))
+        take = min(count, end - start)
+        values.extend(range(start, start + take))
+        _blocks[key] = (start + take, end)
+
+        missing = count - take
+        if missing:
+            if transaction.get_connection().in_atomic_block:
+                # внутри чужой транзакции блок кешировать нельзя: при её откате
+                # резерв тоже откатится, а номера из памяти выдались бы повторно
+                first = _reserve(key, missing)
+                values.extend(range(first, first + missing))
+            else:
+                size = max(missing, settings.ORDER_NUMBER_BLOCK)
+                first = _reserve(key, size)
+                values.extend(range(first, first + missing))
+                _blocks[key] = (first + missing, first + size)
+
+    return [_render(fmt, value, year=year, department=department) for value in values]
+
+
+def next_order_number(department, date=None):
+    return allocate_numbers(department, 1, date)[0]
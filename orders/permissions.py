@@ -1,5 +1,7 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from users.auth import request_permissions
+
 
 class OrderAccessPermission(BasePermission):
     """
@@ -12,16 +14,12 @@ class OrderAccessPermission(BasePermission):
         if not user or not user.is_authenticated:
             return False
 
-        role = getattr(user, "role", None)
-        if role is None:
-            return False
-
+        # снимок прав из сессии (users/auth.py) — без запросов к User/Role
+        perms = request_permissions(request)
         if request.method in SAFE_METHODS:
-            return bool(role.is_admin or role.can_view_orders)
+            return perms["is_admin"] or perms["can_view_orders"]
 
-        return bool(role.is_admin or role.can_edit_orders)
-
-from rest_framework.permissions import BasePermission, SAFE_METHODS
+        return perms["is_admin"] or perms["can_edit_orders"]
 
 class ReportAccessPermission(BasePermission):
     """
@@ -34,11 +32,8 @@ class ReportAccessPermission(BasePermission):
         if not user or not user.is_authenticated:
             return False
 
-        role = getattr(user, "role", None)
-        if role is None:
-            return False
-
+        perms = request_permissions(request)
         if request.method in SAFE_METHODS:
-            return bool(role.is_admin or role.can_view_reports)
+            return perms["is_admin"] or perms["can_view_reports"]
 
-        return bool(role.is_admin or role.can_view_reports)
+        return perms["is_admin"] or perms["can_view_reports"]
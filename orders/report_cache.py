@@ -0,0 +1,124 @@
+"""
+Кеш результатов отчётов.
+
+Ключ = sha256(report_type, period_from, period_to, grouping, format, версия данных).
+Версия данных — ReportDataStamp по месяцам периода плюс глобальный bucket "*".
+Запись в Order/OrderItem поднимает версию только своего месяца (по orders_changed: позиции
+влияют на отчёты только через сумму заказа, а её дельта приходит тем же сигналом), в Employee/Client — "*",
+поэтому отчёт за прошлый год не инвалидируется новыми заказами.
+"""
+import datetime
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Report, ReportDataStamp
+from .reporting import normalize_grouping
+
+
+GLOBAL_BUCKET = "*"
+
+HITS_KEY = "reports:cache:hits"
+MISSES_KEY = "reports:cache:misses"
+
+
+def month_bucket(d: datetime.date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def bump_data_stamps(buckets):
+    for bucket in set(buckets):
+        ReportDataStamp.objects.get_or_create(bucket=bucket)
+        ReportDataStamp.objects.filter(bucket=bucket).update(version=F("version") + 1)
+
+
+def bump_dates(dates):
+    bump_data_stamps(month_bucket(d) for d in dates if d)
+
+
+def bump_global():
+    bump_data_stamps([GLOBAL_BUCKET])
+
+
+def data_stamp(period_from, period_to) -> str:
+    """Версии всех месяцев, попадающих в период (открытая граница — все месяцы с той стороны)."""
+    qs = ReportDataStamp.objects.exclude(bucket=GLOBAL_BUCKET)
+    if period_from:
+        qs = qs.filter(bucket__gte=month_bucket(period_from))
+    if period_to:
+        qs = qs.filter(bucket__lte=month_bucket(period_to))
+    stamps = list(qs.order_by("bucket").values_list("bucket", "version"))
+    glob = ReportDataStamp.objects.filter(bucket=GLOBAL_BUCKET).values_list("version", flat=True).first()
+    return f"{glob or 0}|" + ",".join(f"{b}:{v}" for b, v in stamps)
+
+
+def compute_cache_key(report: Report) -> str:
+    parts = [
+        (report.report_type or "").strip().lower(),
+        report.period_from.isoformat() if report.period_from else "",
+        report.period_to.isoformat() if report.period_to else "",
+        normalize_grouping(report.report_type, report.grouping),
+        (report.format or "").upper(),
+        data_stamp(report.period_from, report.period_to),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def try_reuse(report: Report, cache_key: str, record_miss: bool = True) -> bool:
+    """
+    Если есть готовый отчёт с тем же ключом и его файл на месте — переиспользуем файл.
+    record_miss=False — предварительная проверка, промах засчитает воркер.
+    """
+    source = (
+        Report.objects
+        .filter(cache_key=cache_key, status="ready")
+        .exclude(pk=report.pk)
+        .exclude(file="")
+        .order_by("-id")
+        .first()
+    )
+    if source is None or not source.file.storage.exists(source.file.name):
+        if record_miss:
+            _incr(MISSES_KEY)
+        return False
+
+    src_params = source.params or {}
+    report.file.name = source.file.name
+    report.cache_key = cache_key
+    report.status = "ready"
+    report.params = {
+        **(report.params or {}),
+        **{k: src_params[k] for k in ("index_file", "columns", "rows_count", "sha256") if k in src_params},
+        "progress": {"phase": "done", "rows_written": src_params.get("rows_count", 0)},
+        "cached_from": source.pk,
+    }
+    report.params.pop("error", None)
+    report.file_size = source.file_size
+    report.last_accessed_at = timezone.now()
+    report.save(
+        update_fields=["file", "cache_key", "status", "params", "file_size", "last_accessed_at"],
+        check_version=False,
+    )
+    _incr(HITS_KEY)
+    return True
+
+
+def cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
@@ -1,13 +1,20 @@
-import csv
-import io
+from decimal import Decimal
 from django.db.models import Count, Sum, Q
 
-from .models import Order
+from .models import Order, OrderDailyAggregate
 from users.models import Employee
 
 
 GROUPING_VALUES = {"", "none", "client", "manager"}
 
+# размер пачки для .iterator()
+REPORT_CHUNK_SIZE = 2000
+# шаг индекса смещений в CSV (и размер пачки записи в storage) и размер кешируемой первой страницы
+REPORT_INDEX_EVERY = 1000
+REPORT_PREVIEW_PAGE = 200
+
+MONEY = Decimal("0.01")
+
 
 def _order_period_q(period_from, period_to):
     q = Q()
@@ -21,77 +28,68 @@ def _order_period_q(period_from, period_to):
 def _orders_queryset(period_from, period_to):
     q = _order_period_q(period_from, period_to)
     qs = (
-        Order.objects.select_related("client", "manager")
+        Order.objects
         .filter(q)
         .order_by("-date", "number")
     )
     return qs
 
 
+def _iso(d):
+    return d.isoformat() if d else ""
+
+
+def _money(value):
+    # Decimal, а не строка: CSV/JSONL пишут его как в API, XLSX — числовой ячейкой
+    return Decimal(value or 0).quantize(MONEY)
+
+
+def _grouped_rows(period_from, period_to, field):
+    # группировки по клиенту/менеджеру читаем из дневных агрегатов: O(дни × группы), а не O(заказы)
+    qs = (
+        OrderDailyAggregate.objects
+        .filter(_order_period_q(period_from, period_to))
+        .values(field)
+        .annotate(
+            orders_count=Sum("orders_count"),
+            amount_total_sum=Sum("amount_total_sum"),
+        )
+        .order_by(field)
+        .values_list(field, "orders_count", "amount_total_sum")
+    )
+    for name, orders_count, amount_total_sum in qs.iterator(chunk_size=REPORT_CHUNK_SIZE):
+        yield (name, orders_count, _money(amount_total_sum))
+
+
 def build_orders_report(period_from, period_to, grouping: str):
+    """Возвращает (columns, rows), где rows — генератор кортежей в порядке columns."""
     grouping = (grouping or "").strip().lower()
     if grouping in ("", "none"):
         columns = [
             "number", "date", "client", "department", "manager",
             "status", "priority", "order_type", "planned_date", "amount_total",
         ]
-        rows = []
-        for o in _orders_queryset(period_from, period_to):
-            rows.append({
-                "number": o.number,
-                "date": o.date.isoformat() if o.date else "",
-                "client": str(o.client),
-                "department": o.department,
-                "manager": str(o.manager),
-                "status": o.status,
-                "priority": o.priority,
-                "order_type": o.order_type,
-                "planned_date": o.planned_date.isoformat() if o.planned_date else "",
-                "amount_total": str(o.amount_total),
-            })
-        return columns, rows
+        qs = _orders_queryset(period_from, period_to).values_list(
+            "number", "date", "client__name", "department", "manager__full_name",
+            "status", "priority", "order_type", "planned_date", "amount_total",
+        )
+
+        def rows():
+            for (number, date, client, department, manager,
+                 status, priority, order_type, planned_date, amount_total) in qs.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (
+                    number, _iso(date), client, department, manager,
+                    status, priority, order_type, _iso(planned_date), _money(amount_total),
+                )
+        return columns, rows()
 
     if grouping == "client":
-        qs = (
-            Order.objects
-            .filter(_order_period_q(period_from, period_to))
-            .values("client__name")
-            .annotate(
-                orders_count=Count("id"),
-                amount_total_sum=Sum("amount_total"),
-            )
-            .order_by("client__name")
-        )
         columns = ["client", "orders_count", "amount_total_sum"]
-        rows = []
-        for r in qs:
-            rows.append({
-                "client": r["client__name"],
-                "orders_count": r["orders_count"],
-                "amount_total_sum": str(r["amount_total_sum"] or 0),
-            })
-        return columns, rows
+        return columns, _grouped_rows(period_from, period_to, "client__name")
 
     if grouping == "manager":
-        qs = (
-            Order.objects
-            .filter(_order_period_q(period_from, period_to))
-            .values("manager__full_name")
-            .annotate(
-                orders_count=Count("id"),
-                amount_total_sum=Sum("amount_total"),
-            )
-            .order_by("manager__full_name")
-        )
         columns = ["manager", "orders_count", "amount_total_sum"]
-        rows = []
-        for r in qs:
-            rows.append({
-                "manager": r["manager__full_name"],
-                "orders_count": r["orders_count"],
-                "amount_total_sum": str(r["amount_total_sum"] or 0),
-            })
-        return columns, rows
+        return columns, _grouped_rows(period_from, period_to, "manager__full_name")
 
     raise ValueError("Неверная группировка для отчёта по заказам")
 
@@ -114,23 +112,24 @@ def build_employees_report(period_from, period_to, grouping: str):
                 amount_total_sum=Sum("orders__amount_total", filter=orders_q),
             )
             .order_by("full_name")
+            .values_list(
+                "full_name", "tab_number", "position", "department", "status",
+                "orders_count", "amount_total_sum",
+            )
         )
         columns = [
             "full_name", "tab_number", "position", "department", "status",
             "orders_count", "amount_total_sum",
         ]
-        rows = []
-        for e in qs:
-            rows.append({
-                "full_name": e.full_name,
-                "tab_number": e.tab_number,
-                "position": e.position,
-                "department": e.department,
-                "status": e.status,
-                "orders_count": e.orders_count or 0,
-                "amount_total_sum": str(e.amount_total_sum or 0),
-            })
-        return columns, rows
+
+        def rows():
+            for (full_name, tab_number, position, department, status,
+                 orders_count, amount_total_sum) in qs.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (
+                    full_name, tab_number, position, department, status,
+                    orders_count or 0, _money(amount_total_sum),
+                )
+        return columns, rows()
 
     # Если хотите — можно расширить: grouping=department
     if grouping == "department":
@@ -143,17 +142,14 @@ def build_employees_report(period_from, period_to, grouping: str):
                 amount_total_sum=Sum("orders__amount_total", filter=orders_q),
             )
             .order_by("department")
+            .values_list("department", "employees_count", "orders_count", "amount_total_sum")
         )
         columns = ["department", "employees_count", "orders_count", "amount_total_sum"]
-        rows = []
-        for r in qs:
-            rows.append({
-                "department": r["department"],
-                "employees_count": r["employees_count"],
-                "orders_count": r["orders_count"],
-                "amount_total_sum": str(r["amount_total_sum"] or 0),
-            })
-        return columns, rows
+
+        def rows():
+            for department, employees_count, orders_count, amount_total_sum in qs.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (department, employees_count, orders_count, _money(amount_total_sum))
+        return columns, rows()
 
     raise ValueError("Неверная группировка для отчёта по сотрудникам")
 
@@ -164,62 +160,55 @@ def build_finance_report(period_from, period_to, grouping: str):
 
     if grouping in ("", "none"):
         columns = ["date", "number", "client", "manager", "amount_total"]
-        rows = []
-        for o in _orders_queryset(period_from, period_to):
-            rows.append({
-                "date": o.date.isoformat() if o.date else "",
-                "number": o.number,
-                "client": str(o.client),
-                "manager": str(o.manager),
-                "amount_total": str(o.amount_total),
-            })
-        return columns, rows
+        qs = _orders_queryset(period_from, period_to).values_list(
+            "date", "number", "client__name", "manager__full_name", "amount_total",
+        )
+
+        def rows():
+            for date, number, client, manager, amount_total in qs.iterator(chunk_size=REPORT_CHUNK_SIZE):
+                yield (_iso(date), number, client, manager, _money(amount_total))
+        return columns, rows()
 
     if grouping == "client":
-        qs = (
-            Order.objects
-            .filter(_order_period_q(period_from, period_to))
-            .values("client__name")
-            .annotate(
-                orders_count=Count("id"),
-                amount_total_sum=Sum("amount_total"),
-            )
-            .order_by("client__name")
-        )
         columns = ["client", "orders_count", "amount_total_sum"]
-        rows = []
-        for r in qs:
-            rows.append({
-                "client": r["client__name"],
-                "orders_count": r["orders_count"],
-                "amount_total_sum": str(r["amount_total_sum"] or 0),
-            })
-        return columns, rows
+        return columns, _grouped_rows(period_from, period_to, "client__name")
 
     if grouping == "manager":
-        qs = (
-            Order.objects
-            .filter(_order_period_q(period_from, period_to))
-            .values("manager__full_name")
-            .annotate(
-                orders_count=Count("id"),
-                amount_total_sum=Sum("amount_total"),
-            )
-            .order_by("manager__full_name")
-        )
         columns = ["manager", "orders_count", "amount_total_sum"]
-        rows = []
-        for r in qs:
-            rows.append({
-                "manager": r["manager__full_name"],
-                "orders_count": r["orders_count"],
-                "amount_total_sum": str(r["amount_total_sum"] or 0),
-            })
-        return columns, rows
+        return columns, _grouped_rows(period_from, period_to, "manager__full_name")
 
     raise ValueError("Неверная группировка для финансового отчёта")
 
 
+def normalize_grouping(report_type: str, grouping: str) -> str:
+    """
+    Нормализуем старые/текстовые значения grouping:
+    - "по клиентам" -> client
+    - "по менеджерам" -> manager
+    - "по подразделениям" -> department
+    - для employees client/manager принудительно превращаем в none
+    """
+    rt = (report_type or "").strip().lower()
+    g = (grouping or "").strip().lower()
+
+    if g in ("", "none"):
+        g = "none"
+
+    # русские/свободные формулировки (на случай старых записей)
+    if "клиент" in g:
+        g = "client"
+    elif "менедж" in g:
+        g = "manager"
+    elif "подраз" in g:
+        g = "department"
+
+    # отчёт по сотрудникам не поддерживает client/manager
+    if rt == "employees" and g in ("client", "manager"):
+        g = "none"
+
+    return g
+
+
 def build_report_data(report_type: str, period_from, period_to, grouping: str):
     report_type = (report_type or "").strip().lower()
     grouping = (grouping or "").strip().lower()
@@ -237,13 +226,3 @@ def build_report_data(report_type: str, period_from, period_to, grouping: str):
         return build_finance_report(period_from, period_to, grouping)
 
     raise ValueError("Неверный report_type")
-
-
-def render_csv_bytes(columns, rows):
-    # UTF-8 with BOM — чтобы Excel открывал нормально
-    buf = io.StringIO(newline="")
-    writer = csv.DictWriter(buf, fieldnames=columns)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-    return buf.getvalue().encode("utf-8-sig")
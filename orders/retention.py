@@ -0,0 +1,258 @@
+"""
+Хранение файлов отчётов (media/reports/).
+
+- При перегенерации прежний файл и его индекс удаляются после коммита, если на них
+  больше не ссылается ни один отчёт (try_reuse раздаёт один файл нескольким отчётам).
+- TTL: отчёт, который не открывали дольше ttl_days (по умолчанию REPORTS_TTL_DAYS),
+  вытесняется — файл удаляется, статус становится "evicted".
+- Бюджет: пока файлы занимают больше REPORTS_STORAGE_BUDGET_MB, вытесняются файлы,
+  которые дольше всех не скачивали (LRU по last_accessed_at).
+- Вытесненный отчёт пересобирается при следующем обращении (см. ReportViewSet._ensure_ready).
+
+Запуск: manage.py report_storage [--enforce] [--dry-run]; после каждой генерации
+бюджет проверяется автоматически (schedule_retention).
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from system.versioning import bump_tables
+
+from .models import Report
+
+
+REPORTS_DIR = "reports"
+
+# last_accessed_at пишется не чаще, чем раз в TOUCH_EVERY
+TOUCH_EVERY = datetime.timedelta(minutes=5)
+
+# файлы без отчёта моложе этого возраста не трогаем: их может прямо сейчас писать воркер
+ORPHAN_GRACE = datetime.timedelta(hours=1)
+
+
+def storage_budget() -> int:
+    return settings.REPORTS_STORAGE_BUDGET_MB * 1024 * 1024
+
+
+def default_ttl() -> datetime.timedelta:
+    return datetime.timedelta(days=settings.REPORTS_TTL_DAYS)
+
+
+def report_files(report: Report):
+    """Файл отчёта и его sidecar-индекс."""
+    names = [report.file.name] if report.file else []
+    index_name = (report.params or {}).get("index_file")
+    if index_name:
+        names.append(index_name)
+    return names
+
+
+def _referenced(file_name: str, exclude_pks=()) -> bool:
+    return Report.objects.filter(file=file_name).exclude(pk__in=exclude_pks).exists()
+
+
+def delete_unreferenced(names, exclude_pks=(), storage=None):
+    """
+    Удаляет файлы, на которые (кроме exclude_pks) не ссылается ни один отчёт.
+    names[0] — файл отчёта, остальные — его индекс. Возвращает удалённые имена.
+    """
+    storage = storage or default_storage
+    names = [n for n in names if n]
+    if not names or _referenced(names[0], exclude_pks):
+        return []
+    deleted = []
+    for name in names:
+        if storage.exists(name):
+            storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+def release_files(names, exclude_pks=()):
+    """Удалить файлы после коммита (старый файл при перегенерации, удалённый отчёт)."""
+    names = list(names)
+    if names:
+        transaction.on_commit(lambda: delete_unreferenced(names, exclude_pks))
+
+
+def touch(report: Report):
+    """Отметить обращение к файлу отчёта (скачивание/preview)."""
+    now = timezone.now()
+    if report.last_accessed_at and now - report.last_accessed_at < TOUCH_EVERY:
+        return
+    report.last_accessed_at = now
+    # version не поднимаем: это служебное поле, оно не должно конфликтовать с правками пользователя
+    Report.objects.filter(pk=report.pk).update(last_accessed_at=now)
+    bump_tables(Report)
+
+
+def evict_report(report: Report) -> list:
+    """Переводит готовый отчёт в "evicted" и удаляет его файлы, если они больше ничьи."""
+    names = report_files(report)
+    params = {k: v for k, v in (report.params or {}).items() if k not in ("index_file", "sha256")}
+    params["progress"] = {"phase": "evicted", "rows_written": 0}
+    with transaction.atomic():
+        updated = Report.objects.filter(pk=report.pk, status="ready", file=report.file.name).update(
+            status="evicted", file="", params=params, file_size=0, version=F("version") + 1,
+        )
+        if not updated:
+            # отчёт уже перегенерировали или удалили
+            return []
+        bump_tables(Report)
+    report.status, report.file.name, report.params, report.file_size = "evicted", "", params, 0
+    return delete_unreferenced(names, exclude_pks=[report.pk])
+
+
+def _file_size(report: Report) -> int:
+    if report.file_size:
+        return report.file_size
+    size = 0
+    for name in report_files(report):
+        try:
+            size += report.file.storage.size(name)
+        except OSError:
+            pass
+    if size:
+        Report.objects.filter(pk=report.pk).update(file_size=size)
+    return size
+
+
+def stored_files():
+    """
+    Готовые файлы отчётов: {file_name: {"size", "last_access", "reports": [Report]}}.
+    Один файл может принадлежать нескольким отчётам (кеш результатов).
+    """
+    files = defaultdict(lambda: {"size": 0, "last_access": None, "reports": []})
+    qs = Report.objects.filter(status="ready").exclude(file="").only(
+        "id", "file", "params", "status", "file_size", "last_accessed_at", "ttl_days",
+    )
+    for report in qs.iterator(chunk_size=2000):
+        entry = files[report.file.name]
+        entry["reports"].append(report)
+        entry["size"] = max(entry["size"], _file_size(report))
+        accessed = report.last_accessed_at
+        if accessed and (entry["last_access"] is None or accessed > entry["last_access"]):
+            entry["last_access"] = accessed
+    return files
+
+
+def orphan_files(storage=None, grace=ORPHAN_GRACE):
+    """Файлы в reports/, на которые не ссылается ни один отчёт: [(name, size)]."""
+    storage = storage or default_storage
+    try:
+        _, names = storage.listdir(REPORTS_DIR)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    known = set()
+    for file_name, params in Report.objects.exclude(file="").values_list("file", "params"):
+        known.add(file_name)
+        index_name = (params or {}).get("index_file")
+        if index_name:
+            known.add(index_name)
+
+    cutoff = timezone.now() - grace
+    orphans = []
+    for name in names:
+        path = f"{REPORTS_DIR}/{name}"
+        if path in known:
+            continue
+        try:
+            if storage.get_modified_time(path) > cutoff:
+                continue
+            orphans.append((path, storage.size(path)))
+        except OSError:
+            continue
+    return orphans
+
+
+def storage_usage(with_orphans=True) -> dict:
+    files = stored_files()
+    usage = {
+        "budget_bytes": storage_budget(),
+        "ttl_days": settings.REPORTS_TTL_DAYS,
+        "files": len(files),
+        "bytes": sum(entry["size"] for entry in files.values()),
+        "reports": {row["status"]: row["n"] for row in _status_counts()},
+    }
+    if with_orphans:
+        orphans = orphan_files()
+        usage["orphan_files"] = len(orphans)
+        usage["orphan_bytes"] = sum(size for _, size in orphans)
+    return usage
+
+
+def _status_counts():
+    return Report.objects.order_by().values("status").annotate(n=Count("id"))
+
+
+def _expired(report: Report, now) -> bool:
+    ttl = datetime.timedelta(days=report.ttl_days) if report.ttl_days is not None else default_ttl()
+    return report.last_accessed_at is not None and report.last_accessed_at + ttl < now
+
+
+def enforce_retention(dry_run=False, orphans=False, now=None) -> dict:
+    """
+    Вытесняет отчёты по TTL, затем LRU-файлы, пока занятое место больше бюджета.
+    orphans=True — заодно удаляет файлы без отчёта (например, оставшиеся от старых перегенераций).
+    Возвращает {"expired": [...], "evicted": [...], "orphans": [...], "freed_bytes": N, "bytes": N}.
+    """
+    now = now or timezone.now()
+    files = stored_files()
+    result = {"expired": [], "evicted": [], "orphans": [], "freed_bytes": 0}
+
+    # TTL — по отчётам: файл уходит, когда истекли все ссылающиеся на него отчёты
+    for name, entry in list(files.items()):
+        expired = [r for r in entry["reports"] if _expired(r, now)]
+        for report in expired:
+            result["expired"].append(report.pk)
+            if not dry_run:
+                evict_report(report)
+        if len(expired) == len(entry["reports"]):
+            result["freed_bytes"] += entry["size"]
+            del files[name]
+        else:
+            entry["reports"] = [r for r in entry["reports"] if r not in expired]
+
+    # бюджет — по файлам, давно не открывавшиеся первыми (без отметки — самые старые)
+    used = sum(entry["size"] for entry in files.values())
+    budget = storage_budget()
+    oldest = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+    for name, entry in sorted(files.items(), key=lambda item: item[1]["last_access"] or oldest):
+        if used <= budget:
+            break
+        for report in entry["reports"]:
+            result["evicted"].append(report.pk)
+            if not dry_run:
+                evict_report(report)
+        used -= entry["size"]
+        result["freed_bytes"] += entry["size"]
+
+    if orphans:
+        for name, size in orphan_files():
+            result["orphans"].append(name)
+            result["freed_bytes"] += size
+            if not dry_run:
+                default_storage.delete(name)
+
+    result["bytes"] = used
+    return result
+
+
+def schedule_retention():
+    """Проверка бюджета после коммита (вызывается после генерации отчёта)."""
+    transaction.on_commit(_enforce_budget)
+
+
+def _enforce_budget():
+    # дешёвая оценка по file_size; полный проход — только если бюджет превышен
+    sizes = (
+        Report.objects.filter(status="ready").exclude(file="")
+        .order_by().values("file").annotate(size=Max("file_size")).values_list("size", flat=True)
+    )
+    if sum(sizes) > storage_budget():
+        enforce_retention()
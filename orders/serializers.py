@@ -1,12 +1,40 @@
 from dataclasses import field
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from users.serializers import ClientSerializer, EmployeeSerializer
+from .exporters import EXPORTERS
 from .models import Order, OrderItem, OrderStatusDict, Report, Integration
+from .numbering import check_department_fits, looks_generated
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Order
-        fields = "__all__"
+def query_list(request, name):
+    """?name=a,b&name=c -> ["a", "b", "c"]"""
+    if request is None:
+        return []
+    values = []
+    for raw in request.query_params.getlist(name):
+        values.extend(v.strip() for v in raw.split(",") if v.strip())
+    return values
+
+
+def validate_manual_number(value):
+    # такой номер однажды выдала бы последовательность (orders/numbering.py)
+    if looks_generated(value):
+        raise serializers.ValidationError(
+            f"Номера вида {settings.ORDER_NUMBER_FORMAT} выдаются автоматически — оставьте поле пустым"
+        )
+    return value
+
+
+def validate_numbered_department(department):
+    """Номер будет выдан из последовательности — подразделение должно в него поместиться."""
+    try:
+        check_department_fits(department)
+    except DjangoValidationError as e:
+        raise serializers.ValidationError({"department": e.messages})
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -15,6 +43,102 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class OrderSerializer(serializers.ModelSerializer):
+    """
+    На чтении поддерживает:
+    ?fields=number,status — только перечисленные поля;
+    ?expand=items,client,manager — вложенные позиции / клиент / менеджер вместо id.
+    Неизвестное имя в любом из них — 400 (unknown_query_names), а не молча пустой ответ.
+    Queryset под эти параметры собирает OrderViewSet.get_queryset.
+    """
+    EXPANDABLE = {
+        "items": lambda: OrderItemSerializer(many=True, read_only=True),
+        "client": lambda: ClientSerializer(read_only=True),
+        "manager": lambda: EmployeeSerializer(read_only=True),
+    }
+
+    class Meta:
+        model = Order
+        fields = "__all__"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        expand = self.requested_expand(request)
+        for name in expand:
+            self.fields[name] = self.EXPANDABLE[name]()
+
+        only = query_list(request, "fields")
+        if only:
+            keep = set(only) | set(expand)
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+
+    @classmethod
+    def unknown_query_names(cls, request) -> dict:
+        """{"fields": [...], "expand": [...]} — имена, которых нет у сериализатора; пусто — всё известно."""
+        known = {*cls().fields, *cls.EXPANDABLE}
+        unknown = {
+            "fields": [name for name in query_list(request, "fields") if name not in known],
+            "expand": [name for name in query_list(request, "expand") if name not in cls.EXPANDABLE],
+        }
+        return {param: [f"Неизвестное поле: {', '.join(names)}"] for param, names in unknown.items() if names}
+
+    @classmethod
+    def requested_expand(cls, request):
+        return [name for name in dict.fromkeys(query_list(request, "expand")) if name in cls.EXPANDABLE]
+
+    def validate_number(self, value):
+        if self.instance is not None and value == self.instance.number:
+            return value
+        return validate_manual_number(value)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        # пустой номер Order.save() выдаёт из последовательности
+        if not attrs.get("number", getattr(self.instance, "number", "")):
+            validate_numbered_department(attrs.get("department", getattr(self.instance, "department", "")))
+        return attrs
+
+
+class BulkOrderItemSerializer(serializers.Serializer):
+    # amount не принимаем: считается на сервере как qty * price
+    name = serializers.CharField(max_length=255)
+    qty = serializers.DecimalField(max_digits=12, decimal_places=3)
+    unit = serializers.CharField(max_length=32, default="шт")
+    price = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    """
+    Строка массовой загрузки. client/manager — просто id: существование проверяется
+    одним запросом на всю пачку (orders/bulk.py), а не запросом на строку.
+    amount_total считается из позиций.
+    """
+    # без номера — выдаётся из последовательности (orders/numbering.py)
+    number = serializers.CharField(max_length=32, required=False, allow_blank=True, default="")
+    client = serializers.IntegerField()
+    manager = serializers.IntegerField()
+    department = serializers.CharField(max_length=128)
+    status = serializers.ChoiceField(choices=Order.STATUS, default="new")
+    priority = serializers.CharField(max_length=32, default="Обычный")
+    order_type = serializers.CharField(max_length=64, default="Поставка оборудования")
+    planned_date = serializers.DateField(required=False, allow_null=True, default=None)
+    items = BulkOrderItemSerializer(many=True, required=False, default=list)
+
+    def validate_number(self, value):
+        return validate_manual_number(value)
+
+    def validate(self, attrs):
+        if not attrs["number"]:
+            validate_numbered_department(attrs["department"])
+        return attrs
+
+
 class OrderStatusDictSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
@@ -26,8 +150,8 @@ class OrderStatusDictSerializer(serializers.ModelSerializer):
 class ReportSerializer(serializers.ModelSerializer):
     def validate_format(self, value):
         v = (value or "").upper()
-        if v != "CSV":
-            raise serializers.ValidationError("Сейчас поддерживается только CSV")
+        if v not in EXPORTERS:
+            raise serializers.ValidationError(f"Доступные форматы: {', '.join(EXPORTERS)}")
         return v
 
     def validate_grouping(self, value):
@@ -0,0 +1,149 @@
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from system.search import ensure_fts5
+from system.versioning import bump_tables
+from users.models import Client, Employee
+
+from .aggregates import apply_order_changes
+from .models import Integration, Order, OrderItem, OrderStatusDict, Report
+from .report_cache import bump_dates, bump_global
+from .retention import release_files, report_files
+
+
+# Поля снимка заказа, от которых зависят производные данные (агрегаты, кеш отчётов)
+ORDER_STATE_FIELDS = ("id", "date", "client_id", "manager_id", "department", "status", "amount_total")
+
+# Изменение набора заказов. kwargs: before, after — списки снимков (dict по ORDER_STATE_FIELDS).
+# Одиночные save()/delete() шлют его из обработчиков ниже, массовые пути (bulk_create, update()) — сами.
+orders_changed = Signal()
+
+# заказы, удаляемые сейчас: id -> origin удаления (объект или QuerySet, с которого начался каскад)
+_deleting_orders = ContextVar("deleting_orders", default=None)
+
+
+def order_state(order: Order) -> dict:
+    return {f: getattr(order, f) for f in ORDER_STATE_FIELDS}
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    # старое состояние нужно, чтобы снять заказ с прежнего дня/статуса
+    instance._old_state = None
+    if instance.pk:
+        instance._old_state = (
+            Order.objects.filter(pk=instance.pk).values(*ORDER_STATE_FIELDS).first()
+        )
+
+
+@receiver(post_save, sender=Order)
+def order_saved(sender, instance, **kwargs):
+    old = getattr(instance, "_old_state", None)
+    orders_changed.send(Order, before=[old] if old else [], after=[order_state(instance)])
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order_state(sender, instance, origin=None, **kwargs):
+    # order.delete() — объект мог устареть (статус сменили update()), снимаем агрегаты по строке из БД;
+    # при каскаде и QuerySet.delete() экземпляры только что выбраны коллектором
+    instance._old_state = None
+    if origin is instance:
+        instance._old_state = Order.objects.filter(pk=instance.pk).values(*ORDER_STATE_FIELDS).first()
+    # коллектор шлёт pre_delete всем удаляемым объектам до первого DELETE:
+    # позиции этого заказа (item_deleted) увидят, что сумму трогать не нужно
+    deleting = _deleting_orders.get()
+    if deleting is None:
+        deleting = {}
+        _deleting_orders.set(deleting)
+    deleting[instance.pk] = origin
+
+
+@receiver(post_delete, sender=Order)
+def order_deleted(sender, instance, **kwargs):
+    (_deleting_orders.get() or {}).pop(instance.pk, None)
+    state = getattr(instance, "_old_state", None) or order_state(instance)
+    orders_changed.send(Order, before=[state], after=[])
+
+
+@receiver(orders_changed)
+def update_daily_aggregates(sender, before, after, **kwargs):
+    apply_order_changes(before, after)
+
+
+@receiver(orders_changed)
+def invalidate_report_cache(sender, before, after, **kwargs):
+    bump_dates(row["date"] for row in [*before, *after])
+
+
+@receiver(orders_changed)
+def bump_orders_version(sender, before, after, **kwargs):
+    bump_tables(Order)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=OrderStatusDict)
+@receiver(post_delete, sender=OrderStatusDict)
+@receiver(post_save, sender=Integration)
+@receiver(post_delete, sender=Integration)
+def bump_table_version(sender, instance, **kwargs):
+    # ETag списков/объектов API и справочники в памяти (system/versioning.py, system/dictcache.py);
+    # Order — через orders_changed
+    bump_tables(sender)
+
+
+def restore_search_index(sender, using="default", **kwargs):
+    # подключается в OrdersConfig.ready: после migrate, если миграция пересоздала таблицу модели
+    ensure_fts5(connections[using])
+
+
+@receiver(post_delete, sender=Report)
+def release_report_files(sender, instance, **kwargs):
+    # файл удалённого отчёта больше не нужен, если его не переиспользует другой отчёт
+    release_files(report_files(instance), exclude_pks=[instance.pk])
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_line(sender, instance, **kwargs):
+    instance._old_line = None
+    if instance.pk:
+        instance._old_line = (
+            OrderItem.objects.filter(pk=instance.pk).values_list("order_id", "amount").first()
+        )
+
+
+@receiver(post_save, sender=OrderItem)
+def item_saved(sender, instance, **kwargs):
+    from .totals import apply_total_deltas, item_deltas
+    old = getattr(instance, "_old_line", None)
+    apply_total_deltas(item_deltas([old] if old else [], [(instance.order_id, instance.amount)]))
+
+
+@receiver(post_delete, sender=OrderItem)
+def item_deleted(sender, instance, origin=None, **kwargs):
+    # позиции удаляются каскадом вместе с заказом (с чего бы ни начался каскад) — сумму
+    # удаляемого заказа не трогаем: агрегаты снимут заказ целиком. Сверка с origin — чтобы
+    # запись, оставшаяся от прерванного удаления, не задела позиции живого заказа
+    deleting = _deleting_orders.get() or {}
+    if instance.order_id in deleting and deleting[instance.order_id] is origin:
+        return
+    from .totals import apply_total_deltas, item_deltas
+    apply_total_deltas(item_deltas([(instance.order_id, instance.amount)], []))
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def directory_changed(sender, instance, **kwargs):
+    # ФИО менеджеров и названия клиентов попадают во все отчёты
+    bump_global()
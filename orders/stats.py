@@ -0,0 +1,65 @@
+"""
+Статистика заказов для дашборда.
+
+Без фильтров считается по дневным агрегатам (OrderDailyAggregate): O(дни × группы),
+а не O(заказы). С фильтрами (?status=, ?client=, ...) — GROUP BY по отфильтрованным заказам.
+«Просроченные» зависят от planned_date, которой нет в агрегатах, — это один COUNT по заказам.
+by_date — только за окно: границы фильтра по дате (?date__gte=, ?date__lte=), а без них —
+последние STATS_BY_DATE_DAYS дней; график не тянет всю историю.
+
+Ответ кешируется до следующей записи в заказы (версия таблицы, system/versioning.py)
+и не дольше STATS_CACHE_TTL секунд.
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .filters import overdue_q
+from .models import Order, OrderDailyAggregate
+
+
+def _counts(queryset, field, count):
+    return {
+        (key.isoformat() if hasattr(key, "isoformat") else key): n
+        for key, n in queryset.order_by(field).values(field).annotate(n=count).values_list(field, "n")
+        if n
+    }
+
+
+def by_date_window(today, date_from=None, date_to=None):
+    """Границы by_date: заданные фильтром, по умолчанию — STATS_BY_DATE_DAYS дней по today."""
+    date_to = date_to or today
+    date_from = date_from or date_to - datetime.timedelta(days=settings.STATS_BY_DATE_DAYS - 1)
+    return date_from, date_to
+
+
+def order_stats(queryset=None, today=None, date_from=None, date_to=None) -> dict:
+    """
+    {"total", "active", "overdue", "by_status", "by_department", "by_date", "by_date_period"}.
+    queryset=None — все заказы (по агрегатам).
+    active — все, кроме отменённых; overdue — новые с planned_date раньше today;
+    by_date — за date_from..date_to (см. by_date_window).
+    """
+    today = today or timezone.localdate()
+    date_from, date_to = by_date_window(today, date_from, date_to)
+    if queryset is None:
+        source, count = OrderDailyAggregate.objects.all(), Sum("orders_count")
+        orders = Order.objects.all()
+    else:
+        source, count = queryset, Count("id")
+        orders = queryset
+
+    by_status = {code: 0 for code, _ in Order.STATUS}
+    by_status.update(_counts(source, "status", count))
+    total = sum(by_status.values())
+    return {
+        "total": total,
+        "active": total - by_status.get("canceled", 0),
+        "overdue": orders.filter(overdue_q(today)).order_by().count(),
+        "by_status": by_status,
+        "by_department": _counts(source, "department", count),
+        "by_date": _counts(source.filter(date__range=(date_from, date_to)), "date", count),
+        "by_date_period": {"from": date_from.isoformat(), "to": date_to.isoformat()},
+    }
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .jobs import run_report_job
+
+
+@shared_task(ignore_result=True)
+def generate_report_task(report_id: int, job: str = None):
+    run_report_job(report_id, job)
@@ -1,3 +1,1665 @@
-from django.test import TestCase
+import base64
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.deletion import Collector
+from django.db.models.functions import Coalesce
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from system import dbrouter, search
+from system.concurrency import StaleObjectError
+from system.concurrency import exception_handler as concurrency_exception_handler
+from system.dbrouter import ReportingRouter
+from system.fastlist import compile_row_plan
+from system.pagination import KeysetPagination
+from system.versioning import _bump_db, bump_tables, table_versions, versions_store
+from users.models import Client, Employee, Role, User
+from users.serializers import ClientSerializer, EmployeeSerializer
+from users.views import ClientViewSet, EmployeeViewSet
+
+from . import numbering, report_cache, retention
+from .aggregates import AGGREGATE_KEY_FIELDS, rebuild_aggregates
+from .exporters import EXPORTERS, XlsxReportStream, read_csv_page
+from .jobs import enqueue_report, run_report_job
+from .models import (
+    NumberSequence, Order, OrderDailyAggregate, OrderItem, OrderStatusDict, Report, ReportDataStamp, TableVersion,
+)
+from .numbering import allocate_numbers, check_number_format, next_order_number
+from .reporting import REPORT_INDEX_EVERY, REPORT_PREVIEW_PAGE, build_report_data
+from .serializers import OrderSerializer
+from .signals import orders_changed
+from .totals import check_item_amounts, check_order_totals
+from .transitions import _locked_states, transition_orders
+from .views import OrderViewSet
+
+
+class QueryPlanTests(TestCase):
+    """
+    Страж индексов: для каждого фильтра списка заказов и каждого запроса отчётов
+    смотрим EXPLAIN QUERY PLAN и падаем на полном скане orders_order или сортировке во временном B-tree.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        for i in range(30):
+            Order.objects.create(
+                number=f"N-{i:04d}", client=cls.client_obj, manager=cls.manager,
+                department="Отдел", amount_total=Decimal("10.00"),
+                planned_date=datetime.date.today(),
+            )
+
+    def setUp(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN есть только в SQLite")
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def assertPlanUsesIndexes(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        for line in plan:
+            self.assertNotIn("USE TEMP B-TREE", line, f"{sql}\n{plan}")
+            if line.startswith("SCAN orders_order"):
+                self.assertIn("INDEX", line, f"{sql}\n{plan}")
+
+    def order_queries(self, sqls):
+        return [q["sql"] for q in sqls if '"orders_order"' in q["sql"]]
+
+    def test_order_list_filters(self):
+        today = datetime.date.today().isoformat()
+        values = {
+            "status": "new",
+            "priority": "Обычный",
+            "order_type": "Поставка оборудования",
+            "manager": self.manager.pk,
+            "client": self.client_obj.pk,
+            "department": "Отдел",
+            "date": today,
+        }
+        month_ago = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+        values.update({
+            "status__in": "new,ready",
+            "client__in": f"{self.client_obj.pk},0",
+            "date__gte": month_ago,
+            "date__lte": today,
+            "planned_date": today,
+            "planned_date__gte": month_ago,
+            "planned_date__lte": today,
+            "amount_total__gte": "1",
+            "amount_total__lte": "100",
+            "overdue": "false",
+        })
+        self.assertEqual(set(values) | {"overdue"}, set(OrderViewSet.filterset_class.base_filters))
+
+        urls = ["/api/v1/orders/?page_size=5"]
+        urls += [f"/api/v1/orders/?page_size=5&{f}={v}" for f, v in values.items()]
+        for url in urls:
+            with self.subTest(url=url):
+                # первая страница и страница по курсору
+                with CaptureQueriesContext(connection) as ctx:
+                    next_url = self.api.get(url).json()["next"]
+                    self.assertIsNotNone(next_url)
+                    self.api.get(next_url)
+                sqls = self.order_queries(ctx.captured_queries)
+                self.assertTrue(sqls)
+                for sql in sqls:
+                    self.assertPlanUsesIndexes(sql)
+
+    def test_overdue_uses_index(self):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        Order.objects.filter(pk__in=Order.objects.order_by("pk").values("pk")[:3]).update(planned_date=yesterday)
+        response = self.api.get("/api/v1/orders/?overdue=true&page_size=50")
+        self.assertEqual(len(response.json()["results"]), 3)
+        with CaptureQueriesContext(connection) as ctx:
+            stats = self.api.get("/api/v1/orders/stats/").json()
+        self.assertEqual(stats["overdue"], 3)
+        for sql in self.order_queries(ctx.captured_queries):
+            self.assertPlanUsesIndexes(sql)
+
+    def test_report_queries(self):
+        period = (datetime.date.today() - datetime.timedelta(days=30), datetime.date.today())
+        for report_type in ("orders", "finance"):
+            for period_from, period_to in [(None, None), period]:
+                with self.subTest(report_type=report_type, period=(period_from, period_to)):
+                    with CaptureQueriesContext(connection) as ctx:
+                        _, rows = build_report_data(report_type, period_from, period_to, "none")
+                        list(rows)
+                    sqls = self.order_queries(ctx.captured_queries)
+                    self.assertTrue(sqls)
+                    for sql in sqls:
+                        self.assertPlanUsesIndexes(sql)
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск (system/search.py): индекс следует за данными при любом пути записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Рога и копыта", contact_person="Пётр Сидоров")
+        cls.manager = Employee.objects.create(
+            full_name="Иванова Алёна", tab_number="T-17", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        cls.order = Order.objects.create(number="ЗК-2025-000123", client=cls.client_obj, manager=cls.manager)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def search(self, q, kinds=""):
+        results = self.api.get(f"/api/v1/search/?q={q}&kinds={kinds}").json()["results"]
+        return [(r["kind"], r["id"]) for r in results]
+
+    def test_global_search(self):
+        self.assertEqual(self.search("петр сид"), [("client", self.client_obj.pk)])
+        self.assertEqual(self.search("алена"), [("employee", self.manager.pk)])
+        self.assertEqual(self.search("000123"), [("order", self.order.pk)])
+        self.assertEqual(self.search("рога", kinds="order"), [])
+        self.assertEqual(self.search(""), [])
+
+    def test_index_follows_writes(self):
+        OrderItem.objects.bulk_create([OrderItem(order=self.order, name="Кабель медный", qty=1, price=1, amount=1)])
+        Order.objects.filter(pk=self.order.pk).update(number="ЗК-2025-000777")
+        url = "/api/v1/orders/?search={}"
+        with CaptureQueriesContext(connection) as ctx:
+            results = self.api.get(url.format("кабель мед")).json()["results"]
+        self.assertEqual([o["id"] for o in results], [self.order.pk])
+        if connection.vendor == "sqlite":
+            # заказы берутся по rowid из совпадений, без прохода по orders_order;
+            # сортируются только найденные строки
+            for sql in [q["sql"] for q in ctx.captured_queries if "MATCH" in q["sql"]]:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = [row[-1] for row in cursor.fetchall()]
+                self.assertFalse([line for line in plan if line.startswith("SCAN orders_order")], plan)
+        self.assertEqual(self.search("000777"), [("order", self.order.pk)])
+        self.assertEqual(self.search("000123"), [])
+
+        OrderItem.objects.filter(order=self.order).delete()
+        self.assertEqual(self.api.get(url.format("кабель")).json()["results"], [])
+        self.order.delete()
+        self.assertEqual(self.search("000777"), [])
+
+    def test_bulk_items_indexed(self):
+        row = {"client": self.client_obj.pk, "manager": self.manager.pk, "department": "Отдел"}
+        rows = [
+            {**row, "items": [{"name": f"Щит распределительный {n}", "qty": "1", "price": "1"} for n in range(30)]},
+            {**row, "items": [{"name": "Ёлка", "qty": "1", "price": "1"}, {"name": "Щит", "qty": "1", "price": "1"}]},
+        ]
+        created = [c["id"] for c in self.api.post("/api/v1/orders/bulk/", rows, format="json").json()["created"]]
+        self.assertEqual(len(created), 2)
+        url = "/api/v1/orders/?search={}"
+        self.assertEqual(sorted(o["id"] for o in self.api.get(url.format("щит")).json()["results"]), created)
+        self.assertEqual([o["id"] for o in self.api.get(url.format("елка щит")).json()["results"]], created[1:])
+        self.assertEqual([o["id"] for o in self.api.get(url.format("распредел")).json()["results"]], created[:1])
+        if search.fts5_installed():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM search_order_pending")
+                self.assertEqual(cursor.fetchone()[0], 0)
+            # после пачки триггеры позиций снова работают
+            OrderItem.objects.create(order_id=created[0], name="Рубильник", qty=1, price=1)
+            self.assertEqual([o["id"] for o in self.api.get(url.format("рубил")).json()["results"]], created[:1])
+
+    @override_settings(SEARCH_BACKEND="auto")
+    def test_auto_fallback_warns(self):
+        if not search.fts5_installed():
+            self.skipTest("SQLite без FTS5")
+        self.addCleanup(search.install_fts5)
+        search.uninstall_fts5()
+        with self.assertLogs("system.search", "WARNING") as logs:
+            backend = search.search_backend()
+        self.assertEqual(type(backend), search._BACKENDS["basic"])
+        self.assertIn("rebuild_search_index", logs.output[0])
+        # индекс поставлен — выбор пересчитывается
+        search.install_fts5()
+        self.assertEqual(type(search.search_backend()), search._BACKENDS["fts5"])
+
+    def test_autocomplete(self):
+        url = "/api/v1/clients/autocomplete/?q={}"
+        self.assertEqual(self.api.get(url.format("рог")).json(), [{"id": self.client_obj.pk, "label": "Рога и копыта"}])
+        self.assertEqual(
+            self.api.get("/api/v1/employees/autocomplete/?q=але").json(),
+            [{"id": self.manager.pk, "label": "Иванова Алёна (T-17)"}],
+        )
+        # версия таблицы поднимается после коммита — тогда же пересобирается массив подсказок
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Client.objects.create(name="Рогатка")
+        self.assertEqual([c["id"] for c in self.api.get(url.format("рог")).json()], [self.client_obj.pk, other.pk])
+        with self.settings(AUTOCOMPLETE_MAX_ROWS=1), self.captureOnCommitCallbacks(execute=True):
+            Client.objects.filter(pk=other.pk).update(name="Роза")
+            bump_tables(Client)
+        with self.settings(AUTOCOMPLETE_MAX_ROWS=1):
+            self.assertEqual([c["label"] for c in self.api.get(url.format("роз")).json()], ["Роза"])
+        # версии в кеше одного процесса: запись в другом воркере массив не увидит — ищем в БД
+        with self.settings(TABLE_VERSIONS_STORE="cache"):
+            Client.objects.filter(pk=other.pk).update(name="Рогожа")
+            self.assertEqual([c["label"] for c in self.api.get(url.format("рогож")).json()], ["Рогожа"])
+
+
+class DictionaryCacheTests(TestCase):
+    """Справочники (system/dictcache.py): из памяти процесса без запросов, до первой записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("admin", password="x", is_staff=True)
+        OrderStatusDict.objects.create(value="new", display="Новый")
+        Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_served_from_memory(self):
+        urls = ["/api/v1/roles/", "/api/v1/integrations/", "/api/v1/dictionaries/order-statuses/",
+                "/api/v1/employees/departments/"]
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.api.get(url)
+                # без общего кеша версии таблиц читаются из БД — это единственный запрос
+                with self.assertNumQueries(1):
+                    second = self.api.get(url)
+                self.assertEqual(first.json(), second.json())
+                self.assertIn("max-age", second["Cache-Control"])
+                self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=second["ETag"]).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderStatusDict.objects.create(value="ready", display="Готов")
+            Employee.objects.create(
+                full_name="Другой", tab_number="T2", position="Менеджер",
+                department="Склад", phone="-", email="s@example.com",
+            )
+        statuses = self.api.get("/api/v1/dictionaries/order-statuses/").json()["results"]
+        self.assertEqual([s["value"] for s in statuses], ["new", "ready"])
+        self.assertEqual(self.api.get("/api/v1/employees/departments/").json(), ["Отдел", "Склад"])
+
+    def test_no_queries_with_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                                  "LOCATION": location}}
+            with self.settings(CACHES=shared):
+                caches.close_all()
+                self.api.get("/api/v1/dictionaries/order-statuses/")
+                with self.assertNumQueries(0):
+                    self.api.get("/api/v1/dictionaries/order-statuses/")
+            caches.close_all()
+
+    @override_settings(ALLOWED_HOSTS=["a.example", "b.example"])
+    def test_links_per_request_host(self):
+        OrderStatusDict.objects.bulk_create([OrderStatusDict(value=f"s{i}", display=f"С{i}") for i in range(3)])
+        url = "/api/v1/dictionaries/order-statuses/"
+        with mock.patch.object(KeysetPagination, "page_size", 2):
+            first = self.api.get(url, HTTP_HOST="a.example").json()
+            with self.assertNumQueries(1):
+                second = self.api.get(url, HTTP_HOST="b.example", secure=True).json()
+            self.assertEqual(first["results"], second["results"])
+            self.assertTrue(first["next"].startswith("http://a.example/api/v1/"), first["next"])
+            self.assertTrue(second["next"].startswith("https://b.example/api/v1/"), second["next"])
+            self.assertEqual(first["next"].split("?")[1], second["next"].split("?")[1])
+            self.assertIsNone(second["previous"])
+
+    def test_not_kept_with_process_local_versions(self):
+        with self.settings(TABLE_VERSIONS_STORE="cache"):
+            self.api.get("/api/v1/roles/")
+            Role.objects.create(name="Новая")  # версия не поднята — как запись в другом воркере
+            self.assertIn("Новая", [r["name"] for r in self.api.get("/api/v1/roles/").json()["results"]])
+
+
+class SnapshotAuthTests(TestCase):
+    """Снимок прав в сессии (users/auth.py): без запросов к БД и отзыв прав во всех воркерах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role = Role.objects.create(name="viewer", can_view_orders=True)
+        User.objects.create_user("viewer", password="x", role=cls.role)
+
+    def login(self):
+        api = APIClient()
+        self.assertEqual(
+            api.post("/api/v1/auth/session/login/", {"username": "viewer", "password": "x"}).status_code, 200
+        )
+        return api
+
+    def test_revoked_in_other_worker(self):
+        api = self.login()
+        self.assertEqual(api.get("/api/v1/orders/").status_code, 200)
+        # другой воркер отзывает право: запись и версия — только в БД
+        Role.objects.filter(pk=self.role.pk).update(can_view_orders=False)
+        _bump_db([Role])
+        self.assertEqual(api.get("/api/v1/orders/").status_code, 403)
+
+    def test_no_auth_queries_with_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                                  "LOCATION": location}}
+            with self.settings(CACHES=shared):
+                caches.close_all()
+                api = self.login()
+                api.get("/api/v1/auth/session/me/")
+                with self.assertNumQueries(0):
+                    me = api.get("/api/v1/auth/session/me/").json()
+                self.assertTrue(me["permissions"]["can_view_orders"])
+            caches.close_all()
+
+    def test_profile_writes_load_real_user(self):
+        api = self.login()
+        password = User.objects.get(username="viewer").password
+        response = api.patch("/api/v1/auth/users/me/", {"email": "viewer@example.com"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(username="viewer")
+        self.assertEqual((user.email, user.password), ("viewer@example.com", password))
+        self.assertIsNotNone(user.last_login)
+        self.assertEqual(api.post(
+            "/api/v1/auth/users/set_password/",
+            {"current_password": "x", "new_password": "Zq7-long-pass"}, format="json",
+        ).status_code, 204)
+        self.assertTrue(APIClient().login(username="viewer", password="Zq7-long-pass"))
+
+    def test_disabled_with_process_local_versions(self):
+        api = self.login()
+        with self.settings(TABLE_VERSIONS_STORE="cache"):
+            # кеш LocMem: снимок не читается, пользователь и роль — из БД
+            with CaptureQueriesContext(connection) as ctx:
+                api.get("/api/v1/auth/session/me/")
+            self.assertTrue(any('"users_user"' in q["sql"] for q in ctx.captured_queries))
+
+
+class TableVersionTests(TestCase):
+    """Версии таблиц (system/versioning.py) общие для процессов: запись в другом воркере видна в этом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Client.objects.create(name="Клиент")
+
+    def test_local_cache_never_holds_versions(self):
+        self.assertEqual(versions_store(), "db")
+        redis = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        with self.settings(CACHES=redis):
+            self.assertEqual(versions_store(), "cache")
+
+    def test_etag_follows_other_worker(self):
+        api = APIClient()
+        etag = api.get("/api/v1/clients/")["ETag"]
+        self.assertEqual(api.get("/api/v1/clients/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # другой воркер: запись и версия — только в БД, кеш этого процесса не тронут
+        Client.objects.create(name="Другой")
+        _bump_db([Client])
+        self.assertEqual(TableVersion.objects.get(label="users.client").version, 1)
+        response = api.get("/api/v1/clients/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 2)
+
+
+class ReportJobTests(TestCase):
+    """Очередь отчётов (orders/jobs.py): статус без ожидания, без двойных задач, потерянные — заново."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.report = Report.objects.create(title="Отчёт", report_type="orders")
+        with self.dispatched() as dispatch:
+            self.assertTrue(enqueue_report(self.report))
+        self.assertEqual(dispatch.call_count, 1)
+
+    @contextmanager
+    def dispatched(self):
+        with mock.patch("orders.jobs._dispatch") as dispatch, self.captureOnCommitCallbacks(execute=True):
+            yield dispatch
+
+    def test_status_answers_at_once(self):
+        started = time.monotonic()
+        response = self.api.get(f"/api/v1/reports/{self.report.pk}/status/?wait=15")
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.json()["status"], "processing")
+
+    def test_no_second_job_while_processing(self):
+        with self.dispatched() as dispatch:
+            self.assertEqual(self.api.post(f"/api/v1/reports/{self.report.pk}/generate/").status_code, 202)
+            self.api.get(f"/api/v1/reports/{self.report.pk}/preview/")
+            self.api.get(f"/api/v1/reports/{self.report.pk}/status/")
+        dispatch.assert_not_called()
+
+    def test_stale_job_requeued(self):
+        lost_job = self.report.params["progress"]["job"]
+        self.report.params["progress"]["updated_at"] -= settings.REPORTS_JOB_STALE_SECONDS + 1
+        Report.objects.filter(pk=self.report.pk).update(params=self.report.params)
+        with self.dispatched() as dispatch:
+            self.api.get(f"/api/v1/reports/{self.report.pk}/status/")
+            self.api.get(f"/api/v1/reports/{self.report.pk}/status/")
+        self.assertEqual(dispatch.call_count, 1)
+        self.report.refresh_from_db()
+        self.assertNotEqual(self.report.params["progress"]["job"], lost_job)
+        # задача, которую сочли потерянной, если всё же дойдёт до воркера — ничего не делает
+        run_report_job(self.report.pk, lost_job)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.params["progress"]["phase"], "queued")
+
+
+class NumberingTests(TransactionTestCase):
+    """Номера заказов (orders/numbering.py). TransactionTestCase: вне транзакции блок резервируется и кешируется."""
+
+    def setUp(self):
+        numbering._blocks.clear()
+        role = Role.objects.create(name="admin", is_admin=True)
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user("admin", password="x", role=role))
+        self.client_obj = Client.objects.create(name="Клиент")
+        self.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def order(self, **fields):
+        return {"client": self.client_obj.pk, "manager": self.manager.pk, "department": "Отдел", **fields}
+
+    @override_settings(ORDER_NUMBER_FORMAT="{department}/{year}/{seq:04d}")
+    def test_format(self):
+        date = datetime.date(2026, 3, 1)
+        self.assertEqual(allocate_numbers("ОП", 2, date), ["ОП/2026/0001", "ОП/2026/0002"])
+        # у другого подразделения и года — свои счётчики
+        self.assertEqual(next_order_number("Склад", date), "Склад/2026/0001")
+        self.assertEqual(next_order_number("ОП", datetime.date(2027, 1, 1)), "ОП/2027/0001")
+
+    @override_settings(ORDER_NUMBER_BLOCK=10)
+    def test_block_reservation(self):
+        first = next_order_number("Отдел")
+        sequence = NumberSequence.objects.get()
+        self.assertEqual(sequence.next_value, 11)
+        with self.assertNumQueries(0):
+            rest = allocate_numbers("Отдел", 9)
+        self.assertEqual(sorted([first, *rest]), [first, *rest])
+        # блок кончился — следующий резервируется одним запросом
+        allocate_numbers("Отдел", 3)
+        sequence.refresh_from_db()
+        self.assertEqual(sequence.next_value, 21)
+        # внутри транзакции блок не кешируется (при откате номера выдались бы повторно):
+        # 7 номеров — из остатка блока, недостающий резервируется поштучно
+        with transaction.atomic():
+            allocate_numbers("Отдел", 8)
+        sequence.refresh_from_db()
+        self.assertEqual(sequence.next_value, 22)
+        self.assertEqual(numbering._blocks[sequence.key], (21, 21))
+
+    @override_settings(ORDER_NUMBER_BLOCK=7)
+    def test_concurrent_allocation(self):
+        def worker():
+            try:
+                return [n for _ in range(20) for n in allocate_numbers("Отдел", 3)]
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            numbers = [n for chunk in pool.map(lambda _: worker(), range(8)) for n in chunk]
+        # воркер в другом процессе: свои блоки, номера не пересекаются
+        numbering._blocks_pid = None
+        numbers += allocate_numbers("Отдел", 30)
+        self.assertEqual(len(numbers), 8 * 60 + 30)
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_generated_format_reserved(self):
+        response = self.api.post("/api/v1/orders/", self.order(number="ORD-2030-000005"), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("number", response.json())
+        response = self.api.post("/api/v1/orders/bulk/", [self.order(number="ORD-2030-000005")], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("number", response.json()["errors"][0]["errors"])
+        # свой номер вида ORD-... при правке заказа не мешает
+        created = self.api.post("/api/v1/orders/", self.order(number="РУЧ-1"), format="json").json()
+        generated = self.api.post("/api/v1/orders/", self.order(), format="json").json()
+        self.assertRegex(generated["number"], r"^ORD-\d{4}-\d{6}$")
+        response = self.api.patch(f"/api/v1/orders/{generated['id']}/", {"priority": "Высокий"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        response = self.api.patch(f"/api/v1/orders/{created['id']}/", {"number": generated["number"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(ORDER_NUMBER_FORMAT="{department}-{year}-{seq:06d}")
+    def test_department_must_fit_number(self):
+        long_department = "Д" * 25
+        response = self.api.post("/api/v1/orders/", self.order(department=long_department), format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("department", response.json())
+        response = self.api.post("/api/v1/orders/bulk/", [self.order(department=long_department)], format="json")
+        self.assertIn("department", response.json()["errors"][0]["errors"])
+        # с номером, заданным вручную, длина подразделения не важна
+        response = self.api.post("/api/v1/orders/", self.order(department=long_department, number="Р-1"), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            self.api.post("/api/v1/orders/", self.order(department="Д" * 20), format="json").status_code, 201,
+        )
+        with override_settings(ORDER_NUMBER_FORMAT="ORD-{year}-{seq:040d}"):
+            self.assertEqual([e.id for e in check_number_format()], ["orders.E002"])
+        with override_settings(ORDER_NUMBER_FORMAT="ORD-{year}-{num}"):
+            self.assertEqual([e.id for e in check_number_format()], ["orders.E001"])
+
+
+class KeysetPaginationTests(TestCase):
+    """system/pagination.py: курсоры next/previous, 400 на чужой курсор, page_size, count=estimate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        client = Client.objects.create(name="Клиент")
+        manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        # три даты по четыре заказа: ключ сортировки (-date, number, id) с повторами по date
+        Order.objects.bulk_create([
+            Order(number=f"K-{i % 4}-{i:02d}", client=client, manager=manager, department="Отдел")
+            for i in range(12)
+        ])
+        today = datetime.date.today()
+        for i, order in enumerate(Order.objects.order_by("id")):
+            Order.objects.filter(pk=order.pk).update(date=today - datetime.timedelta(days=i % 3))
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def ids(self, page):
+        return [row["id"] for row in page["results"]]
+
+    def test_round_trip_with_ties(self):
+        expected = list(Order.objects.order_by("-date", "number", "id").values_list("id", flat=True))
+        pages = [self.api.get("/api/v1/orders/?page_size=5").json()]
+        self.assertIsNone(pages[0]["previous"])
+        while pages[-1]["next"]:
+            pages.append(self.api.get(pages[-1]["next"]).json())
+        self.assertEqual([len(self.ids(p)) for p in pages], [5, 5, 2])
+        self.assertEqual([i for p in pages for i in self.ids(p)], expected)
+
+        # назад по previous — те же страницы
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = self.api.get(page["previous"]).json()
+            self.assertEqual(self.ids(page), self.ids(expected_page))
+        self.assertIsNone(page["previous"])
+        self.assertEqual(self.ids(self.api.get(page["next"]).json()), self.ids(pages[1]))
+
+    def test_invalid_cursor(self):
+        paginator = KeysetPagination()
+        paginator.ordering = ("-date", "number", "id")
+        cursors = [
+            "not base64!", "Zm9v", "ключ",
+            paginator.encode_cursor([1, 2]),                       # не та длина
+            paginator.encode_cursor(["вчера", "K-1", 1]),          # не дата
+            paginator.encode_cursor(["2025-01-01", "K-1", "x"]),   # не число
+            paginator.encode_cursor(["2025-01-01", "K-1", None]),
+            paginator.encode_cursor([{"a": 1}, "K-1", 1]),
+            base64.urlsafe_b64encode(b'{"v": 1}').decode(),
+            base64.urlsafe_b64encode(b"[1, 2, 3]").decode(),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.api.get("/api/v1/orders/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"cursor": ["Неверный курсор"]})
+
+    def test_page_size_limits(self):
+        paginator = KeysetPagination()
+        for value, size in [("3", 3), ("0", 1), ("-5", 1), ("abc", paginator.page_size),
+                            ("100000", paginator.max_page_size)]:
+            with self.subTest(page_size=value):
+                self.assertEqual(paginator.get_page_size(mock.Mock(query_params={"page_size": value})), size)
+        self.assertEqual(len(self.api.get("/api/v1/orders/?page_size=3").json()["results"]), 3)
+        self.assertEqual(len(self.api.get("/api/v1/orders/?page_size=0").json()["results"]), 1)
+
+    def test_count_estimate(self):
+        url = "/api/v1/orders/?count=estimate&page_size=2"
+        max_id = Order.objects.order_by("-id").values_list("id", flat=True).first()
+        self.assertEqual(self.api.get(url).json()["count_estimate"], max_id)
+        self.assertNotIn("count_estimate", self.api.get("/api/v1/orders/?page_size=2").json())
+        # с фильтром оценка по таблице была бы неверной — не отдаём
+        self.assertNotIn("count_estimate", self.api.get(url + "&status=new").json())
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE orders_order")
+            self.assertEqual(self.api.get(url).json()["count_estimate"], 12)
+
+
+class FastListTests(TestCase):
+    """system/fastlist.py: ответ быстрого пути совпадает с ModelSerializer байт в байт."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        client = Client.objects.create(name="Клиент", contact_person="")
+        Client.objects.create(name="Другой", contact_person="Пётр", email="p@example.com", comment="—")
+        manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com", user=cls.user,
+        )
+        Employee.objects.create(
+            full_name="Без учётки", tab_number="T2", position="Склад",
+            department="Склад", phone="-", email="s@example.com",
+        )
+        for i, (amount, planned) in enumerate([
+            (Decimal("0"), None),
+            (Decimal("1234.5"), datetime.date(2026, 2, 28)),
+            (Decimal("12345678.91"), datetime.date(2025, 12, 31)),
+        ]):
+            order = Order.objects.create(
+                number=f"F-{i}", client=client, manager=manager, department="Отдел", planned_date=planned,
+            )
+            # amount_total не редактируется через API — пишем в обход save()
+            Order.objects.filter(pk=order.pk).update(amount_total=amount)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_same_as_serializer(self):
+        cases = [
+            (OrderViewSet, OrderSerializer, "/api/v1/orders/?page_size=2"),
+            (OrderViewSet, OrderSerializer, "/api/v1/orders/?status=new&fields=number,planned_date,amount_total"),
+            (EmployeeViewSet, EmployeeSerializer, "/api/v1/employees/"),
+            (ClientViewSet, ClientSerializer, "/api/v1/clients/"),
+        ]
+        for viewset, serializer, url in cases:
+            with self.subTest(url=url):
+                self.assertIsNotNone(compile_row_plan(serializer()))
+                fast = self.api.get(url)
+                with mock.patch.object(viewset, "fast_list", False):
+                    slow = self.api.get(url)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+        orders = self.api.get("/api/v1/orders/?fields=number,planned_date,amount_total").json()["results"]
+        self.assertIn({"number": "F-0", "planned_date": None, "amount_total": "0.00"}, orders)
+        self.assertIn({"number": "F-1", "planned_date": "2026-02-28", "amount_total": "1234.50"}, orders)
+
+
+class ReportingReadsTests(TestCase):
+    """Дашборды читают реплику (system/dbrouter.py), и все их модели в REPORTING_DB_MODELS."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+
+    def test_stats_routed_to_replica(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        routed = []
+        db_for_read = ReportingRouter.db_for_read
+
+        def spy(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            if dbrouter._read_alias.get():
+                routed.append((model._meta.label, alias))
+            return alias
+
+        with mock.patch("system.dbrouter.reporting_alias", return_value="default"), \
+                mock.patch.object(ReportingRouter, "db_for_read", spy):
+            for url in ["/api/v1/orders/stats/", "/api/v1/orders/stats/?status=new",
+                        "/api/v1/employees/stats/?department=Отдел"]:
+                self.assertEqual(api.get(url).status_code, 200)
+        self.assertTrue(routed)
+        self.assertEqual([label for label, alias in routed if alias is None], [])
+
+    def test_reads_outside_atomic(self):
+        # с transaction_mode=IMMEDIATE любой atomic() — блокировка записи на всю БД
+        api = APIClient()
+        api.force_authenticate(self.user)
+        entered = []
+        enter = transaction.Atomic.__enter__
+
+        def spy(atomic):
+            entered.append(atomic)
+            return enter(atomic)
+
+        with mock.patch.object(transaction.Atomic, "__enter__", spy):
+            for url in ["/api/v1/orders/", "/api/v1/orders/stats/", "/api/v1/employees/stats/",
+                        "/api/v1/reports/"]:
+                self.assertEqual(api.get(url).status_code, 200, url)
+        self.assertEqual(entered, [])
+
+
+class DashboardStatsTests(TestCase):
+    """Числа /orders/stats/ и /employees/stats/: по агрегатам (без фильтров) и GROUP BY (с фильтрами)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        client = Client.objects.create(name="Клиент")
+        managers = [
+            Employee.objects.create(
+                full_name=f"Менеджер {n}", tab_number=f"T{n}", position="Менеджер",
+                department=department, phone="-", email=f"m{n}@example.com", status=status,
+            )
+            for n, (department, status) in enumerate([("Отдел", "Активен"), ("Отдел", "Отпуск"), ("Склад", "Активен")])
+        ]
+        cls.today = today = timezone.localdate()
+        day = datetime.timedelta(days=1)
+        # (статус, подразделение, дней назад, planned_date)
+        for n, (status, department, ago, planned) in enumerate([
+            ("new", "Отдел", 0, today - day),          # просрочен
+            ("new", "Отдел", 0, today + day),
+            ("ready", "Склад", 10, None),
+            ("canceled", "Склад", 10, today - day),    # отменённый не просрочен
+            ("new", "Отдел", 200, today - 150 * day),  # просрочен, вне окна by_date
+        ]):
+            order = Order.objects.create(
+                number=f"S-{n}", client=client, manager=managers[n % 3], department=department,
+                status=status, planned_date=planned,
+            )
+            Order.objects.filter(pk=order.pk).update(date=today - ago * day)
+        rebuild_aggregates()  # даты поменяли в обход сигналов
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        # ответы кешируются по версиям таблиц, а они откатываются вместе с тестом
+        self.addCleanup(caches["default"].clear)
+
+    def stats(self, query=""):
+        response = self.api.get(f"/api/v1/orders/stats/{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def day(self, ago):
+        return (self.today - datetime.timedelta(days=ago)).isoformat()
+
+    def test_unfiltered_from_aggregates(self):
+        with mock.patch("orders.stats.Order.objects.values", side_effect=AssertionError("GROUP BY по заказам")):
+            data = self.stats()
+        self.assertEqual(data, {
+            "total": 5,
+            "active": 4,
+            "overdue": 2,
+            "by_status": {"new": 3, "ready": 1, "canceled": 1},
+            "by_department": {"Отдел": 3, "Склад": 2},
+            "by_date": {self.day(10): 2, self.day(0): 2},
+            "by_date_period": {"from": self.day(settings.STATS_BY_DATE_DAYS - 1), "to": self.day(0)},
+        })
+        caches["default"].clear()
+        with self.settings(STATS_BY_DATE_DAYS=5):
+            self.assertEqual(self.stats()["by_date"], {self.day(0): 2})
+
+    def test_filtered_group_by(self):
+        data = self.stats("?department=Отдел")
+        self.assertEqual(data, {
+            "total": 3,
+            "active": 3,
+            "overdue": 2,
+            "by_status": {"new": 3, "ready": 0, "canceled": 0},
+            "by_department": {"Отдел": 3},
+            "by_date": {self.day(0): 2},
+            "by_date_period": {"from": self.day(settings.STATS_BY_DATE_DAYS - 1), "to": self.day(0)},
+        })
+        data = self.stats(f"?status__in=ready,canceled&date__gte={self.day(365)}&date__lte={self.day(1)}")
+        self.assertEqual((data["total"], data["active"], data["overdue"]), (2, 1, 0))
+        self.assertEqual(data["by_department"], {"Склад": 2})
+        self.assertEqual(data["by_date"], {self.day(10): 2})
+        self.assertEqual(data["by_date_period"], {"from": self.day(365), "to": self.day(1)})
+        # окно по фильтру даты — и с давним заказом
+        self.assertEqual(self.stats(f"?date__gte={self.day(365)}")["by_date"],
+                         {self.day(200): 1, self.day(10): 2, self.day(0): 2})
+        self.assertEqual(self.api.get("/api/v1/orders/stats/?date__gte=2025-02-30").status_code, 400)
+
+    def test_employee_stats(self):
+        data = self.api.get("/api/v1/employees/stats/").json()
+        self.assertEqual(data, {
+            "total": 3,
+            "online": 2,
+            "by_status": {"Активен": 2, "Отпуск": 1},
+            "by_department": {"Отдел": 2, "Склад": 1},
+        })
+        data = self.api.get("/api/v1/employees/stats/?department=Отдел").json()
+        self.assertEqual(data, {
+            "total": 2,
+            "online": 1,
+            "by_status": {"Активен": 1, "Отпуск": 1},
+            "by_department": {"Отдел": 2},
+        })
+
+
+class ExportFormatTests(TestCase):
+    """Форматы отчётов (orders/exporters.py) и preview по ним."""
+
+    columns = ["number", "qty", "amount_total"]
+
+    def rows(self, n=12):
+        return [(f"N-{i}", i, Decimal(i) + Decimal("0.50")) for i in range(n)]
+
+    def test_read_page_at_offset(self):
+        expected = [[f"N-{i}", str(i), f"{i}.50"] for i in range(12)]
+        for fmt, exporter in EXPORTERS.items():
+            with self.subTest(format=fmt):
+                # маленькие пачки и первая страница — чтобы читать по смещениям из индекса
+                stream = exporter(self.columns, self.rows(), batch_rows=3, first_page_size=2)
+                data = stream.read()
+                index = json.loads(json.dumps(stream.index()))
+                for offset, limit in [(0, 2), (1, 3), (5, 4), (10, 5), (12, 3)]:
+                    # File, как у report.file: его итерация начинает с начала файла
+                    page = exporter.read_page(File(io.BytesIO(data), name=f"report.{exporter.extension}"), index, offset, limit)
+                    self.assertEqual(page, expected[offset:offset + limit], (offset, limit))
+
+    def test_xlsx_money_is_numeric(self):
+        data = XlsxReportStream(self.columns, self.rows(2)).read()
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        self.assertIn("<c><v>1.50</v></c>", sheet)
+        self.assertIn("<c><v>1</v></c>", sheet)
+        self.assertNotIn("<t xml:space=\"preserve\">1.50</t>", sheet)
+
+    def test_report_rows_keep_decimal(self):
+        client = Client.objects.create(name="Клиент")
+        manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        order = Order.objects.create(number="N-1", client=client, manager=manager, department="Отдел")
+        Order.objects.filter(pk=order.pk).update(amount_total=Decimal("12.5"))
+        for report_type in ("orders", "finance", "employees"):
+            with self.subTest(report_type=report_type):
+                columns, rows = build_report_data(report_type, None, None, "none")
+                amount = dict(zip(columns, next(iter(rows))))[columns[-1]]
+                self.assertEqual((type(amount), str(amount)), (Decimal, "12.50"))
+
+
+@override_settings(REPORTS_QUEUE_BACKEND="sync")
+class ReportFilesTestCase(TestCase):
+    """Отчёты с файлами во временном MEDIA_ROOT, генерация — синхронно после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        client = Client.objects.create(name="Клиент")
+        manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        Order.objects.bulk_create([
+            Order(number=f"N-{i:03d}", client=client, manager=manager, department="Отдел", amount_total=i)
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def create(self, fmt, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(
+                "/api/v1/reports/", {"title": "Отчёт", "report_type": "finance", "format": fmt, **fields},
+                format="json",
+            )
+        return Report.objects.get(pk=response.json()["id"])
+
+
+class ReportPreviewTests(ReportFilesTestCase):
+    def test_limit_must_be_positive(self):
+        report = self.create("CSV")
+        for limit in ("0", "-1"):
+            response = self.api.get(f"/api/v1/reports/{report.pk}/preview/?limit={limit}")
+            self.assertEqual(response.status_code, 400)
+        page = self.api.get(f"/api/v1/reports/{report.pk}/preview/?offset=3&limit=1").json()
+        self.assertEqual([row["number"] for row in page["rows"]], ["N-003"])
+        self.assertEqual(page["next_offset"], 4)
+
+    def test_without_index_format_from_report(self):
+        report = self.create("JSONL")
+        report.file.storage.delete(report.params.pop("index_file"))
+        report.save(update_fields=["params"], check_version=False)
+        page = self.api.get(f"/api/v1/reports/{report.pk}/preview/?offset=2&limit=2").json()
+        self.assertEqual([row["number"] for row in page["rows"]], ["N-002", "N-003"])
+        response = self.api.get(f"/api/v1/reports/{report.pk}/download/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+
+
+class ReportGenerationTests(ReportFilesTestCase):
+    """Генерация файла каждого формата (orders/jobs.py, orders/exporters.py): содержимое, rows_count, индекс."""
+
+    def expected_rows(self):
+        today = timezone.localdate().isoformat()
+        return [[today, f"N-{i:03d}", "Клиент", "Менеджер", f"{i}.00"] for i in range(5)]
+
+    def stored(self, report):
+        with report.file.storage.open(report.file.name, "rb") as f:
+            data = f.read()
+        with report.file.storage.open(report.params["index_file"], "rb") as f:
+            index_bytes = f.read()
+        return data, json.loads(index_bytes), len(index_bytes)
+
+    def test_each_format(self):
+        columns = ["date", "number", "client", "manager", "amount_total"]
+        parse = {
+            "CSV": lambda data: list(csv.reader(io.StringIO(data.decode("utf-8-sig")))),
+            "CSV.GZ": lambda data: list(csv.reader(io.StringIO(gzip.decompress(data).decode("utf-8-sig")))),
+            "JSONL": lambda data: [list(json.loads(line).values()) for line in data.decode("utf-8").splitlines()],
+        }
+        for fmt, exporter in EXPORTERS.items():
+            with self.subTest(format=fmt):
+                report = self.create(fmt)
+                self.assertEqual(report.status, "ready")
+                self.assertTrue(report.file.name.endswith(f".{exporter.extension}"), report.file.name)
+                data, index, index_size = self.stored(report)
+                self.assertEqual(report.params["rows_count"], 5)
+                self.assertEqual(report.params["columns"], columns)
+                self.assertEqual(report.params["sha256"], hashlib.sha256(data).hexdigest())
+                self.assertEqual(report.file_size, len(data) + index_size)
+                self.assertEqual((index["format"], index["rows_count"]), (fmt, 5))
+                self.assertEqual(index["first_page"], self.expected_rows())
+
+                if fmt == "XLSX":
+                    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                        sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+                    self.assertEqual(sheet.count("<row"), 6)
+                    self.assertIn(">N-004<", sheet)
+                    self.assertIn("<c><v>4.00</v></c>", sheet)
+                    rows = exporter.read_page(File(io.BytesIO(data), name="r.xlsx"), None, 0, 10)
+                    self.assertEqual(rows, self.expected_rows())
+                    continue
+                rows = parse[fmt](data)
+                if fmt == "JSONL":
+                    self.assertEqual(list(json.loads(data.decode("utf-8").splitlines()[0])), columns)
+                else:
+                    self.assertEqual(rows.pop(0), columns)
+                self.assertEqual(rows, self.expected_rows())
+
+    def test_csv_page_by_sidecar_index(self):
+        order = Order.objects.first()
+        Order.objects.bulk_create([
+            Order(number=f"P-{i:04d}", client_id=order.client_id, manager_id=order.manager_id, department="Отдел")
+            for i in range(2500)
+        ])
+        report = self.create("CSV")
+        data, index, _ = self.stored(report)
+        self.assertEqual(report.params["rows_count"], 2505)
+        self.assertEqual(index["every"], REPORT_INDEX_EVERY)
+        self.assertEqual(len(index["offsets"]), 3)
+        self.assertEqual(len(index["first_page"]), REPORT_PREVIEW_PAGE)
+        all_rows = list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))[1:]
+
+        for offset, limit in [(0, 5), (198, 5), (999, 2), (1000, 3), (2503, 10), (2505, 5), (9000, 1)]:
+            with self.subTest(offset=offset, limit=limit):
+                fileobj = io.BytesIO(data)
+                with mock.patch.object(fileobj, "seek", wraps=fileobj.seek) as seek:
+                    rows = read_csv_page(fileobj, index, offset, limit)
+                self.assertEqual(rows, all_rows[offset:offset + limit])
+                block = offset // REPORT_INDEX_EVERY
+                if offset + limit > REPORT_PREVIEW_PAGE and block < len(index["offsets"]):
+                    # чтение с ближайшей проиндексированной строки, а не с начала файла
+                    seek.assert_called_once_with(index["offsets"][block])
+
+        page = self.api.get(f"/api/v1/reports/{report.pk}/preview/?offset=1998&limit=4").json()
+        self.assertEqual([row["number"] for row in page["rows"]], [r[1] for r in all_rows[1998:2002]])
+        self.assertEqual((page["rows_count"], page["next_offset"]), (2505, 2002))
+
+
+class ReportRetentionTests(ReportFilesTestCase):
+    """Хранение файлов отчётов (orders/retention.py): TTL, бюджет LRU, общие файлы, файлы без отчёта."""
+
+    def exists(self, name):
+        return default_storage.exists(name)
+
+    def accessed(self, report, **ago):
+        Report.objects.filter(pk=report.pk).update(last_accessed_at=timezone.now() - datetime.timedelta(**ago))
+
+    def test_ttl(self):
+        old, fresh = self.create("CSV"), self.create("JSONL")
+        old_files = retention.report_files(old)
+        self.assertEqual(len(old_files), 2)  # файл и индекс
+        self.accessed(old, days=settings.REPORTS_TTL_DAYS + 1)
+        self.accessed(fresh, days=1)
+
+        self.assertEqual(retention.enforce_retention(dry_run=True)["expired"], [old.pk])
+        self.assertTrue(all(self.exists(name) for name in old_files))
+
+        result = retention.enforce_retention()
+        self.assertEqual((result["expired"], result["evicted"]), ([old.pk], []))
+        old.refresh_from_db()
+        self.assertEqual((old.status, old.file.name, old.file_size), ("evicted", "", 0))
+        self.assertFalse(any(self.exists(name) for name in old_files))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, "ready")
+        self.assertTrue(self.exists(fresh.file.name))
+
+        # свой срок хранения у отчёта
+        Report.objects.filter(pk=fresh.pk).update(ttl_days=0)
+        self.assertEqual(retention.enforce_retention()["expired"], [fresh.pk])
+
+    def test_budget_evicts_least_recently_accessed(self):
+        reports = [self.create(fmt) for fmt in ("CSV", "JSONL", "CSV.GZ")]
+        for hours, report in zip((1, 3, 2), reports):
+            self.accessed(report, hours=hours)
+        sizes = {r.pk: Report.objects.get(pk=r.pk).file_size for r in reports}
+        self.assertTrue(all(sizes.values()))
+
+        # помещаются два файла: уходит тот, что дольше всех не открывали (JSONL, 3 ч)
+        budget = sizes[reports[0].pk] + sizes[reports[2].pk]
+        with mock.patch("orders.retention.storage_budget", return_value=budget):
+            result = retention.enforce_retention()
+            self.assertEqual(result["evicted"], [reports[1].pk])
+            self.assertEqual(result["bytes"], budget)
+        self.assertEqual(
+            list(Report.objects.order_by("pk").values_list("status", flat=True)), ["ready", "evicted", "ready"],
+        )
+        # без бюджета — все, от давних к свежим
+        Report.objects.filter(pk=reports[1].pk).delete()
+        with mock.patch("orders.retention.storage_budget", return_value=0):
+            self.assertEqual(retention.enforce_retention()["evicted"], [reports[2].pk, reports[0].pk])
+
+    def test_shared_file_kept_until_last_reference(self):
+        first = self.create("CSV")
+        second = self.create("CSV")
+        self.assertEqual(second.params["cached_from"], first.pk)
+        self.assertEqual(second.file.name, first.file.name)
+        names = retention.report_files(first)
+
+        # вытеснение и удаление одного из отчётов файл не трогают — на него ссылается второй
+        self.assertEqual(retention.evict_report(first), [])
+        self.assertTrue(all(self.exists(name) for name in names))
+        with self.captureOnCommitCallbacks(execute=True):
+            Report.objects.get(pk=first.pk).delete()
+        self.assertTrue(all(self.exists(name) for name in names))
+        self.assertEqual(self.api.get(f"/api/v1/reports/{second.pk}/preview/").status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(any(self.exists(name) for name in names))
+
+    def test_orphan_files(self):
+        report = self.create("CSV")
+        stale = default_storage.save("reports/stale.csv", ContentFile(b"x" * 10))
+        recent = default_storage.save("reports/recent.csv", ContentFile(b"y"))
+        old = time.time() - 2 * retention.ORPHAN_GRACE.total_seconds()
+        os.utime(default_storage.path(stale), (old, old))
+
+        # свежий файл может прямо сейчас писать воркер
+        self.assertEqual(retention.orphan_files(), [(stale, 10)])
+        usage = retention.storage_usage()
+        self.assertEqual((usage["files"], usage["orphan_files"], usage["orphan_bytes"]), (1, 1, 10))
+        self.assertEqual(usage["reports"], {"ready": 1})
+
+        out = io.StringIO()
+        call_command("report_storage", "--enforce", "--orphans", "--dry-run", stdout=out)
+        self.assertIn("Будет удалено файлов без отчёта: 1", out.getvalue())
+        self.assertTrue(self.exists(stale))
+
+        result = retention.enforce_retention(orphans=True)
+        self.assertEqual((result["orphans"], result["freed_bytes"]), ([stale], 10))
+        self.assertFalse(self.exists(stale))
+        self.assertTrue(self.exists(recent))
+        self.assertTrue(all(self.exists(name) for name in retention.report_files(report)))
+
+    def test_evicted_regenerates(self):
+        report = self.create("CSV")
+        for action in ("preview", "download"):
+            with self.subTest(action=action):
+                retention.evict_report(Report.objects.get(pk=report.pk))
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.api.get(f"/api/v1/reports/{report.pk}/{action}/")
+                self.assertEqual(response.status_code, 202)
+                report.refresh_from_db()
+                self.assertEqual(report.status, "ready")
+                self.assertTrue(self.exists(report.file.name))
+                self.assertEqual(self.api.get(f"/api/v1/reports/{report.pk}/{action}/").status_code, 200)
+
+    def test_admin_changelist(self):
+        self.create("CSV")
+        admin_user = User.objects.create_superuser("root", password="x")
+        self.client.force_login(admin_user)
+        response = self.client.get("/admin/orders/report/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["storage_usage"]["files"], 1)
+
+
+class ReportCacheTests(ReportFilesTestCase):
+    """Кеш результатов отчётов (orders/report_cache.py): ключ по версиям месяцев периода и справочников."""
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "report-cache"},
+        }))
+        caches["default"].clear()  # счётчики попаданий
+        self.today = timezone.localdate()
+        self.month = {"period_from": self.today.replace(day=1).isoformat(), "period_to": self.today.isoformat()}
+        self.past = {"period_from": "2020-01-01", "period_to": "2020-01-31"}
+
+    def stats(self):
+        return self.api.get("/api/v1/reports/cache-stats/").json()
+
+    def keys(self, *reports):
+        return [report_cache.compute_cache_key(report) for report in reports]
+
+    def test_identical_report_reuses_file(self):
+        first = self.create("CSV", **self.month)
+        self.assertEqual(self.stats(), {"hits": 0, "misses": 1, "hit_ratio": 0.0})
+        second = self.create("CSV", **self.month)
+        self.assertEqual((second.status, second.file.name), ("ready", first.file.name))
+        self.assertEqual(second.params["cached_from"], first.pk)
+        self.assertEqual(second.params["rows_count"], first.params["rows_count"])
+        self.assertEqual(self.stats(), {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+        # другой формат — другой файл
+        self.assertNotEqual(self.create("JSONL", **self.month).file.name, first.file.name)
+        self.assertEqual(self.stats()["misses"], 2)
+
+    def test_order_change_invalidates_its_month(self):
+        current, past = self.create("CSV", **self.month), self.create("CSV", **self.past)
+        current_key, past_key = self.keys(current, past)
+        self.assertEqual([current.cache_key, past.cache_key], [current_key, past_key])
+        stamps = ReportDataStamp.objects.filter(bucket=report_cache.month_bucket(self.today))
+        version = stamps.values_list("version", flat=True).first() or 0
+
+        order = Order.objects.first()
+        OrderItem.objects.create(order=order, name="Кабель", qty=1, price=5)
+        # одна версия на запись позиции: сумма заказа приходит одним orders_changed
+        self.assertEqual(stamps.get().version, version + 1)
+        self.assertEqual(self.keys(current, past), [self.keys(current)[0], past_key])
+        self.assertNotEqual(self.keys(current)[0], current_key)
+
+        repeated = self.create("CSV", **self.month)
+        self.assertNotEqual(repeated.file.name, current.file.name)
+        self.assertNotIn("cached_from", repeated.params)
+        self.assertEqual(self.create("CSV", **self.past).params["cached_from"], past.pk)
+
+    def test_directory_change_invalidates_everything(self):
+        reports = [self.create("CSV", **self.month), self.create("CSV", **self.past), self.create("CSV")]
+        keys = self.keys(*reports)
+        Employee.objects.update(full_name="Другой")  # update() сигналов не шлёт
+        self.assertEqual(self.keys(*reports), keys)
+        manager = Employee.objects.get()
+        manager.full_name = "Другой"
+        manager.save()
+        changed = self.keys(*reports)
+        self.assertFalse(set(changed) & set(keys))
+        Client.objects.create(name="Новый")
+        self.assertFalse(set(self.keys(*reports)) & set(changed))
+
+
+class OrderFieldsExpandTests(TestCase):
+    """?fields= и ?expand= заказов (OrderSerializer, OrderViewSet.get_queryset)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def add_orders(self, n):
+        for _ in range(n):
+            order = Order.objects.create(client=self.client_obj, manager=self.manager, department="Отдел")
+            OrderItem.objects.create(order=order, name="Кабель", qty=1, price=2)
+            OrderItem.objects.create(order=order, name="Щит", qty=1, price=3)
+        return order
+
+    def test_unknown_names(self):
+        order = self.add_orders(1)
+        for query, errors in [
+            ("fields=number,bogus", {"fields": ["Неизвестное поле: bogus"]}),
+            ("expand=items,owner", {"expand": ["Неизвестное поле: owner"]}),
+            ("fields=nope&expand=nope", {"fields": ["Неизвестное поле: nope"], "expand": ["Неизвестное поле: nope"]}),
+        ]:
+            for url in ("/api/v1/orders/", f"/api/v1/orders/{order.pk}/"):
+                with self.subTest(url=url, query=query):
+                    response = self.api.get(f"{url}?{query}")
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), errors)
+
+        row = self.api.get(f"/api/v1/orders/{order.pk}/?fields=number,items&expand=items").json()
+        self.assertEqual(set(row), {"number", "items"})
+        self.assertEqual([i["name"] for i in row["items"]], ["Кабель", "Щит"])
+        results = self.api.get("/api/v1/orders/?fields=number,status").json()["results"]
+        self.assertEqual([set(r) for r in results], [{"number", "status"}])
+
+    def test_expand_without_n_plus_one(self):
+        url = "/api/v1/orders/?expand=items,client,manager"
+        self.add_orders(2)
+        self.api.get(url)
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(len(self.api.get(url).json()["results"]), 2)
+        self.add_orders(6)
+        with self.assertNumQueries(len(few.captured_queries)):
+            results = self.api.get(url).json()["results"]
+        self.assertEqual(len(results), 8)
+        self.assertEqual({len(r["items"]) for r in results}, {2})
+        self.assertEqual({(r["client"]["name"], r["manager"]["full_name"]) for r in results}, {("Клиент", "Менеджер")})
+
+    def test_etag_varies_with_fields_and_expand(self):
+        order = self.add_orders(1)
+        urls = ["/api/v1/orders/", "/api/v1/orders/?fields=number", "/api/v1/orders/?fields=status",
+                "/api/v1/orders/?expand=items", "/api/v1/orders/?expand=client"]
+        etags = {url: self.api.get(url)["ETag"] for url in urls}
+        self.assertEqual(len(set(etags.values())), len(urls))
+        for url, etag in etags.items():
+            self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # позиция без изменения суммы: меняется только ответ с ?expand=items
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.filter(order=order, name="Щит").get().save()
+        changed = {url for url, etag in etags.items() if self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200}
+        self.assertEqual(changed, {"/api/v1/orders/?expand=items"})
+
+
+class OptimisticLockTests(TestCase):
+    """system/concurrency.py: версия заказа, ETag объекта, 409/412."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.order = Order.objects.create(
+            number="N-1", client=self.client_obj, manager=self.manager, department="Отдел",
+        )
+        self.url = f"/api/v1/orders/{self.order.pk}/"
+
+    def test_object_etag(self):
+        response = self.api.get(self.url)
+        self.assertEqual(response["ETag"], '"1"')
+        self.assertEqual(self.api.get(self.url, HTTP_IF_NONE_MATCH='"1"').status_code, 304)
+
+        expanded = self.api.get(self.url + "?expand=items")["ETag"]
+        self.assertRegex(expanded, r'^W/"1-[0-9a-f]+"$')
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=self.order, name="Кабель", qty=1, price=1)
+        self.order.refresh_from_db()
+        self.assertNotEqual(self.api.get(self.url + "?expand=items")["ETag"], expanded)
+        # If-Match сверяет только версию — подходит и ETag ответа с ?expand
+        etag = self.api.get(self.url + "?expand=items")["ETag"]
+        response = self.api.patch(self.url, {"priority": "Высокий"}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], f'"{self.order.version + 1}"')
+
+    def test_precondition_failed_and_conflict(self):
+        response = self.api.patch(self.url, {"priority": "Высокий"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 200)
+        # второй клиент с тем же ETag опоздал
+        response = self.api.patch(self.url, {"priority": "Низкий"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        response = self.api.patch(self.url, {"priority": "Низкий", "version": 1}, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).priority, "Высокий")
+
+    def test_stale_save(self):
+        other = Order.objects.get(pk=self.order.pk)
+        other.priority = "Высокий"
+        other.save()
+        self.order.priority = "Низкий"
+        with self.assertRaises(StaleObjectError) as ctx:
+            self.order.save()
+        self.assertEqual(self.order.version, 1)
+        self.assertEqual(concurrency_exception_handler(ctx.exception, {}).status_code, 409)
+
+    def test_blind_save_refreshes_version(self):
+        Order.objects.filter(pk=self.order.pk).update(version=F("version") + 5)
+        self.order.priority = "Высокий"
+        self.order.save(update_fields=["priority"], check_version=False)
+        self.assertEqual(self.order.version, 7)
+        # следующая обычная запись проходит проверку версии
+        self.order.priority = "Низкий"
+        self.order.save()
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 8)
+
+
+class TransitionTests(TestCase):
+    """Массовая смена статуса (orders/transitions.py, POST /orders/transition/)."""
+
+    url = "/api/v1/orders/transition/"
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        client = Client.objects.create(name="Клиент")
+        manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        cls.new, cls.ready, cls.canceled = (
+            Order.objects.create(number=f"N-{s}", client=client, manager=manager, department="Отдел", status=s)
+            for s in ("new", "ready", "canceled")
+        )
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.signals = []
+        receiver = lambda sender, before, after, **kwargs: self.signals.append((before, after))  # noqa: E731
+        orders_changed.connect(receiver)
+        self.addCleanup(orders_changed.disconnect, receiver)
+
+    def test_allowed_and_forbidden(self):
+        missing = self.canceled.pk + 100
+        response = self.api.post(
+            self.url, {"status": "ready", "ids": [self.new.pk, self.ready.pk, self.canceled.pk, missing]},
+            format="json",
+        )
+        self.assertEqual(response.json(), {
+            "status": "ready",
+            "changed": [self.new.pk],
+            "skipped": [{"id": self.ready.pk, "status": "ready"}, {"id": self.canceled.pk, "status": "canceled"}],
+            "not_found": [missing],
+        })
+        self.new.refresh_from_db()
+        self.assertEqual((self.new.status, self.new.version), ("ready", 2))
+        self.assertEqual(Order.objects.get(pk=self.canceled.pk).version, 1)
+        [(before, after)] = self.signals
+        self.assertEqual([(r["id"], r["status"]) for r in before], [(self.new.pk, "new")])
+        self.assertEqual([(r["id"], r["status"]) for r in after], [(self.new.pk, "ready")])
+
+        response = self.api.post(self.url, {"status": "new", "filter": {"status": "canceled"}}, format="json")
+        self.assertEqual(response.json()["changed"], [self.canceled.pk])
+        self.assertEqual(self.api.post(self.url, {"status": "done", "ids": [1]}, format="json").status_code, 400)
+
+    def test_max_ids(self):
+        with mock.patch("orders.views.TRANSITION_MAX_IDS", 2):
+            response = self.api.post(
+                self.url, {"status": "canceled", "ids": [self.new.pk, self.ready.pk, self.canceled.pk]},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ids", response.json())
+        self.assertEqual(self.signals, [])
+
+    def test_rows_changed_before_update(self):
+        calls = []
+
+        def states_then_concurrent_write(queryset, sources):
+            states = _locked_states(queryset, sources)
+            if not calls:
+                # другая транзакция успела вернуть заказ в работу между чтением снимков и UPDATE
+                Order.objects.filter(pk=self.ready.pk).update(status="new", version=F("version") + 1)
+            calls.append(states)
+            return states
+
+        with mock.patch("orders.transitions._locked_states", states_then_concurrent_write):
+            changed = transition_orders(Order.objects.filter(pk__in=[self.ready.pk, self.canceled.pk]), "new")
+        # первая попытка (и в тесте — вместе с "параллельной" записью) откатилась, вторая перечитала снимки
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(changed, [self.ready.pk, self.canceled.pk])
+        self.assertEqual(len(self.signals), 1)
+
+    def test_single_actions_ignore_matrix(self):
+        # reserve/complete/cancel ставят статус из любого текущего, как до массового перехода
+        for action, target in (("reserve", "new"), ("complete", "ready"), ("cancel", "canceled")):
+            for order in (self.new, self.ready, self.canceled):
+                with self.subTest(action=action, source=order.status):
+                    Order.objects.filter(pk=order.pk).update(status=order.status)
+                    version = Order.objects.get(pk=order.pk).version
+                    self.signals.clear()
+                    response = self.api.post(f"/api/v1/orders/{order.pk}/{action}/")
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json(), {"status": target})
+                    saved = Order.objects.get(pk=order.pk)
+                    self.assertEqual(saved.status, target)
+                    if order.status == target:
+                        self.assertEqual((saved.version, self.signals), (version, []))
+                    else:
+                        self.assertEqual(saved.version, version + 1)
+                        [(before, after)] = self.signals
+                        self.assertEqual([r["status"] for r in before], [order.status])
+                        self.assertEqual([r["status"] for r in after], [target])
+
+
+class DailyAggregateTests(TestCase):
+    """OrderDailyAggregate (orders/aggregates.py) совпадает с GROUP BY по заказам после любой записи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def assertAggregatesMatch(self):
+        expected = {
+            (*(row[f] for f in AGGREGATE_KEY_FIELDS), row["n"], row["total"])
+            for row in Order.objects.values(*AGGREGATE_KEY_FIELDS).order_by()
+            .annotate(n=Count("id"), total=Sum("amount_total"))
+        }
+        actual = set(OrderDailyAggregate.objects.values_list(*AGGREGATE_KEY_FIELDS, "orders_count", "amount_total_sum"))
+        self.assertEqual(actual, expected)
+
+    def test_follows_writes(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        order = Order.objects.create(number="A-1", client=self.client_obj, manager=self.manager, department="Отдел")
+        other = Order.objects.create(number="A-2", client=self.client_obj, manager=self.manager, department="Склад")
+        self.assertAggregatesMatch()
+
+        OrderItem.objects.create(order=order, name="Кабель", qty=2, price=Decimal("10.25"))
+        order.refresh_from_db()
+        order.status = "ready"
+        order.save()
+        self.assertAggregatesMatch()
+
+        rows = [{"client": self.client_obj.pk, "manager": self.manager.pk, "department": "Отдел",
+                 "items": [{"name": "Щит", "qty": "1", "price": "99.90"}]} for _ in range(3)]
+        self.assertEqual(api.post("/api/v1/orders/bulk/", rows, format="json").status_code, 201)
+        self.assertAggregatesMatch()
+
+        transition_orders(Order.objects.filter(status="new"), "canceled")
+        self.assertAggregatesMatch()
+
+        other.delete()
+        Order.objects.filter(number="A-1").delete()
+        self.assertAggregatesMatch()
+        self.assertEqual(rebuild_aggregates(), OrderDailyAggregate.objects.count())
+        self.assertAggregatesMatch()
+
+    def test_rolled_back_with_order(self):
+        with mock.patch("orders.signals.apply_order_changes", side_effect=DatabaseError("boom")):
+            with self.assertRaises(DatabaseError):
+                Order.objects.create(number="A-1", client=self.client_obj, manager=self.manager, department="Отдел")
+        self.assertFalse(Order.objects.exists())
+        self.assertAggregatesMatch()
+
+
+class OrderTotalsTests(TestCase):
+    """Order.amount_total (orders/totals.py) равна сумме позиций после любой записи позиций."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+
+    def setUp(self):
+        self.first, self.second = (
+            Order.objects.create(number=f"T-{i}", client=self.client_obj, manager=self.manager, department="Отдел")
+            for i in (1, 2)
+        )
+
+    def assertTotalsMatch(self):
+        totals = Order.objects.annotate(items_total=Coalesce(Sum("items__amount"), Decimal("0")))
+        self.assertEqual([(o.pk, o.amount_total) for o in totals], [(o.pk, o.items_total) for o in totals])
+        DailyAggregateTests.assertAggregatesMatch(self)
+
+    def test_item_writes(self):
+        item = OrderItem.objects.create(order=self.first, name="Кабель", qty=3, price=Decimal("1.15"))
+        OrderItem.objects.create(order=self.first, name="Щит", qty=1, price=Decimal("100"))
+        self.assertTotalsMatch()
+        item.qty = 5
+        item.save()
+        self.assertTotalsMatch()
+        # перенос позиции в другой заказ
+        item.order = self.second
+        item.save()
+        self.assertTotalsMatch()
+        item.delete()
+        self.assertTotalsMatch()
+        self.assertEqual(Order.objects.get(pk=self.first.pk).amount_total, Decimal("100.00"))
+
+    def test_cascade_delete(self):
+        third = Order.objects.create(number="T-3", client=self.client_obj, manager=self.manager, department="Отдел")
+        for order in (self.first, self.second, third):
+            OrderItem.objects.create(order=order, name="Кабель", qty=2, price=Decimal("5"))
+        self.first.delete()
+        self.assertTotalsMatch()
+        # каскад, начатый не с заказа (как удаление владельца заказов): позиции удаляемого
+        # заказа не должны менять его сумму — иначе агрегаты вычтут её дважды
+        collector = Collector(using="default", origin=self.client_obj)
+        collector.collect([Order.objects.get(pk=self.second.pk)])
+        collector.delete()
+        self.assertEqual(list(Order.objects.values_list("pk", flat=True)), [third.pk])
+        self.assertTotalsMatch()
+        self.assertEqual(OrderDailyAggregate.objects.get().amount_total_sum, Decimal("10.00"))
+
+    def test_rebuild(self):
+        OrderItem.objects.create(order=self.first, name="Кабель", qty=2, price=Decimal("5"))
+        Order.objects.filter(pk=self.first.pk).update(amount_total=Decimal("1"))
+        OrderItem.objects.filter(order=self.first).update(amount=Decimal("3"))
+        out = io.StringIO()
+        call_command("rebuild_order_totals", stdout=out)
+        self.assertIn("Заказов с неверной суммой: 1", out.getvalue())
+        call_command("rebuild_order_totals", "--fix", stdout=io.StringIO())
+        self.assertEqual(Order.objects.get(pk=self.first.pk).amount_total, Decimal("10.00"))
+        self.assertEqual(check_order_totals(), [])
+        self.assertEqual(check_item_amounts(), [])
+
+
+class BulkOrderTests(TestCase):
+    """POST /orders/bulk/ (orders/bulk.py): ошибки по строкам, атомарность, сигналы и версии таблиц."""
+
+    url = "/api/v1/orders/bulk/"
+
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name="admin", is_admin=True)
+        cls.user = User.objects.create_user("admin", password="x", role=role)
+        cls.client_obj = Client.objects.create(name="Клиент")
+        cls.manager = Employee.objects.create(
+            full_name="Менеджер", tab_number="T1", position="Менеджер",
+            department="Отдел", phone="-", email="m@example.com",
+        )
+        Order.objects.create(number="B-OLD", client=cls.client_obj, manager=cls.manager, department="Отдел")
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.signals = []
+        receiver = lambda sender, before, after, **kwargs: self.signals.append((before, after))  # noqa: E731
+        orders_changed.connect(receiver)
+        self.addCleanup(orders_changed.disconnect, receiver)
+
+    def row(self, **fields):
+        return {
+            "client": self.client_obj.pk, "manager": self.manager.pk, "department": "Отдел",
+            "items": [{"name": "Кабель", "qty": "3", "price": "1.15"}, {"name": "Щит", "qty": "1", "price": "10"}],
+            **fields,
+        }
+
+    def test_row_errors(self):
+        rows = [
+            self.row(number="B-1"),
+            self.row(client=999999),
+            self.row(manager=999999),
+            self.row(number="B-OLD"),
+            self.row(number="B-1"),
+            self.row(items=[{"name": "Кабель", "qty": "x", "price": "1"}]),
+            {"client": self.client_obj.pk},
+        ]
+        response = self.api.post(self.url, rows, format="json")
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual([c["index"] for c in body["created"]], [0])
+        errors = {e["index"]: e["errors"] for e in body["errors"]}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4, 5, 6])
+        self.assertIn("client", errors[1])
+        self.assertIn("manager", errors[2])
+        self.assertIn("number", errors[3])
+        self.assertIn("number", errors[4])
+        self.assertIn("items", errors[5])
+        self.assertIn("manager", errors[6])
+        self.assertEqual(Order.objects.get(number="B-1").amount_total, Decimal("13.45"))
+
+    def test_atomic(self):
+        response = self.api.post(
+            self.url, {"orders": [self.row(), self.row(client=999999)], "atomic": True}, format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["created"], [])
+        self.assertEqual(Order.objects.count(), 1)
+        # сбой на вставке позиций откатывает и заказы
+        with mock.patch("orders.bulk.OrderItem.objects.bulk_create", side_effect=IntegrityError("boom")):
+            response = self.api.post(self.url, [self.row(), self.row()], format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(self.signals, [])
+
+    def test_signals_and_versions(self):
+        before = table_versions(Order, OrderItem)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(self.url, [self.row(), self.row(department="Склад")], format="json")
+        self.assertEqual(response.status_code, 201)
+        created = [c["id"] for c in response.json()["created"]]
+        [(old, new)] = self.signals
+        self.assertEqual(old, [])
+        self.assertEqual([row["id"] for row in new], created)
+        self.assertEqual({row["amount_total"] for row in new}, {Decimal("13.45")})
+        after = table_versions(Order, OrderItem)
+        self.assertTrue(all(a[0] > b[0] for a, b in zip(after, before)), (before, after))
+        self.assertEqual(OrderItem.objects.filter(order__in=created).count(), 4)
+        DailyAggregateTests.assertAggregatesMatch(self)
@@ -0,0 +1,118 @@
+"""
+Суммы заказов.
+
+OrderItem.amount = qty * price считается на сервере (OrderItem.save, bulk-загрузка).
+Order.amount_total = сумма amount позиций; поддерживается инкрементально: запись
+позиции даёт дельту, которая применяется одним UPDATE ... SET amount_total = amount_total + %s.
+Дельта уходит и в orders_changed — агрегаты и кеш отчётов видят новую сумму.
+Сверка/пересборка — manage.py rebuild_order_totals.
+"""
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from system.versioning import bump_tables
+
+from .models import Order, OrderItem
+from .signals import ORDER_STATE_FIELDS, orders_changed
+
+
+MONEY = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def line_amount(qty, price) -> Decimal:
+    return (Decimal(qty) * Decimal(price)).quantize(MONEY, rounding=ROUND_HALF_UP)
+
+
+def apply_total_deltas(deltas):
+    """deltas: {order_id: Decimal}. Один F()-UPDATE на заказ, снимки до/после — в orders_changed."""
+    deltas = {pk: delta for pk, delta in deltas.items() if pk and delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        before = list(Order.objects.filter(pk__in=deltas).values(*ORDER_STATE_FIELDS))
+        for pk, delta in deltas.items():
+            Order.objects.filter(pk=pk).update(
+                amount_total=F("amount_total") + delta,
+                version=F("version") + 1,
+            )
+        after = [{**row, "amount_total": row["amount_total"] + deltas[row["id"]]} for row in before]
+        orders_changed.send(Order, before=before, after=after)
+
+
+def _items_sum():
+    return Coalesce(
+        Subquery(
+            OrderItem.objects.filter(order=OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        ),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=16, decimal_places=2),
+    )
+
+
+def check_order_totals(batch_size=5000, fix=False):
+    """
+    Сверяет amount_total с суммой позиций пачками по id.
+    Возвращает [(order_id, amount_total, сумма позиций)] расхождений; fix=True — исправляет
+    (через apply_total_deltas, т.е. с обновлением агрегатов).
+    """
+    mismatches = []
+    last_pk = 0
+    while True:
+        rows = list(
+            Order.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .annotate(items_total=_items_sum())
+            .values_list("pk", "amount_total", "items_total")[:batch_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        batch = [(pk, total, items) for pk, total, items in rows if total != items]
+        if fix and batch:
+            apply_total_deltas({pk: items - total for pk, total, items in batch})
+        mismatches.extend(batch)
+    return mismatches
+
+
+def check_item_amounts(batch_size=5000, fix=False):
+    """Позиции, у которых amount != qty * price. fix=True — пересчитывает (bulk_update пачками)."""
+    mismatches = []
+    last_pk = 0
+    while True:
+        rows = list(
+            OrderItem.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", "qty", "price", "amount")[:batch_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        batch = [(pk, amount, line_amount(qty, price)) for pk, qty, price, amount in rows
+                 if amount != line_amount(qty, price)]
+        if fix and batch:
+            # суммы заказов после этого сверяются отдельно (check_order_totals)
+            OrderItem.objects.bulk_update(
+                [OrderItem(pk=pk, amount=expected) for pk, _, expected in batch], ["amount"]
+            )
+            bump_tables(OrderItem)
+        mismatches.extend(batch)
+    return mismatches
+
+
+def item_deltas(before, after):
+    """Дельты по заказам из пар (order_id, amount) до/после записи позиций."""
+    deltas = defaultdict(lambda: ZERO)
+    for order_id, amount in before:
+        deltas[order_id] -= amount or ZERO
+    for order_id, amount in after:
+        deltas[order_id] += amount or ZERO
+    return deltas
@@ -0,0 +1,72 @@
+"""
+Переходы статусов заказа.
+
+STATUS_TRANSITIONS: целевой статус -> из каких статусов в него можно перейти (массовый
+POST /orders/transition/). Одиночные reserve/complete/cancel таблицу не проверяют —
+ставят статус из любого, как до появления массового перехода.
+Массовый переход — один UPDATE ... WHERE id IN (...) AND status IN (...) внутри транзакции;
+недопустимые строки просто не попадают под WHERE.
+
+Снимки "до" для orders_changed читаются в той же транзакции перед UPDATE. select_for_update
+держит строки в PostgreSQL/MySQL, а в SQLite ничего не блокирует: там строки защищает
+BEGIN IMMEDIATE (SQLITE_TRANSACTION_MODE, system/dbprofile.py). Если транзакция всё же
+отложенная и строку успели поменять между SELECT и UPDATE, UPDATE заденет меньше строк,
+чем прочитано, — тогда транзакция откатывается и переход повторяется.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from system.concurrency import StaleObjectError
+
+from .models import Order
+from .signals import ORDER_STATE_FIELDS, orders_changed
+
+
+STATUS_TRANSITIONS = {
+    "new": ("ready", "canceled"),    # вернуть в работу
+    "ready": ("new",),               # выполнить можно только новый
+    "canceled": ("new", "ready"),
+}
+assert set(STATUS_TRANSITIONS) == {code for code, _ in Order.STATUS}
+
+# сколько id принимаем в одном запросе
+TRANSITION_MAX_IDS = 5000
+# попыток, если строки поменялись между чтением снимков и UPDATE
+TRANSITION_ATTEMPTS = 3
+
+
+class _RowsChanged(Exception):
+    pass
+
+
+def allowed_sources(target: str):
+    return STATUS_TRANSITIONS.get(target, ())
+
+
+def _locked_states(queryset, sources):
+    return list(queryset.filter(status__in=sources).select_for_update().order_by().values(*ORDER_STATE_FIELDS))
+
+
+def transition_orders(queryset, target: str):
+    """
+    Переводит заказы из queryset в target. Возвращает id изменённых заказов.
+    Снимки до/после уходят в orders_changed (агрегаты, кеш отчётов, ETag).
+    """
+    sources = allowed_sources(target)
+    for attempt in range(TRANSITION_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                before = _locked_states(queryset, sources)
+                ids = [row["id"] for row in before]
+                if not ids:
+                    return []
+                updated = Order.objects.filter(pk__in=ids, status__in=sources).update(
+                    status=target, version=F("version") + 1,
+                )
+                if updated != len(ids):
+                    raise _RowsChanged()
+                orders_changed.send(Order, before=before, after=[{**row, "status": target} for row in before])
+            return sorted(ids)
+        except _RowsChanged:
+            if attempt == TRANSITION_ATTEMPTS - 1:
+                raise StaleObjectError("Заказы меняются параллельно, повторите переход")
@@ -1,17 +1,44 @@
 #orders/views.py
+import csv
+import hashlib
+import io
+import json
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from .permissions import OrderAccessPermission, ReportAccessPermission
-from .reporting import build_report_data, render_csv_bytes
-from django.core.files.base import ContentFile
+from .bulk import create_orders, validate_orders
+from .transitions import STATUS_TRANSITIONS, TRANSITION_MAX_IDS, transition_orders
+from .jobs import enqueue_report, job_is_stale
+from .exporters import get_exporter
+from .filters import OrderFilter
+from .report_cache import cache_stats, compute_cache_key, try_reuse
+from .retention import touch
+from .stats import order_stats
+from django.db import IntegrityError
+from django.db.models import F
+from django.conf import settings
 from django.http import FileResponse
-from django.utils.text import slugify
+from django.utils.cache import get_conditional_response
 from django.utils import timezone
-
-from .models import Order, OrderItem, OrderStatusDict, Report, Integration
+from django.utils.dateparse import parse_date
+from system.concurrency import OptimisticLockMixin
+from system.dbrouter import reporting_reads
+from system.dictcache import DictionaryCacheMixin
+from system.fastlist import FastListMixin
+from system.search import SEARCH_KINDS, SEARCH_QUERY_PARAM, SearchIndexFilter, search_backend, search_model
+from system.versioning import ConditionalGetMixin, bump_tables, cached_for_tables
+from users.auth import request_permissions
+from users.models import Client, Employee
+
+from .models import Order, OrderDailyAggregate, OrderItem, OrderStatusDict, Report, Integration
 from .serializers import (
+    query_list,
     OrderItemSerializer,
     OrderSerializer,
     ReportSerializer,
@@ -20,49 +47,179 @@ from .serializers import (
 )
 
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = (
-        Order.objects.select_related("client", "manager")
-        .prefetch_related("items")
-        .all()
-    )
+class OrderViewSet(OptimisticLockMixin, ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.all()
     permission_classes = [OrderAccessPermission]
     serializer_class = OrderSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_fields = [
-        "status",
-        "priority",
-        "order_type",
-        "manager",
-        "client",
-        "department",
-        "date",
-    ]
+    keyset_ordering = ("-date", "number", "id")
+    fast_list = True  # list без ?expand идёт через values_list, см. system/fastlist.py
+    filter_backends = [DjangoFilterBackend, SearchIndexFilter]
+    filterset_class = OrderFilter
+    search_kind = "order"
+
+    _concrete_fields = {f.name for f in Order._meta.concrete_fields}
+    _expand_models = {"items": OrderItem, "client": Client, "manager": Employee}
+
+    def _data_models(self):
+        # ?search= ищет и по названиям позиций
+        return (Order, OrderItem) if self.request.query_params.get(SEARCH_QUERY_PARAM) else (Order,)
+
+    def get_etag_models(self):
+        expand = OrderSerializer.requested_expand(self.request)
+        return (*self._data_models(), *(self._expand_models[name] for name in expand))
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            return qs
+
+        unknown = OrderSerializer.unknown_query_names(self.request)
+        if unknown:
+            raise ValidationError(unknown)
+
+        # ?expand= — подтягиваем только то, что попадёт в ответ
+        expand = OrderSerializer.requested_expand(self.request)
+        related = [name for name in ("client", "manager") if name in expand]
+        if related:
+            qs = qs.select_related(*related)
+        if "items" in expand:
+            qs = qs.prefetch_related("items")
+
+        # ?fields= — остальные колонки не читаем (ключ сортировки нужен пагинации)
+        only = [f for f in query_list(self.request, "fields") if f in self._concrete_fields]
+        if only:
+            keep = {"id", "date", "number", "version", *only, *related}
+            qs = qs.only(*keep, *(f"{name}__{f.name}" for name in related
+                                  for f in Order._meta.get_field(name).related_model._meta.concrete_fields))
+        return qs
+
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """
+        Агрегаты для дашборда (orders/stats.py). Фильтры — те же, что у списка;
+        без фильтров считается по дневным агрегатам. Читается из реплики (system/dbrouter.py).
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        filtered = bool(queryset.query.where)
+        today = timezone.localdate()
+        # значения уже проверил фильтр: неверная дата — 400 из filter_queryset
+        date_from = parse_date(request.query_params.get("date__gte") or "")
+        date_to = parse_date(request.query_params.get("date__lte") or "")
+        with reporting_reads():
+            data = cached_for_tables(
+                "orders.stats",
+                [*self._data_models(), OrderDailyAggregate],
+                lambda: order_stats(
+                    queryset if filtered else None, today=today, date_from=date_from, date_to=date_to,
+                ),
+                params=(today, sorted(request.query_params.lists())),
+                timeout=settings.STATS_CACHE_TTL,
+            )
+        return Response(data)
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """
+        Массовое создание заказов с позициями.
+        Тело: {"orders": [{..., "items": [{name, qty, unit, price}]}], "atomic": false}
+        (или просто список заказов). Ошибки — по строкам; atomic=true — при любой ошибке ничего не пишем.
+        """
+        payload = request.data
+        if isinstance(payload, list):
+            rows, atomic = payload, False
+        else:
+            rows = payload.get("orders")
+            atomic = str(payload.get("atomic", "")).lower() in ("1", "true")
+        if not isinstance(rows, list):
+            return Response({"detail": "Ожидается список заказов в поле orders"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        valid, errors = validate_orders(rows)
+        if errors and (atomic or not valid):
+            return Response({"created": [], "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
-    @action(detail=True, methods=["post"])
-    def reserve(self, request, pk=None):
+        try:
+            created = create_orders(valid)
+        except IntegrityError as e:
+            # номер успели занять параллельно — пачка откатилась целиком
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            "created": [{"index": i, "id": o.pk, "number": o.number} for i, o in created],
+            "errors": errors,
+        }, status=status.HTTP_207_MULTI_STATUS if errors else status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"])
+    def transition(self, request):
+        """
+        Массовая смена статуса.
+        Тело: {"status": "ready", "ids": [1, 2, 3]} или {"status": "ready", "filter": {"date": ..., "department": ...}}
+        (filter — те же поля, что у списка). Переходы проверяются по STATUS_TRANSITIONS в самом UPDATE.
+        """
+        target = request.data.get("status")
+        if target not in STATUS_TRANSITIONS:
+            return Response({"status": [f"Неизвестный статус: {target!r}"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        ids = request.data.get("ids")
+        filters = request.data.get("filter")
+        if (ids is None) == (filters is None):
+            return Response({"detail": "Нужно передать либо ids, либо filter"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = Order.objects.all()
+        if ids is not None:
+            try:
+                ids = list(dict.fromkeys(int(i) for i in ids))
+            except (TypeError, ValueError):
+                return Response({"ids": ["Ожидается список id"]}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > TRANSITION_MAX_IDS:
+                return Response({"ids": [f"Не больше {TRANSITION_MAX_IDS} id за запрос"]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        else:
+            if not isinstance(filters, dict) or not filters:
+                return Response({"filter": ["Ожидается непустой объект"]}, status=status.HTTP_400_BAD_REQUEST)
+            filterset_class = DjangoFilterBackend().get_filterset_class(self, queryset)
+            filterset = filterset_class(data=filters, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                return Response({"filter": filterset.errors}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = filterset.qs
+
+        changed = transition_orders(queryset, target)
+        result = {"status": target, "changed": changed}
+        if ids is not None:
+            # что не перевели и почему: текущий статус или нет такого заказа
+            changed_set = set(changed)
+            current = dict(Order.objects.filter(pk__in=[i for i in ids if i not in changed_set])
+                           .values_list("id", "status"))
+            result["skipped"] = [{"id": i, "status": current[i]} for i in ids if i in current]
+            result["not_found"] = [i for i in ids if i not in changed_set and i not in current]
+        return Response(result)
+
+    def _set_status(self, target):
+        # одиночные действия, как и раньше, ставят статус из любого текущего;
+        # STATUS_TRANSITIONS ограничивает только массовый /transition/
         order = self.get_object()
-        order.status = "new"      # или "ready"/"in_progress" если придумаешь код
-        order.save()
+        if order.status != target:
+            order.status = target
+            order.save(update_fields=["status"])
+            self._saved_instance = order
         return Response({"status": order.status})
 
+    @action(detail=True, methods=["post"])
+    def reserve(self, request, pk=None):
+        return self._set_status("new")
+
     @action(detail=True, methods=["post"])
     def complete(self, request, pk=None):
-        order = self.get_object()
-        order.status = "ready"
-        order.save()
-        return Response({"status": order.status})
+        return self._set_status("ready")
 
     @action(detail=True, methods=["post"])
     def cancel(self, request, pk=None):
-        order = self.get_object()
-        order.status = "canceled"
-        order.save()
-        return Response({"status": order.status})
+        return self._set_status("canceled")
 
 
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+class OrderItemViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     permission_classes = [OrderAccessPermission]
@@ -71,9 +228,10 @@ class OrderItemViewSet(viewsets.ModelViewSet):
     filterset_fields = ["order"]
 
 
-class ReportViewSet(viewsets.ModelViewSet):
+class ReportViewSet(OptimisticLockMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Report.objects.all().order_by("-id")
     serializer_class = ReportSerializer
+    keyset_ordering = ("-id",)
     permission_classes = [ReportAccessPermission]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ["report_type", "status", "period_from", "period_to", "format", "grouping"]
@@ -81,115 +239,107 @@ class ReportViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         report = serializer.save(status="processing")
 
-        # генерируем синхронно (очередь сделаем позже)
-        try:
-            self._generate_csv(report)
-        except Exception as e:
-            report.status = "error"
-            report.params = {**(report.params or {}), "error": str(e)}
-            report.save(update_fields=["status", "params"])
-
-    def _generate_csv(self, report: Report):
-        fmt = (report.format or "").upper()
-        if fmt != "CSV":
-            raise ValueError("Сейчас поддерживается только формат CSV")
-
-        grouping = self._normalize_grouping(report.report_type, report.grouping)
-
-        # сохраним нормализованное значение, чтобы дальше не падало
-        if report.grouping != grouping:
-            report.grouping = grouping
-            report.save(update_fields=["grouping"])
-
-        columns, rows = build_report_data(
-            report_type=report.report_type,
-            period_from=report.period_from,
-            period_to=report.period_to,
-            grouping=grouping,
-        )
-
-
-        csv_bytes = render_csv_bytes(columns, rows)
-
-        # имя файла
-        dt = timezone.now().strftime("%Y%m%d_%H%M%S")
-        safe_title = slugify(report.title) or f"report_{report.id}"
-        filename = f"{safe_title}_{dt}.csv"
-
-        report.file.save(filename, ContentFile(csv_bytes), save=False)
-        report.status = "ready"
-        report.params = {
-            **(report.params or {}),
-            "columns": columns,
-            "rows_count": len(rows),
-        }
-        report.save(update_fields=["file", "status", "params"])
-    def _normalize_grouping(self, report_type: str, grouping: str) -> str:
-        """
-        Нормализуем старые/текстовые значения grouping:
-        - "по клиентам" -> client
-        - "по менеджерам" -> manager
-        - "по подразделениям" -> department
-        - для employees client/manager принудительно превращаем в none
-        """
-        rt = (report_type or "").strip().lower()
-        g = (grouping or "").strip().lower()
+        # одинаковый отчёт по неизменившимся данным отдаём сразу из кеша;
+        # ключ — по реплике, как его посчитает воркер
+        with reporting_reads():
+            cache_key = compute_cache_key(report)
+        if try_reuse(report, cache_key, record_miss=False):
+            return
 
-        if g in ("", "none"):
-            g = "none"
+        # файл строит воркер (см. orders/jobs.py), клиент опрашивает статус
+        enqueue_report(report)
 
-        # русские/свободные формулировки (на случай старых записей)
-        if "клиент" in g:
-            g = "client"
-        elif "менедж" in g:
-            g = "manager"
-        elif "подраз" in g:
-            g = "department"
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        return Response(cache_stats())
 
-        # отчёт по сотрудникам не поддерживает client/manager
-        if rt == "employees" and g in ("client", "manager"):
-            g = "none"
-
-        return g
+    def _processing_response(self, report: Report):
+        return Response({
+            "id": report.id,
+            "status": report.status,
+            "progress": (report.params or {}).get("progress"),
+            "error": (report.params or {}).get("error"),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _ensure_ready(self, report: Report):
+        """None — файл готов; иначе ответ 202/400, а при необходимости отчёт ставится в очередь."""
+        if report.status == "ready" and report.file:
+            touch(report)
+            return None
+
+        if report.status == "error":
+            return Response(
+                {"detail": (report.params or {}).get("error", "Ошибка генерации")},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # ready без файла, вытесненный (evicted) или потерянная задача — перегенерируем
+        enqueue_report(report)
+        return self._processing_response(report)
 
     @action(detail=True, methods=["post"])
     def generate(self, request, pk=None):
         report = self.get_object()
-        try:
-            self._generate_csv(report)
-        except Exception as e:
-            report.status = "error"
-            report.params = {**(report.params or {}), "error": str(e)}
-            report.save(update_fields=["status", "params"])
-            return Response({"status": "error", "error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({"status": "ready"})
+        # уже генерируется — вторую задачу не ставим, просто отдаём состояние
+        enqueue_report(report)
+        return self._processing_response(report)
+
+    @action(detail=True, methods=["get"], url_path="status")
+    def job_status(self, request, pk=None):
+        """Состояние генерации — отвечает сразу, клиент опрашивает с паузами."""
+        report = self.get_object()
+        if report.status == "evicted" or job_is_stale(report):
+            # файл удалён по сроку/бюджету хранения или задача потерялась — собираем заново
+            enqueue_report(report)
+
+        params = report.params or {}
+        return Response({
+            "id": report.id,
+            "status": report.status,
+            "progress": params.get("progress"),
+            "rows_count": params.get("rows_count"),
+            "error": params.get("error"),
+        })
 
     @action(detail=True, methods=["get"])
     def preview(self, request, pk=None):
         report = self.get_object()
 
-        # если не готов — попробуем сгенерить
-        if report.status != "ready" or not report.file:
-            try:
-                self._generate_csv(report)
-            except Exception as e:
-                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        not_ready = self._ensure_ready(report)
+        if not_ready is not None:
+            return not_ready
 
-        # preview берём из сохранённого CSV (первые N строк)
-        limit = int(request.query_params.get("limit", 200))
+        # preview: ?offset=&limit= — страница строк из сохранённого CSV
+        try:
+            offset = max(int(request.query_params.get("offset", 0)), 0)
+            limit = min(int(request.query_params.get("limit", 200)), 1000)
+        except ValueError:
+            return Response({"detail": "offset/limit должны быть целыми числами"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"detail": "limit должен быть не меньше 1"}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = report.params or {}
+        index = self._load_index(report)
+        columns = (index or {}).get("columns") or params.get("columns") or []
+        exporter = self._exporter(report, index)
 
         report.file.open("rb")
-        data = report.file.read().decode("utf-8-sig").splitlines()
-        report.file.close()
+        try:
+            rows = exporter.read_page(report.file, index, offset, limit)
+        finally:
+            report.file.close()
 
-        import csv
-        reader = csv.DictReader(data)
-        rows = []
-        for i, row in enumerate(reader):
-            if i >= limit:
-                break
-            rows.append(row)
+        if index is None and not columns and exporter.format == "CSV":
+            # старый файл без индекса и без сохранённых колонок
+            report.file.open("rb")
+            try:
+                columns = next(csv.reader(io.TextIOWrapper(report.file, encoding="utf-8-sig", newline="")), [])
+            finally:
+                report.file.close()
 
+        rows_count = params.get("rows_count")
+        next_offset = offset + len(rows)
         return Response({
             "title": report.title,
             "report_type": report.report_type,
@@ -197,36 +347,139 @@ class ReportViewSet(viewsets.ModelViewSet):
             "grouping": report.grouping,
             "period_from": report.period_from,
             "period_to": report.period_to,
-            "columns": reader.fieldnames or [],
-            "rows": rows,
-            "rows_count": (report.params or {}).get("rows_count"),
+            "columns": columns,
+            "rows": [dict(zip(columns, row)) for row in rows],
+            "rows_count": rows_count,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset if rows_count is None or next_offset < rows_count else None,
         })
 
+    def _exporter(self, report: Report, index=None):
+        # формат файла — из индекса, а без индекса (потерян, старый отчёт) — из самого отчёта
+        return get_exporter((index or {}).get("format") or report.format)
+
+    def _load_index(self, report: Report):
+        index_name = (report.params or {}).get("index_file")
+        if not index_name:
+            return None
+        try:
+            with report.file.storage.open(index_name, "rb") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
     @action(detail=True, methods=["get"])
     def download(self, request, pk=None):
         report = self.get_object()
 
-        if report.status != "ready" or not report.file:
-            try:
-                self._generate_csv(report)
-            except Exception as e:
-                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        not_ready = self._ensure_ready(report)
+        if not_ready is not None:
+            return not_ready
+
+        # сильный ETag = sha256 содержимого; неизменившийся файл повторно не отдаём
+        etag = f'"{self._content_hash(report)}"'
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
         report.file.open("rb")
-        resp = FileResponse(report.file, content_type="text/csv")
+        resp = FileResponse(report.file, content_type=self._exporter(report).content_type)
         resp["Content-Disposition"] = f'attachment; filename="{report.file.name.split("/")[-1]}"'
+        resp["ETag"] = etag
         return resp
 
+    def _content_hash(self, report: Report):
+        """sha256 файла из params; у отчётов, собранных до его появления, считаем один раз."""
+        digest = (report.params or {}).get("sha256")
+        if digest:
+            return digest
+        sha = hashlib.sha256()
+        with report.file.storage.open(report.file.name, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        report.params = {**(report.params or {}), "sha256": digest}
+        Report.objects.filter(pk=report.pk).update(params=report.params, version=F("version") + 1)
+        bump_tables(Report)
+        return digest
+
+
+class SearchView(APIView):
+    """
+    GET /api/v1/search/?q=...&kinds=order,client,employee&page=1&page_size=20
+    Заказы, клиенты и работники одним списком, лучшие совпадения первыми (system/search.py).
+    Заказы — только при праве на их просмотр.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    default_page_size = 20
+    max_page_size = 100
+    # дальше ранжированный список не листают, а OFFSET всё равно перебирает пропущенное
+    max_offset = 1000
+
+    # kind -> поля для карточки результата: (title, subtitle)
+    _display = {
+        "order": (("number", "date", "client__name"), lambda r: (r["number"], f"{r['client__name']} · {r['date']}")),
+        "client": (("name", "contact_person"), lambda r: (r["name"], r["contact_person"])),
+        "employee": (("full_name", "tab_number", "department"),
+                     lambda r: (r["full_name"], f"{r['tab_number']} · {r['department']}")),
+    }
+
+    def _int_param(self, request, name, default, low, high):
+        try:
+            value = int(request.query_params.get(name, default))
+        except (TypeError, ValueError):
+            value = default
+        return max(low, min(value, high))
+
+    def get(self, request):
+        text = request.query_params.get("q", "").strip()
+        kinds = [k for k in query_list(request, "kinds") if k in SEARCH_KINDS] or list(SEARCH_KINDS)
+        perms = request_permissions(request)
+        if not (perms["is_admin"] or perms["can_view_orders"]):
+            kinds = [k for k in kinds if k != "order"]
+
+        page_size = self._int_param(request, "page_size", self.default_page_size, 1, self.max_page_size)
+        page = self._int_param(request, "page", 1, 1, self.max_offset // page_size + 1)
+        offset = (page - 1) * page_size
+
+        # на страницу +1 строка — чтобы знать, есть ли следующая
+        hits = search_backend().search(text, kinds, limit=page_size + 1, offset=offset)
+        has_next = len(hits) > page_size and offset + page_size < self.max_offset
+        hits = hits[:page_size]
+
+        rows = {}
+        for kind in {kind for kind, _, _ in hits}:
+            fields, _ = self._display[kind]
+            ids = [pk for k, pk, _ in hits if k == kind]
+            rows[kind] = {r["pk"]: r for r in search_model(kind).objects.filter(pk__in=ids).values("pk", *fields)}
+
+        results = []
+        for kind, pk, rank in hits:
+            row = rows[kind].get(pk)
+            if row is None:
+                continue  # удалено между поиском и выборкой
+            title, subtitle = self._display[kind][1](row)
+            results.append({"kind": kind, "id": pk, "title": title, "subtitle": subtitle, "rank": rank})
+
+        url = request.build_absolute_uri()
+        return Response({
+            "q": text,
+            "results": results,
+            "next": replace_query_param(url, "page", page + 1) if has_next else None,
+            "previous": replace_query_param(url, "page", page - 1) if page > 1 else None,
+        })
 
 
-class IntegrationViewSet(viewsets.ModelViewSet):
+class IntegrationViewSet(DictionaryCacheMixin, viewsets.ModelViewSet):
     queryset = Integration.objects.all()
     serializer_class = IntegrationSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
 
-class OrderStatusDictViewSet(viewsets.ModelViewSet):
+class OrderStatusDictViewSet(DictionaryCacheMixin, viewsets.ModelViewSet):
     queryset = OrderStatusDict.objects.all()
     serializer_class = OrderStatusDictSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -0,0 +1,169 @@
+"""
+Оптимистическая блокировка по колонке version.
+
+Модель с VersionedModelMixin (и полем version) сохраняется условным
+UPDATE ... WHERE id = %s AND version = %s с version + 1. Если строку уже успел
+изменить кто-то другой, UPDATE не затрагивает ни одной строки и save() бросает
+StaleObjectError — без блокировок строк и ожиданий.
+Массовые update() по таким моделям должны сами поднимать version=F("version") + 1.
+
+В API (OptimisticLockMixin):
+- GET объекта отдаёт сильный ETag "<version>" (304 на If-None-Match); если ответ зависит
+  и от других таблиц (?expand) — слабый W/"<version>-<хеш их версий>". Это единственный
+  ETag объекта: табличный ETag ConditionalGetMixin у таких viewset'ов остаётся только у list;
+- PUT/PATCH/DELETE и action'ы над объектом учитывают If-Match (412, если версия
+  не совпала) и поле version в теле (409);
+- StaleObjectError превращается в 409 обработчиком exception_handler.
+"""
+import hashlib
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .versioning import table_versions
+
+
+class StaleObjectError(DatabaseError):
+    """Строку изменили после того, как её прочитали."""
+
+
+class Conflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Объект изменён другим пользователем, обновите данные и повторите"
+    default_code = "conflict"
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "Версия объекта не совпадает с If-Match"
+    default_code = "precondition_failed"
+
+
+def version_etag(obj) -> str:
+    return f'"{obj.version}"'
+
+
+def _etag_version(etag) -> str:
+    # "7" и W/"7-<хеш>" -> "7"
+    return etag.removeprefix("W/").strip('"').split("-", 1)[0]
+
+
+class VersionedModelMixin:
+    """
+    save(check_version=False) — служебная запись (воркеры, сигналы): без проверки,
+    версия увеличивается в SQL и перечитывается в объект.
+    """
+
+    def save(self, *args, check_version=True, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "version" not in update_fields:
+            kwargs["update_fields"] = [*update_fields, "version"]
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        expected = self.version
+        self._version_mode = "check" if check_version else "blind"
+        if check_version:
+            self.version = expected + 1
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = expected
+            raise
+        finally:
+            del self._version_mode
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        mode = getattr(self, "_version_mode", None)
+        if mode is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+        if mode == "blind":
+            values = [
+                (field, model, F("version") + 1 if field.attname == "version" else value)
+                for field, model, value in values
+            ]
+            # в одной транзакции: строка заблокирована записью, читаем свою версию, а не чужую
+            with transaction.atomic(using=using, savepoint=False):
+                if base_qs.filter(pk=pk_val)._update(values) == 0:
+                    return False
+                self.version = base_qs.filter(pk=pk_val).values_list("version", flat=True).get()
+            return True
+
+        if base_qs.filter(pk=pk_val, version=self.version - 1)._update(values) > 0:
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise StaleObjectError(
+                f"{self._meta.label}(pk={pk_val}): версия {self.version - 1} устарела"
+            )
+        return False
+
+
+class OptimisticLockMixin:
+    """Для ModelViewSet над моделью с VersionedModelMixin."""
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_object_etag(instance)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_object_etag(self, instance):
+        # другие таблицы ответа — get_etag_models() у ConditionalGetMixin (system/versioning.py)
+        get_models = getattr(self, "get_etag_models", None)
+        related = [m for m in (get_models() if get_models else ()) if m is not type(instance)]
+        if not related:
+            return version_etag(instance)
+        raw = "|".join(str(v) for v, _ in table_versions(*related))
+        return f'W/"{instance.version}-{hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]}"'
+
+    def get_object(self):
+        instance = super().get_object()
+        if self.request.method not in SAFE_METHODS:
+            self.check_version_precondition(instance)
+        return instance
+
+    def check_version_precondition(self, instance):
+        header = self.request.META.get("HTTP_IF_MATCH")
+        if header:
+            etags = parse_etags(header)
+            if "*" not in etags and str(instance.version) not in {_etag_version(e) for e in etags}:
+                raise PreconditionFailed()
+
+        data = self.request.data
+        expected = data.get("version") if hasattr(data, "get") else None
+        if expected not in (None, ""):
+            try:
+                expected = int(expected)
+            except (TypeError, ValueError):
+                raise Conflict("Неверное значение version")
+            if expected != instance.version:
+                raise Conflict()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        instance = getattr(self, "_saved_instance", None)
+        if instance is not None and 200 <= response.status_code < 300:
+            response["ETag"] = version_etag(instance)
+        return response
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._saved_instance = serializer.instance
+
+
+def exception_handler(exc, context):
+    if isinstance(exc, StaleObjectError):
+        exc = Conflict()
+    return drf_exception_handler(exc, context)
@@ -0,0 +1,85 @@
+"""
+Профиль соединений SQLite.
+
+DB_PROFILE=production (по умолчанию) — при создании соединения выполняются PRAGMA
+(OPTIONS["init_command"]), соединения живут между запросами (CONN_MAX_AGE) и
+проверяются перед повторным использованием (CONN_HEALTH_CHECKS):
+- journal_mode=WAL — читатели не ждут писателя, писатель не ждёт читателей;
+- synchronous=NORMAL — в WAL безопасно, fsync только на checkpoint;
+- cache_size, mmap_size — страницы БД в памяти процесса / через mmap;
+- busy_timeout — сколько ждать блокировку, вместо мгновенного "database is locked";
+- transaction_mode=IMMEDIATE — транзакция сразу берёт блокировку записи; без этого
+  два читателя, одновременно решившие писать, получают SQLITE_BUSY без ожидания.
+  Цена: любой transaction.atomic() (кроме вложенных — это savepoint) становится
+  BEGIN IMMEDIATE, и такие блоки идут строго по одному на всю БД. Поэтому atomic() —
+  только вокруг записи (save/delete, bulk, переходы статусов, дельты сумм и агрегатов,
+  резерв номеров); чтение, в т.ч. отчёты и статистика, выполняется в autocommit и
+  блокировку записи не берёт. Переходы (orders/transitions.py) рассчитывают на IMMEDIATE:
+  с DEFERRED проверка статусов и UPDATE не защищены от параллельной записи и
+  повторяются через TRANSITION_ATTEMPTS.
+
+DB_PROFILE=basic — как было: без PRAGMA, соединение на каждый запрос.
+Каждое значение переопределяется переменной окружения (см. PRODUCTION_PROFILE), .env подхватывается в settings.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+
+# переменная окружения -> значение по умолчанию
+PRODUCTION_PROFILE = {
+    "SQLITE_JOURNAL_MODE": "WAL",
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_CACHE_SIZE": "-65536",          # отрицательное — в KiB: 64 MiB
+    "SQLITE_MMAP_SIZE": str(256 * 1024 * 1024),
+    "SQLITE_BUSY_TIMEOUT": "5000",          # мс
+    "SQLITE_TRANSACTION_MODE": "IMMEDIATE",
+    "DB_CONN_MAX_AGE": "600",               # с; 0 — закрывать после запроса
+    "DB_CONN_HEALTH_CHECKS": "1",
+}
+
+PROFILES = ("production", "basic")
+
+_CHOICES = {
+    "SQLITE_JOURNAL_MODE": {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"},
+    "SQLITE_SYNCHRONOUS": {"OFF", "NORMAL", "FULL", "EXTRA"},
+    "SQLITE_TRANSACTION_MODE": {"DEFERRED", "IMMEDIATE", "EXCLUSIVE"},
+}
+
+
+def _value(environ, name):
+    value = str(environ.get(name, PRODUCTION_PROFILE[name])).strip()
+    if name in _CHOICES:
+        value = value.upper()
+        if value not in _CHOICES[name]:
+            raise ImproperlyConfigured(f"{name}: ожидается одно из {sorted(_CHOICES[name])}, получено {value!r}")
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f"{name}: ожидается целое число, получено {value!r}")
+
+
+def sqlite_connection_settings(environ, profile=None) -> dict:
+    """Ключи для DATABASES[alias] (OPTIONS, CONN_MAX_AGE, CONN_HEALTH_CHECKS) по профилю."""
+    profile = profile or environ.get("DB_PROFILE", "production")
+    if profile not in PROFILES:
+        raise ImproperlyConfigured(f"DB_PROFILE: ожидается одно из {PROFILES}, получено {profile!r}")
+    if profile == "basic":
+        return {"OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+
+    pragmas = {
+        # первым: смена journal_mode на новом соединении тоже может ждать блокировку
+        "busy_timeout": _value(environ, "SQLITE_BUSY_TIMEOUT"),
+        "journal_mode": _value(environ, "SQLITE_JOURNAL_MODE"),
+        "synchronous": _value(environ, "SQLITE_SYNCHRONOUS"),
+        "cache_size": _value(environ, "SQLITE_CACHE_SIZE"),
+        "mmap_size": _value(environ, "SQLITE_MMAP_SIZE"),
+    }
+    return {
+        "OPTIONS": {
+            # выполняется в get_new_connection, т.е. на каждом новом соединении
+            "init_command": ";".join(f"PRAGMA {name}={value}" for name, value in pragmas.items()),
+            "transaction_mode": _value(environ, "SQLITE_TRANSACTION_MODE"),
+        },
+        "CONN_MAX_AGE": _value(environ, "DB_CONN_MAX_AGE"),
+        "CONN_HEALTH_CHECKS": bool(_value(environ, "DB_CONN_HEALTH_CHECKS")),
+    }
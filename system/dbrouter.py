@@ -0,0 +1,121 @@
+"""
+Реплика для тяжёлых чтений (отчёты).
+
+Если в DATABASES есть alias REPORTING_DB_ALIAS ("reporting"), чтения моделей из
+REPORTING_DB_MODELS внутри reporting_reads() идут туда; запись и всё остальное — в default.
+Без alias'а reporting_reads() ничего не меняет.
+
+    with reporting_reads():
+        columns, rows = build_report_data(...)
+        ...  # строки выбираются лениво — итерировать тоже внутри блока
+
+Реплика может быть:
+- настоящей репликой/второй БД (обновляет её сама СУБД);
+- локальной SQLite-копией SQLite-базы default (REPORTING_DB_COPY=1): при входе в reporting_reads()
+  копия обновляется через sqlite backup API, если она старше REPORTING_DB_MAX_STALENESS секунд
+  (или manage.py refresh_reporting_db по расписанию).
+
+В тестах alias по умолчанию — зеркало default (TEST.MIRROR), расхождения нет.
+"""
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+
+logger = logging.getLogger(__name__)
+
+# alias для чтений в текущем контексте (None — обычная маршрутизация)
+_read_alias = ContextVar("reporting_read_alias", default=None)
+
+_refresh_lock = threading.Lock()
+
+REFRESHED_AT_KEY = "dbrouter:reporting:refreshed_at"
+
+
+def reporting_alias():
+    alias = settings.REPORTING_DB_ALIAS
+    return alias if alias in settings.DATABASES else None
+
+
+def _is_mirror(alias) -> bool:
+    # зеркало (тесты) или alias, настроенный на тот же файл, — копировать нечего
+    return connections[alias].settings_dict["NAME"] == connections["default"].settings_dict["NAME"]
+
+
+def replica_age():
+    """Секунды с последнего обновления SQLite-копии (None — ещё не обновлялась в этом кеше)."""
+    refreshed_at = cache.get(REFRESHED_AT_KEY)
+    return None if refreshed_at is None else time.time() - refreshed_at
+
+
+def refresh_reporting_copy(force=False) -> bool:
+    """
+    Обновляет SQLite-копию default в alias "reporting", если она старше допустимой.
+    Возвращает True, если копия обновлялась.
+    """
+    alias = reporting_alias()
+    if alias is None or _is_mirror(alias):
+        return False
+    with _refresh_lock:
+        age = replica_age()
+        if not force and age is not None and age <= settings.REPORTING_DB_MAX_STALENESS:
+            return False
+        source, target = connections["default"], connections[alias]
+        # отдельное соединение: текущее может быть внутри транзакции с незакоммиченными данными
+        raw_source = source.get_new_connection(source.get_connection_params())
+        target.ensure_connection()
+        started = time.time()
+        try:
+            # backup копирует снимок целиком, читатели копии ждут его окончания
+            raw_source.backup(target.connection)
+        finally:
+            raw_source.close()
+        cache.set(REFRESHED_AT_KEY, started, timeout=None)
+        logger.info("reporting copy refreshed in %.2fs", time.time() - started)
+        return True
+
+
+@contextlib.contextmanager
+def reporting_reads():
+    """Чтения моделей из REPORTING_DB_MODELS в блоке идут в реплику."""
+    alias = reporting_alias()
+    # внутри транзакции не копируем: backup ждал бы блокировку, которую держит этот же поток
+    if alias is not None and settings.REPORTING_DB_COPY and not connections["default"].in_atomic_block:
+        try:
+            refresh_reporting_copy()
+        except (DatabaseError, sqlite3.Error):
+            # копия недоступна — читаем из default, отчёт важнее разгрузки
+            logger.exception("reporting copy refresh failed, reading from default")
+            alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield alias or "default"
+    finally:
+        _read_alias.reset(token)
+
+
+class ReportingRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias and model._meta.label in settings.REPORTING_DB_MODELS:
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints):
+        # запись — всегда в default
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплика — те же данные, связи между объектами из разных alias'ов допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # схема в реплику приходит вместе с данными (репликация или копия)
+        return db != settings.REPORTING_DB_ALIAS
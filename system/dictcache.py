@@ -0,0 +1,100 @@
+"""
+Справочники в памяти процесса: маленькие, почти неизменные таблицы (роли, статусы заказов,
+интеграции) и производные от них списки (подразделения сотрудников).
+
+Значение хранится вместе с версиями таблиц, из которых собрано (system/versioning.py:
+счётчик растёт при любой записи — сигналы post_save/post_delete). Версии общие для всех
+процессов: в Redis (REDIS_URL) — тогда ответ из памяти обходится без запросов к БД,
+без него — в таблице orders.TableVersion, один запрос на сверку. Запись в любом процессе
+пересоберёт значение в каждом воркере при следующем обращении. Если версии в кеше одного
+процесса (TABLE_VERSIONS_STORE=cache без общего кеша), значение в памяти не держится.
+
+Ответ помечается ETag по версиям и Cache-Control: max-age=DICTIONARY_CACHE_MAX_AGE —
+браузер повторно не спрашивает, а после истечения получает 304, если ничего не менялось.
+"""
+import copy
+import hashlib
+import threading
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .versioning import table_versions, versions_shared
+
+
+# имя -> (версии таблиц, данные)
+_store = {}
+_lock = threading.Lock()
+
+
+def _cached(name, versions, build):
+    if not versions_shared():
+        # чужая запись не поднимет локальную версию — держать в памяти нельзя
+        return build()
+    cached = _store.get(name)
+    if cached is not None and cached[0] == versions:
+        return cached[1]
+    with _lock:
+        cached = _store.get(name)
+        if cached is None or cached[0] != versions:
+            # версии прочитаны до сборки: запись во время build() поднимет их, и следующий запрос пересоберёт
+            cached = (versions, build())
+            _store[name] = cached
+    return cached[1]
+
+
+def dictionary_response(request, name, models, build, render=Response):
+    versions = table_versions(*models)
+    raw = "|".join([name, *(str(v) for v, _ in versions)])
+    etag = f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+    last_modified = int(max((m for _, m in versions), default=0)) or None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = render(_cached(name, [v for v, _ in versions], build))
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=settings.DICTIONARY_CACHE_MAX_AGE)
+    return response
+
+
+class DictionaryCacheMixin:
+    """
+    list без query-параметров — из памяти процесса; с фильтрами или курсором — обычным путём.
+    В памяти — сериализованная страница и состояние пагинатора, а ссылки next/previous
+    пагинатор строит для каждого запроса: они абсолютные, от хоста и схемы запроса.
+    dictionary_models — таблицы, от которых зависит ответ (по умолчанию — модель queryset).
+    """
+
+    dictionary_models = ()
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        models = self.dictionary_models or (self.get_queryset().model,)
+        return dictionary_response(
+            request,
+            f"{type(self).__module__}.{type(self).__name__}.list",
+            models,
+            self._build_page,
+            lambda page: self._render_page(request, page),
+        )
+
+    def _build_page(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.paginate_queryset(queryset)
+        if rows is None:
+            return None, self.get_serializer(queryset, many=True).data
+        return self.paginator, self.get_serializer(rows, many=True).data
+
+    def _render_page(self, request, page):
+        paginator, data = page
+        if paginator is None:
+            return Response(data)
+        # копия: один и тот же пагинатор из памяти обслуживает параллельные запросы
+        paginator = copy.copy(paginator)
+        paginator.request = request
+        return paginator.get_paginated_response(data)
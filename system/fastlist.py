@@ -0,0 +1,139 @@
+"""
+Быстрый путь сериализации списков (только чтение).
+
+Вместо модели на строку + ModelSerializer.to_representation по полю:
+queryset.values_list() нужных колонок и заранее собранные конвертеры на колонку
+(даты, Decimal, FK -> id). Вывод совпадает с обычным сериализатором байт в байт.
+Включается во viewset атрибутом fast_list = True; если в сериализаторе есть поля,
+которые так не выразить (вложенные сериализаторы, SerializerMethodField, source="*"),
+используется обычный list().
+"""
+import decimal
+
+from rest_framework import fields as drf_fields
+from rest_framework import relations, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def _decimal_converter(field: drf_fields.DecimalField):
+    if field.localize:
+        return None
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    exp = decimal.Decimal(".1") ** field.decimal_places if field.decimal_places is not None else None
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    normalize = field.normalize_output
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        if exp is not None:
+            value = value.quantize(exp, rounding=rounding, context=context)
+        if normalize:
+            value = value.normalize()
+        return f"{value:f}" if coerce_to_string else value
+    return convert
+
+
+def _date_converter(field: drf_fields.DateField):
+    output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+    if output_format is None:
+        return _identity
+    if output_format.lower() == drf_fields.ISO_8601:
+        return lambda value: value.isoformat()
+    return lambda value: value.strftime(output_format)
+
+
+def _identity(value):
+    return value
+
+
+def compile_row_plan(serializer):
+    """
+    [(имя_в_ответе, колонка_values_list, конвертер)] или None, если быстрый путь невозможен.
+    Конвертер вызывается только для не-None значений — как в Serializer.to_representation.
+    """
+    model = serializer.Meta.model
+    opts = model._meta
+    plan = []
+    for field in serializer._readable_fields:
+        if isinstance(field, (serializers.BaseSerializer, drf_fields.SerializerMethodField)):
+            return None
+        source = field.source
+        if not source or "." in source or source == "*":
+            return None
+        try:
+            model_field = opts.get_field(source)
+        except Exception:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+
+        if isinstance(field, relations.PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                return None
+            converter = _identity
+        elif isinstance(field, drf_fields.DecimalField):
+            converter = _decimal_converter(field)
+        elif isinstance(field, drf_fields.DateTimeField):
+            converter = field.to_representation
+        elif isinstance(field, drf_fields.DateField):
+            converter = _date_converter(field)
+        elif isinstance(field, (drf_fields.CharField, drf_fields.IntegerField)) and not isinstance(
+            field, drf_fields.ChoiceField
+        ):
+            # ровно то, что делают CharField/IntegerField.to_representation
+            converter = str if isinstance(field, drf_fields.CharField) else int
+        elif isinstance(field, relations.RelatedField):
+            return None
+        else:
+            converter = field.to_representation
+        if converter is None:
+            return None
+        plan.append((field.field_name, model_field.name, converter))
+    return plan
+
+
+class FastListMixin:
+    """Подмешивается во ModelViewSet: list() через values_list + конвертеры, если fast_list = True."""
+
+    fast_list = False
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_serializer()
+        plan = compile_row_plan(serializer)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        columns = [column for _, column, _ in plan]
+        # колонки ключа сортировки нужны keyset-пагинации, даже если их нет в ответе
+        for name in getattr(self, "keyset_ordering", None) or ("id",):
+            name = name.lstrip("-")
+            if name not in columns:
+                columns.append(name)
+        positions = {column: i for i, column in enumerate(columns)}
+        steps = [(name, positions[column], convert) for name, column, convert in plan]
+
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.select_related(None).prefetch_related(None).values_list(*columns, named=True)
+
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, i, convert in steps:
+                value = row[i]
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,195 @@
+"""
+Keyset (cursor) пагинация для списков API.
+
+Страница выбирается условием по значениям ключа сортировки последней строки
+(WHERE (date, number, id) "после" курсора), без OFFSET и без COUNT(*).
+Сортировка берётся из view.keyset_ordering (по умолчанию ("id",)),
+последнее поле должно быть уникальным, все поля — NOT NULL.
+
+?cursor=...      — курсор из ссылок next/previous; неверный или подделанный — 400
+?page_size=N     — размер страницы (не больше max_page_size)
+?count=estimate  — добавить в ответ count_estimate (оценка по статистике таблицы,
+                   только для запросов без фильтров)
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """Оценка числа строк таблицы без COUNT(*): статистика планировщика или MAX(id)."""
+    model = queryset.model
+    table = model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return int(row[0])
+        if connection.vendor == "sqlite":
+            try:
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+            except Exception:
+                row = None  # ANALYZE ещё не запускался
+            if row and row[0]:
+                return int(str(row[0]).split()[0])
+    # rowid/автоинкремент: MAX по первичному ключу — один проход по краю индекса
+    pk = model._meta.pk.attname
+    return model._base_manager.using(queryset.db).order_by(f"-{pk}").values_list(pk, flat=True).first() or 0
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    default_ordering = ("id",)
+
+    def get_ordering(self, view):
+        return tuple(getattr(view, "keyset_ordering", None) or self.default_ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    # --- курсор ---
+
+    def encode_cursor(self, values, reverse=False):
+        payload = {"v": values}
+        if reverse:
+            payload["r"] = 1
+        raw = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values = payload["v"]
+            reverse = bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError):
+            raise self.invalid_cursor()
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise self.invalid_cursor()
+        return values, reverse
+
+    def invalid_cursor(self):
+        return ValidationError({self.cursor_query_param: ["Неверный курсор"]})
+
+    def _position(self, row):
+        return [getattr(row, name.lstrip("-")) for name in self.ordering]
+
+    def _after(self, model, values, reverse):
+        """
+        Условие "строго после курсора" по ключу сортировки:
+        f1 > v1 OR (f1 = v1 AND f2 > v2) OR ...
+        плюс избыточная граница по f1 — чтобы SQL шёл диапазоном по индексу.
+        """
+        opts = model._meta
+        parsed = []
+        for name, raw in zip(self.ordering, values):
+            field = opts.get_field(name.lstrip("-"))
+            desc = name.startswith("-") != reverse
+            if raw is None or isinstance(raw, (list, dict)):
+                raise self.invalid_cursor()
+            try:
+                value = field.to_python(raw)
+            except (DjangoValidationError, TypeError, ValueError):
+                raise self.invalid_cursor()
+            parsed.append((field.attname, desc, value))
+
+        first_name, first_desc, first_value = parsed[0]
+        q = Q(**{f"{first_name}__{'lte' if first_desc else 'gte'}": first_value})
+
+        alternatives = Q()
+        equal = Q()
+        for attname, desc, value in parsed:
+            alternatives |= equal & Q(**{f"{attname}__{'lt' if desc else 'gt'}": value})
+            equal &= Q(**{attname: value})
+        return q & alternatives
+
+    # --- API пагинатора ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.page_size_value = self.get_page_size(request)
+        values, reverse = self.decode_cursor(request)
+
+        self.count_estimate = None
+        if request.query_params.get(self.count_query_param) == "estimate" and not queryset.query.where:
+            self.count_estimate = estimate_count(queryset)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(f[1:] if f.startswith("-") else f"-{f}" for f in ordering)
+
+        qs = queryset.order_by(*ordering)
+        if values is not None:
+            qs = qs.filter(self._after(queryset.model, values, reverse))
+
+        rows = list(qs[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else has_more
+        self.first_position = self._position(rows[0]) if rows else None
+        self.last_position = self._position(rows[-1]) if rows else None
+        if not rows and values is not None:
+            # пустая страница по курсору: ссылаемся обратно на тот же курсор
+            self.first_position = self.last_position = values
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_position))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.first_position, reverse=True))
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+        ])
+        if self.count_estimate is not None:
+            payload["count_estimate"] = self.count_estimate
+        payload["results"] = data
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "count_estimate": {"type": "integer"},
+                "results": schema,
+            },
+        }
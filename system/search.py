@@ -0,0 +1,341 @@
+"""
+Полнотекстовый поиск: заказы (номер + названия позиций), клиенты (название, контактное лицо),
+работники (ФИО, табельный номер).
+
+Бэкенд — settings.SEARCH_BACKEND:
+- "fts5"  — индекс SQLite FTS5: по таблице search_<kind> на сущность, rowid = id строки.
+  Индекс синхронизируют триггеры в самой БД, поэтому его не обходят bulk_create, update()
+  и правки в обход Django. Таблицы и триггеры ставит миграция orders 0012 (своя копия DDL);
+  manage.py rebuild_search_index пересоздаёт их и перечитывает данные.
+  Колонка items заказа — названия всех его позиций: триггер позиции пересобирает её целиком,
+  поэтому пачка позиций одного заказа пишется под deferred_order_items (колонка — один раз).
+- "basic" — icontains по тем же полям (любая СУБД, без индекса, для небольших баз;
+  в SQLite LIKE не сворачивает регистр кириллицы и не приравнивает ё к е);
+- "auto"  — fts5, если таблицы индекса есть в БД, иначе basic.
+
+Запрос разбивается на слова, каждое ищется как префикс ("ив пет" найдёт "Иванов Пётр"),
+все слова должны встретиться. ё приравнивается к е — и в индексе, и в запросе.
+
+    queryset = search_backend().filter(Client.objects.all(), "client", "рога")
+    hits = search_backend().search("рога", kinds=["order", "client"], limit=20)
+"""
+import logging
+import re
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+
+
+logger = logging.getLogger(__name__)
+
+# kind -> модель, поля для basic, таблица FTS5 и её колонки с весами bm25
+SEARCH_KINDS = {
+    "order": {
+        "model": "orders.Order",
+        "lookups": ("number", "items__name"),
+        "table": "search_order",
+        "columns": {"number": 10.0, "items": 1.0},
+    },
+    "client": {
+        "model": "users.Client",
+        "lookups": ("name", "contact_person"),
+        "table": "search_client",
+        "columns": {"name": 5.0, "contact_person": 1.0},
+    },
+    "employee": {
+        "model": "users.Employee",
+        "lookups": ("full_name", "tab_number"),
+        "table": "search_employee",
+        "columns": {"full_name": 5.0, "tab_number": 5.0},
+    },
+}
+
+SEARCH_QUERY_PARAM = "search"
+MAX_QUERY_WORDS = 8
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text: str) -> str:
+    return (text or "").replace("ё", "е").replace("Ё", "Е").casefold()
+
+
+def query_words(text: str) -> list:
+    return _WORD_RE.findall(normalize(text))[:MAX_QUERY_WORDS]
+
+
+def search_model(kind):
+    return apps.get_model(SEARCH_KINDS[kind]["model"])
+
+
+class BasicSearchBackend:
+    name = "basic"
+
+    def _q(self, kind, words):
+        q = Q()
+        for word in words:
+            q &= Q.create(
+                [(f"{lookup}__icontains", word) for lookup in SEARCH_KINDS[kind]["lookups"]],
+                connector=Q.OR,
+            )
+        return q
+
+    def filter(self, queryset, kind, text):
+        words = query_words(text)
+        if not words:
+            return queryset.none()
+        # items__name даёт по строке на позицию
+        return queryset.filter(pk__in=search_model(kind).objects.filter(self._q(kind, words)).values("pk"))
+
+    def search(self, text, kinds, limit, offset=0):
+        """[(kind, id, rank)] — без ранжирования: по kind в порядке kinds, внутри по id."""
+        words = query_words(text)
+        if not words:
+            return []
+        hits = []
+        for kind in kinds:
+            ids = (
+                search_model(kind).objects.filter(self._q(kind, words))
+                .order_by("pk").values_list("pk", flat=True).distinct()[:offset + limit]
+            )
+            hits.extend((kind, pk, 0.0) for pk in ids)
+            if len(hits) >= offset + limit:
+                break
+        return hits[offset:offset + limit]
+
+
+class Fts5SearchBackend:
+    name = "fts5"
+
+    @staticmethod
+    def match_expression(text):
+        # каждое слово — в кавычках (операторы FTS5 в запросе не работают), префиксом;
+        # однобуквенное — целиком: префикс из одного символа — почти весь индекс
+        return " ".join(f'"{w}"*' if len(w) > 1 else f'"{w}"' for w in query_words(text))
+
+    def filter(self, queryset, kind, text):
+        match = self.match_expression(text)
+        if not match:
+            return queryset.none()
+        table = SEARCH_KINDS[kind]["table"]
+        return queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [match]))
+
+    def search(self, text, kinds, limit, offset=0):
+        """[(kind, id, rank)] по всем kinds, лучшие (меньший bm25) первыми."""
+        match = self.match_expression(text)
+        if not match or not kinds:
+            return []
+        parts, params = [], []
+        for kind in kinds:
+            spec = SEARCH_KINDS[kind]
+            weights = ", ".join(str(w) for w in spec["columns"].values())
+            parts.append(
+                f"SELECT %s AS kind, rowid AS id, bm25({spec['table']}, {weights}) AS rank "
+                f"FROM {spec['table']} WHERE {spec['table']} MATCH %s"
+            )
+            params += [kind, match]
+        sql = " UNION ALL ".join(parts) + " ORDER BY rank, kind, id LIMIT %s OFFSET %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit, offset])
+            return [(kind, pk, rank) for kind, pk, rank in cursor.fetchall()]
+
+
+_BACKENDS = {backend.name: backend for backend in (Fts5SearchBackend, BasicSearchBackend)}
+
+
+def fts5_installed(using=connection) -> bool:
+    if using.vendor != "sqlite":
+        return False
+    tables = {kind["table"] for kind in SEARCH_KINDS.values()}
+    return tables <= set(using.introspection.table_names())
+
+
+_auto_backend = None
+
+
+def search_backend():
+    global _auto_backend
+    name = settings.SEARCH_BACKEND
+    if name == "auto":
+        # таблицы индекса не появляются и не пропадают на ходу (только миграцией)
+        if _auto_backend is None:
+            _auto_backend = "fts5" if fts5_installed() else "basic"
+            if _auto_backend == "basic":
+                logger.warning(
+                    "SEARCH_BACKEND=auto: индекса FTS5 нет в БД, поиск через basic (icontains без индекса). "
+                    "Поставить индекс — manage.py rebuild_search_index"
+                )
+        name = _auto_backend
+    if name not in _BACKENDS:
+        raise ValueError(f"Неизвестный SEARCH_BACKEND: {name}")
+    return _BACKENDS[name]()
+
+
+class SearchIndexFilter(BaseFilterBackend):
+    """?search= для списков; сущность — view.search_kind."""
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(SEARCH_QUERY_PARAM, "").strip()
+        if not text:
+            return queryset
+        return search_backend().filter(queryset, view.search_kind, text)
+
+
+# --- FTS5: таблицы и триггеры ---
+
+def _fold(expr):
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _items_text(order_id):
+    return _fold(f"(SELECT group_concat(name, ' ') FROM orders_orderitem WHERE order_id = {order_id})")
+
+
+# kind -> (таблица-источник, выражения колонок индекса через {row})
+_SOURCES = {
+    "order": ("orders_order", {"number": _fold("{row}.number"), "items": _items_text("{row}.id")}),
+    "client": ("users_client", {"name": _fold("{row}.name"), "contact_person": _fold("{row}.contact_person")}),
+    "employee": ("users_employee", {"full_name": _fold("{row}.full_name"), "tab_number": _fold("{row}.tab_number")}),
+}
+
+
+def _insert_row(kind, row):
+    spec = SEARCH_KINDS[kind]
+    _, exprs = _SOURCES[kind]
+    return (
+        f"INSERT INTO {spec['table']}(rowid, {', '.join(exprs)}) "
+        f"VALUES ({row}.id, {', '.join(e.format(row=row) for e in exprs.values())})"
+    )
+
+
+def _fts5_statements():
+    statements = []
+    for kind, spec in SEARCH_KINDS.items():
+        table = spec["table"]
+        source, exprs = _SOURCES[kind]
+        watched = ", ".join(c for c in exprs if c != "items")
+        statements += [
+            # prefix — отдельные индексы для префиксов из 2 и 3 символов
+            f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(spec['columns'])}, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+            f"INSERT INTO {table}(rowid, {', '.join(exprs)}) "
+            f"SELECT t.id, {', '.join(e.format(row='t') for e in exprs.values())} FROM {source} t",
+            f"CREATE TRIGGER {table}_ai AFTER INSERT ON {source} BEGIN {_insert_row(kind, 'new')}; END",
+            f"CREATE TRIGGER {table}_au AFTER UPDATE OF {watched} ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; {_insert_row(kind, 'new')}; END",
+            f"CREATE TRIGGER {table}_ad AFTER DELETE ON {source} BEGIN "
+            f"DELETE FROM {table} WHERE rowid = old.id; END",
+        ]
+    # названия позиций — колонка items заказа; заказы из search_order_pending
+    # пересобирает сам пишущий код (deferred_order_items), а не триггер на каждую позицию
+    set_items = "UPDATE search_order SET items = {text} WHERE rowid = {order_id}"
+    when = "WHEN NOT EXISTS (SELECT 1 FROM search_order_pending WHERE order_id = {order_id})"
+    statements += [
+        "CREATE TABLE search_order_pending (order_id INTEGER PRIMARY KEY)",
+        f"CREATE TRIGGER search_orderitem_ai AFTER INSERT ON orders_orderitem {when.format(order_id='new.order_id')} "
+        f"BEGIN {set_items.format(text=_items_text('new.order_id'), order_id='new.order_id')}; END",
+        "CREATE TRIGGER search_orderitem_au AFTER UPDATE OF name, order_id ON orders_orderitem BEGIN "
+        f"{set_items.format(text=_items_text('old.order_id'), order_id='old.order_id')}; "
+        f"{set_items.format(text=_items_text('new.order_id'), order_id='new.order_id')}; END",
+        f"CREATE TRIGGER search_orderitem_ad AFTER DELETE ON orders_orderitem {when.format(order_id='old.order_id')} "
+        f"BEGIN {set_items.format(text=_items_text('old.order_id'), order_id='old.order_id')}; END",
+    ]
+    return statements
+
+
+def _fts5_available(cursor) -> bool:
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # FTS5 может быть подключён и без флага компиляции (расширением)
+        cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def install_fts5(using=connection) -> bool:
+    """Создаёт таблицы FTS5 и триггеры, заполняет индекс. False — не SQLite или нет FTS5."""
+    global _auto_backend
+    if using.vendor != "sqlite":
+        return False
+    with using.cursor() as cursor:
+        if not _fts5_available(cursor):
+            return False
+        uninstall_fts5(using)
+        for statement in _fts5_statements():
+            cursor.execute(statement)
+    _auto_backend = None
+    return True
+
+
+def _trigger_names():
+    prefixes = [spec["table"] for spec in SEARCH_KINDS.values()] + ["search_orderitem"]
+    return {f"{prefix}_{suffix}" for prefix in prefixes for suffix in ("ai", "au", "ad")}
+
+
+def uninstall_fts5(using=connection):
+    global _auto_backend
+    if using.vendor != "sqlite":
+        return
+    with using.cursor() as cursor:
+        for name in sorted(_trigger_names()):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for spec in SEARCH_KINDS.values():
+            cursor.execute(f"DROP TABLE IF EXISTS {spec['table']}")
+        cursor.execute("DROP TABLE IF EXISTS search_order_pending")
+    _auto_backend = None
+
+
+def ensure_fts5(using=connection) -> bool:
+    """
+    Переставляет индекс, если пропал хоть один триггер: миграция, меняющая таблицу модели,
+    в SQLite пересоздаёт таблицу, и её триггеры удаляются вместе со старой. Вызывается после migrate.
+    """
+    global _auto_backend
+    _auto_backend = None  # миграция могла поставить или убрать индекс
+    if not fts5_installed(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        present = {name for (name,) in cursor.fetchall()}
+    if _trigger_names() <= present:
+        return False
+    return install_fts5(using)
+
+
+@contextmanager
+def deferred_order_items(order_ids, using=connection):
+    """
+    Запись многих позиций заказов order_ids (bulk_create): триггер позиции эти заказы
+    пропускает, колонка items пересобирается в конце — по разу на заказ, а не на позицию.
+    Только внутри transaction.atomic(): отметки в search_order_pending видны лишь этой транзакции.
+    """
+    order_ids = sorted(set(order_ids))
+    if not order_ids or not fts5_installed(using):
+        yield
+        return
+    with using.cursor() as cursor:
+        cursor.executemany("INSERT OR IGNORE INTO search_order_pending(order_id) VALUES (%s)",
+                           [(pk,) for pk in order_ids])
+    yield
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE search_order SET items = {_items_text('search_order.rowid')} "
+            "WHERE rowid IN (SELECT order_id FROM search_order_pending)"
+        )
+        cursor.execute("DELETE FROM search_order_pending")
+
+
+def optimize_fts5(using=connection):
+    """Сливает сегменты индекса в один (после массовой загрузки запросы быстрее)."""
+    with using.cursor() as cursor:
+        for spec in SEARCH_KINDS.values():
+            cursor.execute(f"INSERT INTO {spec['table']}({spec['table']}) VALUES ('optimize')")
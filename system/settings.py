@@ -10,11 +10,19 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+from system.dbprofile import sqlite_connection_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# переменные из .env (уже заданные в окружении не перетираются)
+load_dotenv(BASE_DIR / ".env")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -80,13 +88,59 @@ WSGI_APPLICATION = "system.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# DB_PROFILE / SQLITE_* / DB_CONN_* — профиль соединений, см. system/dbprofile.py
+# SQLITE_TRANSACTION_MODE=IMMEDIATE: каждый atomic() берёт блокировку записи — atomic() только вокруг записи
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        **sqlite_connection_settings(os.environ),
     }
 }
 
+# Реплика для отчётов (system/dbrouter.py). REPORTING_DB_NAME — вторая БД (реплика
+# или локальная SQLite-копия); REPORTING_DB_COPY=1 — копию обновляет само приложение,
+# если она старше REPORTING_DB_MAX_STALENESS секунд.
+REPORTING_DB_ALIAS = "reporting"
+REPORTING_DB_COPY = os.environ.get("REPORTING_DB_COPY", "0") == "1"
+REPORTING_DB_MAX_STALENESS = int(os.environ.get("REPORTING_DB_MAX_STALENESS", 300))
+# модели, чтения которых внутри reporting_reads() идут в реплику: данные отчётов и
+# дашбордов (/orders/stats/, /employees/stats/) и версии таблиц для их ключей кеша —
+# ключ из той же реплики, что и данные
+REPORTING_DB_MODELS = {
+    "orders.Order", "orders.OrderItem", "orders.OrderDailyAggregate", "orders.ReportDataStamp",
+    "orders.TableVersion", "users.Employee", "users.Client",
+}
+if os.environ.get("REPORTING_DB_NAME"):
+    DATABASES[REPORTING_DB_ALIAS] = {
+        "ENGINE": os.environ.get("REPORTING_DB_ENGINE", "django.db.backends.sqlite3"),
+        "NAME": os.environ["REPORTING_DB_NAME"],
+        **(sqlite_connection_settings(os.environ)
+           if os.environ.get("REPORTING_DB_ENGINE", "django.db.backends.sqlite3").endswith("sqlite3") else {}),
+        # в тестах — зеркало default; REPORTING_DB_TEST_MIRROR=0 — отдельная тестовая БД
+        # (для проверки копии/расхождения с default)
+        "TEST": {"MIRROR": "default"} if os.environ.get("REPORTING_DB_TEST_MIRROR", "1") == "1" else {},
+    }
+
+DATABASE_ROUTERS = ["system.dbrouter.ReportingRouter"]
+
+
+REST_FRAMEWORK = {
+    # keyset-пагинация для всех списков; сортировка — view.keyset_ordering
+    "DEFAULT_PAGINATION_CLASS": "system.pagination.KeysetPagination",
+    "PAGE_SIZE": 50,
+    # пользователь и права берутся из снимка в сессии (users/auth.py)
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "users.auth.SnapshotSessionAuthentication",
+        "rest_framework.authentication.BasicAuthentication",
+    ],
+    # StaleObjectError (system/concurrency.py) -> 409
+    "EXCEPTION_HANDLER": "system.concurrency.exception_handler",
+}
+
+# сессии читаются из кеша, в БД — только запись и промах кеша
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,3 +185,61 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
+
+
+# Кеш: версии таблиц для ETag (system/versioning.py), счётчики кеша отчётов.
+# Между процессами/нодами счётчики должны быть общими — задайте REDIS_URL.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+
+# Где хранятся версии таблиц (system/versioning.py): auto | cache | db.
+# auto — в кеше, если он общий (Redis), иначе в БД (orders.TableVersion)
+TABLE_VERSIONS_STORE = os.environ.get("TABLE_VERSIONS_STORE", "auto")
+
+
+# Статистика дашборда (/orders/stats/, /employees/stats/): кеш сбрасывается записью
+# в таблицы, STATS_CACHE_TTL — верхняя граница жизни (секунды)
+STATS_CACHE_TTL = int(os.environ.get("STATS_CACHE_TTL", 30))
+# /orders/stats/ by_date без фильтра по дате — за последние N дней
+STATS_BY_DATE_DAYS = int(os.environ.get("STATS_BY_DATE_DAYS", 90))
+
+
+# Поиск (system/search.py): auto | fts5 | basic
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "auto")
+
+
+# Справочники (system/dictcache.py): сколько секунд браузер не перезапрашивает
+# роли, статусы, интеграции, подразделения
+DICTIONARY_CACHE_MAX_AGE = int(os.environ.get("DICTIONARY_CACHE_MAX_AGE", 3600))
+
+
+# Подсказки форм (users/autocomplete.py): справочник больше стольких строк
+# не держится в памяти процесса, префикс ищется через SEARCH_BACKEND
+AUTOCOMPLETE_MAX_ROWS = int(os.environ.get("AUTOCOMPLETE_MAX_ROWS", 200_000))
+
+
+# Номера заказов (orders/numbering.py): шаблон с {year}, {department}, {seq}
+# и сколько номеров процесс резервирует за один запрос к БД
+ORDER_NUMBER_FORMAT = os.environ.get("ORDER_NUMBER_FORMAT", "ORD-{year}-{seq:06d}")
+ORDER_NUMBER_BLOCK = int(os.environ.get("ORDER_NUMBER_BLOCK", 100))
+
+
+# Очередь генерации отчётов (orders/jobs.py): celery | thread | sync
+REPORTS_QUEUE_BACKEND = os.environ.get("REPORTS_QUEUE_BACKEND", "thread")
+REPORTS_QUEUE_WORKERS = int(os.environ.get("REPORTS_QUEUE_WORKERS", 2))
+# отчёт в "processing", по которому воркер молчит дольше этого, ставится в очередь заново
+REPORTS_JOB_STALE_SECONDS = int(os.environ.get("REPORTS_JOB_STALE_SECONDS", 600))
+
+# Хранение файлов отчётов (orders/retention.py): общий бюджет media/reports
+# и срок хранения отчёта без скачиваний
+REPORTS_STORAGE_BUDGET_MB = int(os.environ.get("REPORTS_STORAGE_BUDGET_MB", 1024))
+REPORTS_TTL_DAYS = int(os.environ.get("REPORTS_TTL_DAYS", 30))
+
+CELERY_BROKER_URL = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
@@ -29,6 +29,7 @@ from orders.views import (
     ReportViewSet,
     IntegrationViewSet,
     OrderStatusDictViewSet,
+    SearchView,
 )
 
 from users.views import (
@@ -56,6 +57,7 @@ urlpatterns = [
     path("", ensure_csrf_cookie(TemplateView.as_view(template_name="index.html")), name="home"),
     path("admin/", admin.site.urls),
     path("api/v1/", include(router.urls)),
+    path("api/v1/search/", SearchView.as_view()),
     path("api/v1/auth/", include("djoser.urls")),
     path("api/v1/auth/session/login/", SessionLoginView.as_view()),
     path("api/v1/auth/session/logout/", SessionLogoutView.as_view()),
@@ -0,0 +1,186 @@
+"""
+Версии таблиц для условных GET (ETag / Last-Modified).
+
+На каждую модель хранятся счётчик (растёт при любой записи в таблицу) и время
+последнего изменения. Валидатор ответа списка/объекта строится из версий
+таблиц, от которых ответ зависит, — без выполнения самого запроса к списку.
+Запись через save()/delete() поднимает версию сигналами (см. orders/signals.py),
+bulk_create/update() должны вызывать bump_tables() сами.
+
+Счётчики обязаны быть общими для всех процессов: по ним же инвалидируются снимки
+прав в сессиях (users/auth.py) и справочники в памяти воркеров (system/dictcache.py).
+Где они лежат — settings.TABLE_VERSIONS_STORE:
+- "cache" — в кеше Django (Redis, REDIS_URL): чтение без запросов к БД;
+- "db"    — в таблице orders.TableVersion: один запрос на чтение версий;
+- "auto"  — "cache", если кеш общий для процессов, иначе "db". Кеш в памяти процесса
+  (LocMemCache) версии не хранит никогда: запись в одном воркере не видна другим.
+"""
+import hashlib
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+# бэкенды кеша, которые живут в памяти одного процесса
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared() -> bool:
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def versions_store() -> str:
+    store = settings.TABLE_VERSIONS_STORE
+    if store == "auto":
+        return "cache" if cache_is_shared() else "db"
+    return store
+
+
+def versions_shared() -> bool:
+    """False — версии в кеше одного процесса (TABLE_VERSIONS_STORE=cache без общего кеша)."""
+    return versions_store() == "db" or cache_is_shared()
+
+
+@checks.register()
+def check_versions_store(app_configs, **kwargs):
+    if settings.TABLE_VERSIONS_STORE == "cache" and not cache_is_shared():
+        return [checks.Warning(
+            "TABLE_VERSIONS_STORE='cache' с кешем в памяти процесса: запись в одном воркере "
+            "не сбросит ETag, снимки прав и справочники в остальных",
+            hint="Задайте REDIS_URL или TABLE_VERSIONS_STORE=auto/db",
+            id="system.W001",
+        )]
+    return []
+
+
+def _key(model, suffix):
+    return f"tables:{model._meta.label_lower}:{suffix}"
+
+
+def _table_version_model():
+    return apps.get_model("orders", "TableVersion")
+
+
+def bump_tables(*models):
+    """
+    Поднимает версии после коммита: иначе клиент, прочитавший старые данные
+    до коммита, получил бы с ними уже новый ETag.
+    """
+    transaction.on_commit(lambda: _bump(models))
+
+
+def _bump(models):
+    if versions_store() == "db":
+        _bump_db(models)
+        return
+    now = time.time()
+    for model in models:
+        key = _key(model, "v")
+        try:
+            cache.incr(key)
+        except ValueError:
+            # первое изменение после старта/сброса кеша: начинаем с текущего времени,
+            # чтобы не совпасть с версией, выданной до сброса
+            if not cache.add(key, time.time_ns(), timeout=None):
+                cache.incr(key)
+        cache.set(_key(model, "mtime"), now, timeout=None)
+
+
+def _bump_db(models):
+    TableVersion = _table_version_model()
+    now = time.time()
+    for model in models:
+        label = model._meta.label_lower
+        if TableVersion.objects.filter(label=label).update(version=F("version") + 1, mtime=now):
+            continue
+        try:
+            with transaction.atomic():
+                TableVersion.objects.create(label=label, version=1, mtime=now)
+        except IntegrityError:
+            # строку только что завёл другой процесс
+            TableVersion.objects.filter(label=label).update(version=F("version") + 1, mtime=now)
+
+
+def _table_versions_db(models):
+    rows = {
+        label: (version, mtime)
+        for label, version, mtime in _table_version_model().objects
+        .filter(label__in=[m._meta.label_lower for m in models])
+        .values_list("label", "version", "mtime")
+    }
+    # ещё не менявшаяся таблица — версия 0; первая запись заведёт строку с версией 1
+    return [rows.get(m._meta.label_lower, (0, 0)) for m in models]
+
+
+def table_versions(*models):
+    """[(версия, mtime)] по моделям; отсутствующие в кеше заводятся."""
+    if versions_store() == "db":
+        return _table_versions_db(models)
+    keys = [_key(m, s) for m in models for s in ("v", "mtime")]
+    values = cache.get_many(keys)
+    missing = [m for m in models if _key(m, "v") not in values]
+    if missing:
+        _bump(missing)
+        values.update(cache.get_many([_key(m, s) for m in missing for s in ("v", "mtime")]))
+    return [(values.get(_key(m, "v"), 0), values.get(_key(m, "mtime"), 0)) for m in models]
+
+
+class ConditionalGetMixin:
+    """
+    list/retrieve отдают ETag + Last-Modified и отвечают 304, если клиент прислал
+    актуальный If-None-Match / If-Modified-Since. Права проверяются раньше (initial()).
+
+    etag_models — таблицы, от которых зависит ответ (с учётом ?expand и т.п.).
+    """
+
+    etag_models = ()
+
+    def get_etag_models(self):
+        return self.etag_models or (self.get_queryset().model,)
+
+    def _validators(self, request):
+        versions = table_versions(*self.get_etag_models())
+        user = getattr(request.user, "pk", None)
+        raw = "|".join([request.get_full_path(), str(user)] + [str(v) for v, _ in versions])
+        etag = f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()}"'
+        last_modified = int(max((m for _, m in versions), default=0)) or None
+        return etag, last_modified
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = self._validators(request)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        response = not_modified or handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(last_modified)
+            # браузер хранит ответ, но перед использованием всегда перепроверяет
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+
+def cached_for_tables(name, models, build, params=(), timeout=None):
+    """
+    Результат build(), закешированный до первой записи в любую из таблиц models
+    (и не дольше timeout секунд). params — всё остальное, от чего зависит результат.
+    """
+    versions = [v for v, _ in table_versions(*models)]
+    raw = "|".join([name, *(str(p) for p in params), *(str(v) for v in versions)])
+    key = f"tables:cached:{name}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+    return cache.get_or_set(key, build, timeout)
@@ -0,0 +1,156 @@
+"""
+Снимок прав в сессии.
+
+При входе (и при первом запросе после инвалидации) пользователь и его роль
+сериализуются в session["_auth_snapshot"]. Сессии лежат в кеше (cached_db),
+поэтому аутентифицированный запрос не ходит в БД ни за сессией, ни за User, ни за Role.
+
+request.user — ленивый объект: поля снимка (USER_FIELDS, role, is_authenticated) отдаются
+из него, любое другое обращение (password, last_login, save(), set_password() — djoser,
+правка профиля) один раз загружает настоящую строку из БД. Неполная модель наружу не уходит.
+
+Снимок помечен версиями таблиц Role/User (system/versioning.py). Сохранение роли
+или пользователя (кроме обновления last_login) поднимает версию — все снимки
+пересобираются из БД при следующем запросе. Если версии не общие для процессов
+(versions_shared()), снимок не используется: отозванное право иначе жило бы
+в остальных воркерах до их перезапуска.
+"""
+import copy
+
+from django.contrib.auth import SESSION_KEY
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.authentication import SessionAuthentication
+
+from system.versioning import table_versions, versions_shared
+
+from .models import Role, User
+
+
+SNAPSHOT_KEY = "_auth_snapshot"
+
+PERMISSION_FIELDS = ("can_view_orders", "can_edit_orders", "can_delete_orders", "can_view_reports", "is_admin")
+USER_FIELDS = ("id", "username", "first_name", "last_name", "email",
+               "is_active", "is_staff", "is_superuser", "is_active_account", "role_id")
+ROLE_FIELDS = ("id", "name", *PERMISSION_FIELDS)
+
+
+def _current_version():
+    return [v for v, _ in table_versions(Role, User)]
+
+
+def role_permissions(role) -> dict:
+    return {name: bool(getattr(role, name, False)) for name in PERMISSION_FIELDS}
+
+
+def build_snapshot(user) -> dict:
+    role = getattr(user, "role", None)
+    return {
+        "version": _current_version(),
+        "user": {name: getattr(user, name) for name in USER_FIELDS},
+        "role": {name: getattr(role, name) for name in ROLE_FIELDS} if role else None,
+        "permissions": role_permissions(role),
+    }
+
+
+def store_snapshot(request, user) -> dict:
+    snapshot = build_snapshot(user)
+    request.session[SNAPSHOT_KEY] = snapshot
+    return snapshot
+
+
+def get_snapshot(request):
+    """Актуальный снимок текущей сессии или None."""
+    session = getattr(request, "session", None)
+    if session is None or not versions_shared():
+        return None
+    snapshot = session.get(SNAPSHOT_KEY)
+    if not snapshot or str(snapshot["user"]["id"]) != str(session.get(SESSION_KEY)):
+        return None
+    if snapshot["version"] != _current_version():
+        return None
+    return snapshot
+
+
+def snapshot_user(snapshot) -> User:
+    """User из снимка, роль уже подставлена в кеш связи — user.role запросов не делает."""
+    user = User(**snapshot["user"])
+    user._state.adding = False
+    user._state.db = "default"
+    role = None
+    if snapshot["role"]:
+        role = Role(**snapshot["role"])
+        role._state.adding = False
+        role._state.db = "default"
+    User.role.field.set_cached_value(user, role)
+    return user
+
+
+class SnapshotUser(SimpleLazyObject):
+    """User из снимка для чтения прав; за остальным — в БД (первое обращение)."""
+
+    SNAPSHOT_ATTRS = frozenset((*USER_FIELDS, "pk", "role", "is_authenticated", "is_anonymous"))
+
+    def __init__(self, snapshot):
+        user_id = snapshot["user"]["id"]
+        super().__init__(lambda: User.objects.select_related("role").get(pk=user_id))
+        self.__dict__["_snapshot_user"] = snapshot_user(snapshot)
+
+    def __getattr__(self, name):
+        if self._wrapped is empty and name in self.SNAPSHOT_ATTRS:
+            return getattr(self.__dict__["_snapshot_user"], name)
+        return super().__getattr__(name)
+
+    def __bool__(self):
+        # bool(request.user) в IsAuthenticated
+        return True
+
+    def __copy__(self):
+        if self._wrapped is empty:
+            self._setup()
+        return copy.copy(self._wrapped)
+
+    @property
+    def __class__(self):
+        # isinstance(request.user, User) без загрузки
+        return User
+
+
+def request_permissions(request) -> dict:
+    """Права текущего запроса: из снимка сессии, иначе по user.role."""
+    snapshot = get_snapshot(getattr(request, "_request", request))
+    if snapshot is not None:
+        return snapshot["permissions"]
+    user = request.user
+    if not user or not user.is_authenticated:
+        return role_permissions(None)
+    return role_permissions(getattr(user, "role", None))
+
+
+def session_payload(user, permissions) -> dict:
+    """Ответ /auth/session/login/ и /auth/session/me/."""
+    role = getattr(user, "role", None)
+    return {
+        "id": user.id,
+        "username": user.username,
+        "role": getattr(role, "name", None),
+        "permissions": permissions,
+    }
+
+
+class SnapshotSessionAuthentication(SessionAuthentication):
+    """SessionAuthentication, которая берёт пользователя из снимка, а в БД идёт только без него."""
+
+    def authenticate(self, request):
+        django_request = request._request
+        snapshot = get_snapshot(django_request)
+        if snapshot is None:
+            result = super().authenticate(request)
+            if result is not None:
+                store_snapshot(django_request, result[0])
+            return result
+
+        user = SnapshotUser(snapshot)
+        if not user.is_active:
+            return None
+        self.enforce_csrf(request)
+        return (user, None)
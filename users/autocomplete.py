@@ -0,0 +1,113 @@
+"""
+Подсказки для форм: до N пар {id, label} по префиксу (GET /clients/autocomplete/?q=..., /employees/autocomplete/).
+
+Справочник держится в памяти процесса отсортированным массивом ключей: нормализованная
+подпись (casefold, ё -> е) и каждый её хвост с начала слова — "пет" найдёт "Иванов Пётр".
+Поиск — bisect к первому ключу >= префикса и проход, пока ключи с него начинаются.
+Массив перестраивается первым запросом после записи в таблицу: версия таблицы
+(system/versioning.py) растёт при любой записи. Справочник больше AUTOCOMPLETE_MAX_ROWS строк
+в память не берётся — префиксы ищутся полнотекстовым индексом (system/search.py).
+"""
+import bisect
+import threading
+
+from django.conf import settings
+
+from system.search import query_words, search_backend
+from system.versioning import table_versions, versions_shared
+
+from .models import Client, Employee
+
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# модель -> kind в system/search.py, поля и подпись из них
+SOURCES = {
+    Client: ("client", ("name",), lambda name: name),
+    Employee: ("employee", ("full_name", "tab_number"), lambda full_name, tab: f"{full_name} ({tab})"),
+}
+
+
+class PrefixIndex:
+    def __init__(self, rows):
+        """rows: [(id, label)]"""
+        keyed = []
+        for pk, label in rows:
+            words = query_words(label)
+            keyed.extend((" ".join(words[i:]), pk, label) for i in range(len(words)))
+        keyed.sort(key=lambda entry: entry[0])
+        self._keys = [key for key, _, _ in keyed]
+        self._entries = [(pk, label) for _, pk, label in keyed]
+        # без префикса — первые по алфавиту подписи
+        self._first = sorted(rows, key=lambda row: " ".join(query_words(row[1])))[:MAX_LIMIT]
+
+    def lookup(self, prefix, limit):
+        prefix = " ".join(query_words(prefix))
+        if not prefix:
+            return [{"id": pk, "label": label} for pk, label in self._first[:limit]]
+        found, seen = [], set()
+        for i in range(bisect.bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            pk, label = self._entries[i]
+            if pk not in seen:
+                seen.add(pk)
+                found.append({"id": pk, "label": label})
+                if len(found) >= limit:
+                    break
+        return found
+
+
+# label модели -> (версия таблицы, PrefixIndex или None — справочник слишком большой)
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _build(model):
+    _, fields, label = SOURCES[model]
+    if model.objects.count() > settings.AUTOCOMPLETE_MAX_ROWS:
+        return None
+    rows = model.objects.values_list("pk", *fields).iterator(chunk_size=5000)
+    return PrefixIndex([(pk, label(*values)) for pk, *values in rows])
+
+
+def _index(model):
+    # версия читается до данных: запись во время сборки поднимет её, и следующий запрос пересоберёт
+    version = table_versions(model)[0][0]
+    cached = _indexes.get(model._meta.label)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    # пока один поток пересобирает (на 200k строк — секунды), остальные отвечают по прежнему массиву
+    if not _lock.acquire(blocking=cached is None):
+        return cached[1]
+    try:
+        cached = _indexes.get(model._meta.label)
+        if cached is None or cached[0] != version:
+            cached = (version, _build(model))
+            _indexes[model._meta.label] = cached
+        return cached[1]
+    finally:
+        _lock.release()
+
+
+def _lookup_in_db(model, prefix, limit):
+    kind, fields, label = SOURCES[model]
+    queryset = model.objects.order_by(*fields)
+    if query_words(prefix):
+        queryset = search_backend().filter(queryset, kind, prefix)
+    return [{"id": pk, "label": label(*values)} for pk, *values in queryset.values_list("pk", *fields)[:limit]]
+
+
+def autocomplete(model, params) -> list:
+    """params — request.query_params: q (префикс), limit (не больше MAX_LIMIT)."""
+    prefix = params.get("q", "")
+    try:
+        limit = max(1, min(int(params.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except (TypeError, ValueError):
+        limit = DEFAULT_LIMIT
+    # без общих версий массив не узнает о чужих записях — ищем в БД
+    index = _index(model) if versions_shared() else None
+    if index is None:
+        return _lookup_in_db(model, prefix, limit)
+    return index.lookup(prefix, limit)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='client',
+            options={'verbose_name': 'Клиент', 'verbose_name_plural': 'Клиенты'},
+        ),
+        migrations.AlterModelOptions(
+            name='employee',
+            options={'verbose_name': ' Работник', 'verbose_name_plural': 'Работники'},
+        ),
+        migrations.AlterModelOptions(
+            name='role',
+            options={'verbose_name': 'Роль', 'verbose_name_plural': 'Роли'},
+        ),
+        migrations.AlterModelOptions(
+            name='user',
+            options={'verbose_name': 'Пользователь', 'verbose_name_plural': 'Пользователи'},
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from system.versioning import bump_tables
+
+from .models import Role, User
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def role_changed(sender, instance, **kwargs):
+    # снимки прав в сессиях (users/auth.py) устаревают
+    bump_tables(Role)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # login() обновляет только last_login — права от этого не меняются
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    bump_tables(User)
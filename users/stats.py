@@ -0,0 +1,26 @@
+"""Статистика сотрудников для дашборда (кешируется так же, как orders/stats.py)."""
+from django.db.models import Count
+
+from .models import Employee
+
+
+# статус сотрудника, который дашборд показывает как «онлайн»
+ONLINE_STATUS = Employee._meta.get_field("status").default
+
+
+def employee_stats(queryset=None) -> dict:
+    """{"total", "online", "by_status", "by_department"} одним-двумя GROUP BY."""
+    queryset = Employee.objects.all() if queryset is None else queryset
+    by_status = dict(
+        queryset.order_by("status").values("status").annotate(n=Count("id")).values_list("status", "n")
+    )
+    by_department = dict(
+        queryset.order_by("department").values("department").annotate(n=Count("id"))
+        .values_list("department", "n")
+    )
+    return {
+        "total": sum(by_status.values()),
+        "online": by_status.get(ONLINE_STATUS, 0),
+        "by_status": by_status,
+        "by_department": by_department,
+    }
@@ -1,12 +1,22 @@
 # users/views.py
+from django.conf import settings
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from system.dbrouter import reporting_reads
+from system.dictcache import DictionaryCacheMixin, dictionary_response
+from system.fastlist import FastListMixin
+from system.search import SearchIndexFilter
+from system.versioning import ConditionalGetMixin, cached_for_tables
 
+from .autocomplete import autocomplete
 from .models import Role, Employee, Client
 from .serializers import RoleSerializer, EmployeeSerializer, ClientSerializer
+from .stats import employee_stats
 
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(DictionaryCacheMixin, viewsets.ModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [permissions.AllowAny]  # чтение без логина
@@ -14,26 +24,68 @@ class RoleViewSet(viewsets.ModelViewSet):
     filterset_fields = ["name"]
 
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
+    fast_list = True
     # Для учебного прототипа разрешим изменения всем
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, SearchIndexFilter]
     filterset_fields = ["department", "status"]
-
-
-class ClientViewSet(viewsets.ModelViewSet):
+    search_kind = "employee"
+
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        """Счётчики для дашборда (users/stats.py), фильтры — те же, что у списка. Читается из реплики."""
+        queryset = self.filter_queryset(self.get_queryset())
+        with reporting_reads():
+            data = cached_for_tables(
+                "employees.stats",
+                [Employee],
+                lambda: employee_stats(queryset),
+                params=(sorted(request.query_params.lists()),),
+                timeout=settings.STATS_CACHE_TTL,
+            )
+        return Response(data)
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Подсказки для форм: ?q=префикс&limit=N -> [{id, label}] (users/autocomplete.py)."""
+        return Response(autocomplete(Employee, request.query_params))
+
+    @action(detail=False, methods=["get"])
+    def departments(self, request):
+        """Список подразделений (без повторов, по алфавиту) — из памяти процесса, system/dictcache.py."""
+        return dictionary_response(
+            request,
+            "employees.departments",
+            [Employee],
+            lambda: sorted(
+                d for d in Employee.objects.order_by().values_list("department", flat=True).distinct() if d.strip()
+            ),
+        )
+
+
+class ClientViewSet(ConditionalGetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    fast_list = True
     permission_classes = [permissions.AllowAny]  # вместо IsAuthenticatedOrReadOnly
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, SearchIndexFilter]
     filterset_fields = ["name"]
+    search_kind = "client"
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Подсказки для форм: ?q=префикс&limit=N -> [{id, label}] (users/autocomplete.py)."""
+        return Response(autocomplete(Client, request.query_params))
 from django.contrib.auth import authenticate, login, logout
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from .auth import request_permissions, session_payload, store_snapshot
+
 
 class SessionLoginView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -51,21 +103,9 @@ class SessionLoginView(APIView):
 
         login(request, user)
 
-        role = getattr(user, "role", None)
-        perms = {
-            "can_view_orders": bool(getattr(role, "can_view_orders", False)),
-            "can_edit_orders": bool(getattr(role, "can_edit_orders", False)),
-            "can_delete_orders": bool(getattr(role, "can_delete_orders", False)),
-            "can_view_reports": bool(getattr(role, "can_view_reports", False)),
-            "is_admin": bool(getattr(role, "is_admin", False)),
-        }
-
-        return Response({
-            "id": user.id,
-            "username": user.username,
-            "role": getattr(role, "name", None),
-            "permissions": perms,
-        })
+        # снимок прав кладём в сессию сразу — дальше запросы его только читают
+        snapshot = store_snapshot(request, user)
+        return Response(session_payload(user, snapshot["permissions"]))
 
 
 class SessionLogoutView(APIView):
@@ -80,18 +120,4 @@ class SessionMeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
-        role = getattr(user, "role", None)
-        perms = {
-            "can_view_orders": bool(getattr(role, "can_view_orders", False)),
-            "can_edit_orders": bool(getattr(role, "can_edit_orders", False)),
-            "can_delete_orders": bool(getattr(role, "can_delete_orders", False)),
-            "can_view_reports": bool(getattr(role, "can_view_reports", False)),
-            "is_admin": bool(getattr(role, "is_admin", False)),
-        }
-        return Response({
-            "id": user.id,
-            "username": user.username,
-            "role": getattr(role, "name", None),
-            "permissions": perms,
-        })
+        return Response(session_payload(request.user, request_permissions(request)))